@@ -0,0 +1,79 @@
+"""
+Cold start cost of a worker: importing its handler module and loading the URLconf,
+which is what a fresh process does before it can answer its first request.
+
+Each measurement runs in a new interpreter, so nothing is already imported. With
+``importtime`` the interpreter runs under ``python -X importtime`` and the report lists
+the cumulative import cost per module; that adds overhead, so budgets are checked on
+separate runs without it.
+"""
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+ENTRY_POINTS = {
+    'wsgi': 'expense_tracker.wsgi',
+    'asgi': 'expense_tracker.asgi',
+}
+
+STARTUP = """
+import time
+start = time.perf_counter()
+import {module}
+from django.urls import get_resolver
+get_resolver().url_patterns
+print(time.perf_counter() - start)
+"""
+
+
+def run_startup(entry, profile, importtime=False):
+    env = {
+        **os.environ,
+        'DJANGO_SETTINGS_MODULE': 'expense_tracker.settings',
+        'DEPLOYMENT_PROFILE': profile,
+    }
+    command = [sys.executable, *(['-X', 'importtime'] if importtime else []), '-c', STARTUP.format(module=ENTRY_POINTS[entry])]
+    result = subprocess.run(command, cwd=BASE_DIR, env=env, capture_output=True, text=True, check=False)
+    if result.returncode != 0:
+        raise RuntimeError(f"Starting the {entry} handler with the {profile} profile failed:\n{result.stderr}")
+    return float(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def parse_importtime(output):
+    """
+    ``(module, self_us, cumulative_us)`` for every line of ``-X importtime`` output.
+    """
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+    return modules
+
+
+def cold_start_seconds(entry='wsgi', profile='api', runs=3):
+    """
+    The fastest of ``runs`` cold starts, which is the least disturbed by other load.
+    """
+    return min(run_startup(entry, profile)[0] for _ in range(runs))
+
+
+def import_report(entry='wsgi', profile='full', top=25):
+    seconds, output = run_startup(entry, profile, importtime=True)
+    modules = parse_importtime(output)
+    packages = defaultdict(int)
+    for name, self_us, _ in modules:
+        packages[name.split('.')[0]] += self_us
+    return {
+        'entry': entry,
+        'profile': profile,
+        'seconds': seconds,
+        'modules_imported': len(modules),
+        'slowest_modules': sorted(modules, key=lambda module: module[2], reverse=True)[:top],
+        'packages': sorted(packages.items(), key=lambda package: package[1], reverse=True)[:top],
+    }
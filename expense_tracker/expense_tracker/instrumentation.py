@@ -0,0 +1,230 @@
+"""
+Per-request timing of SQL, serialization and authentication.
+
+Turned on with ``REQUEST_INSTRUMENTATION = True``. When it is off the middleware raises
+``MiddlewareNotUsed`` at startup, so Django drops it from the chain, no execute wrapper
+is installed and ``span()`` costs one context variable lookup. The middleware runs
+natively under both WSGI and ASGI.
+
+Each instrumented request produces one structured log record on the
+``expense_tracker.instrumentation`` logger. The timings are also sent back in a
+``Server-Timing`` header to staff users, or to everyone with ``SERVER_TIMING_HEADER = True``.
+Streamed responses (the exports) are left out, since their body is produced after the
+middleware has returned. Queries slower than ``SLOW_QUERY_THRESHOLD_MS`` are logged on
+``expense_tracker.slow_queries`` with the first frame of project code that issued them.
+
+Serializers are timed when they use ``InstrumentedSerializerMixin``, as the project's do.
+"""
+import logging
+import os
+import time
+import traceback
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework import serializers
+
+logger = logging.getLogger('expense_tracker.instrumentation')
+slow_query_logger = logging.getLogger('expense_tracker.slow_queries')
+
+SPANS = ('auth', 'serializer')
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    def __init__(self, slow_threshold=None):
+        self.slow_threshold = slow_threshold
+        self.queries = 0
+        self.sql = 0.0
+        self.spans = defaultdict(float)
+        self.active = set()
+
+    def as_dict(self, total):
+        return {
+            'duration_ms': round(total * 1000, 3),
+            'queries': self.queries,
+            'sql_ms': round(self.sql * 1000, 3),
+            **{f'{name}_ms': round(self.spans[name] * 1000, 3) for name in SPANS},
+        }
+
+    def server_timing(self, total):
+        entries = [f'db;dur={self.sql * 1000:.3f};desc="{self.queries} queries"']
+        entries += [f'{name};dur={self.spans[name] * 1000:.3f}' for name in SPANS]
+        entries.append(f'total;dur={total * 1000:.3f}')
+        return ', '.join(entries)
+
+
+def current_metrics():
+    return _current.get()
+
+
+@contextmanager
+def span(name):
+    """
+    Add the time spent in the block to ``name`` for the current request, if instrumented.
+
+    Nested spans of the same name only count once, so a serializer calling other
+    serializers is not double counted.
+    """
+    metrics = _current.get()
+    if metrics is None or name in metrics.active:
+        yield
+        return
+    metrics.active.add(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.spans[name] += time.perf_counter() - start
+        metrics.active.discard(name)
+
+
+def query_origin():
+    """
+    The innermost stack frame in project code outside this module, as ``path:line in function``.
+    """
+    base_dir = str(settings.BASE_DIR)
+    for frame in reversed(traceback.extract_stack()):
+        if (
+            frame.filename.startswith(base_dir)
+            and frame.filename != __file__
+            and f'{os.sep}site-packages{os.sep}' not in frame.filename
+        ):
+            return f'{os.path.relpath(frame.filename, base_dir)}:{frame.lineno} in {frame.name}'
+    return None
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper counting queries and SQL time into the current ``RequestMetrics``.
+
+    It stays installed on a connection once added and reads the request from a context
+    variable, so under ASGI, where one connection serves many requests, each query is
+    charged to the request that ran it.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.queries += 1
+        metrics.sql += elapsed
+        if metrics.slow_threshold is not None and elapsed * 1000 >= metrics.slow_threshold:
+            origin = query_origin()
+            slow_query_logger.warning(
+                "Slow query (%.1fms) from %s: %s", elapsed * 1000, origin, sql,
+                extra={
+                    'duration_ms': round(elapsed * 1000, 3), 'origin': origin, 'sql': sql,
+                    'database': context['connection'].alias,
+                },
+            )
+
+
+def install_query_recorder():
+    for connection in connections.all():
+        if record_query not in connection.execute_wrappers:
+            connection.execute_wrappers.append(record_query)
+
+
+def connection_opened(sender, connection, **kwargs):
+    """
+    ``connection_created`` handler adding ``record_query`` to every new connection.
+
+    Connections are per thread: under ASGI the ORM runs on sync_to_async's threads, whose
+    connections the middleware, on the event loop thread, cannot reach.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class InstrumentedSerializerMixin:
+    """
+    Times ``is_valid()`` and ``.data`` under the ``serializer`` span, for the serializer
+    itself and for the list it makes with ``many=True``.
+    """
+    def is_valid(self, *, raise_exception=False):
+        with span('serializer'):
+            return super().is_valid(raise_exception=raise_exception)
+
+    @property
+    def data(self):
+        with span('serializer'):
+            return super().data
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_serializer = super().many_init(*args, **kwargs)
+        # Unless Meta.list_serializer_class names another, DRF builds a plain ListSerializer
+        if type(list_serializer) is serializers.ListSerializer:
+            list_serializer.__class__ = InstrumentedListSerializer
+        return list_serializer
+
+
+class InstrumentedListSerializer(InstrumentedSerializerMixin, serializers.ListSerializer):
+    pass
+
+
+class InstrumentationMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+        connection_created.connect(connection_opened, dispatch_uid='expense_tracker.instrumentation.connection_opened')
+        self.get_response = get_response
+        self.slow_threshold = getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', None)
+        self.timing_header = getattr(settings, 'SERVER_TIMING_HEADER', False)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        metrics = RequestMetrics(self.slow_threshold)
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            install_query_recorder()
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics(self.slow_threshold)
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            # On the thread the ORM calls of this request run on, whose connection may already be open
+            await sync_to_async(install_query_recorder)()
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, time.perf_counter() - start)
+
+    def finish(self, request, response, metrics, total):
+        if response.streaming:
+            return response
+        user = getattr(request, 'user', None)
+        if self.timing_header or getattr(user, 'is_staff', False):
+            response['Server-Timing'] = metrics.server_timing(total)
+        fields = metrics.as_dict(total)
+        logger.info(
+            "%s %s %s %.1fms queries=%d sql=%.1fms serializer=%.1fms auth=%.1fms",
+            request.method, request.path, response.status_code, fields['duration_ms'], fields['queries'],
+            fields['sql_ms'], fields['serializer_ms'], fields['auth_ms'],
+            extra={'method': request.method, 'path': request.path, 'status': response.status_code, **fields},
+        )
+        return response
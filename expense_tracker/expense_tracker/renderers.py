@@ -0,0 +1,93 @@
+"""
+Faster renderers and parsers for the API (see ``REST_FRAMEWORK`` in settings).
+
+``FastJSONRenderer`` and ``FastJSONParser`` encode and decode with orjson when it is
+installed and fall back to DRF's stdlib ``json`` path otherwise; both paths produce the
+same bytes. ``MessagePackRenderer`` and ``MessagePackParser`` serve clients that send
+``Accept: application/msgpack`` and are only enabled when msgpack is installed.
+
+Decimals are encoded exactly, as strings, the way serializer ``DecimalField``s already
+are, rather than as the floats of DRF's encoder (see ``expenses.encoders``). Everything
+else (datetimes ending in ``Z``, dates, UUIDs, lazy strings) is encoded as DRF does.
+"""
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils import json
+
+from expenses.encoders import ExactJSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+_default = ExactJSONEncoder().default
+
+
+def dumps(data):
+    """
+    ``data`` as compact UTF-8 JSON, with orjson when available.
+    """
+    if orjson is None:
+        return FastJSONRenderer().render(data)
+    # orjson writes UTC datetimes with "Z" and drops zero microseconds, like DRF's encoder
+    return orjson.dumps(data, default=_default, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+
+
+def loads(content):
+    return orjson.loads(content) if orjson is not None else json.loads(content)
+
+
+class FastJSONRenderer(JSONRenderer):
+    encoder_class = ExactJSONEncoder
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Indented output, and settings that change the encoding, take DRF's path
+        if (
+            orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {})
+            or not self.compact or not self.strict or self.ensure_ascii
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except ValueError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=_default, use_bin_type=True)
+
+
+class MessagePackParser(BaseParser):
+    media_type = 'application/msgpack'
+    renderer_class = MessagePackRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, TypeError) as exc:
+            raise ParseError(f'MessagePack parse error - {exc}')
@@ -0,0 +1,125 @@
+"""
+Send reads of safe (GET/HEAD/OPTIONS) API requests to the ``replica`` database.
+
+Everything else stays on ``default``: writes, every query of an unsafe request (so a
+write's own validation reads what it is about to change), management commands and
+shell sessions. After a client writes, its reads stay on the primary for
+``REPLICA_STICKY_SECONDS`` so it reads its own writes while the replica catches up.
+The marker is kept in ``REPLICA_STICKY_CACHE``, which must be shared by every worker
+(Redis, Memcached or the database cache) for a client's next request to find it.
+Clients are told apart by their ``Authorization`` header, or their address when they
+send none: ``REMOTE_ADDR``, or behind ``TRUSTED_PROXY_COUNT`` reverse proxies the
+address the outermost of them added to ``X-Forwarded-For``.
+
+When the replica is the primary database itself, as under the test runner's
+``TEST['MIRROR']``, the middleware is left out and every query uses ``default``.
+"""
+import hashlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+PRIMARY = 'default'
+REPLICA = 'replica'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    token = _replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def read_alias():
+    """
+    The alias reads go to right now; pin querysets that outlive the request to it.
+    """
+    return REPLICA if _replica_reads.get() else PRIMARY
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return read_alias()
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds a copy of the primary, so objects from either may be related
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
+
+
+def replica_configured():
+    if REPLICA not in settings.DATABASES:
+        return False
+    return connections[REPLICA].settings_dict['NAME'] != connections[PRIMARY].settings_dict['NAME']
+
+
+def get_cache():
+    return caches[getattr(settings, 'REPLICA_STICKY_CACHE', 'default')]
+
+
+def client_address(request):
+    proxies = getattr(settings, 'TRUSTED_PROXY_COUNT', 0)
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+    if proxies and forwarded:
+        # Each trusted proxy appended the address it got the request from; anything
+        # further left was sent by the client and may be made up
+        addresses = [address.strip() for address in forwarded.split(',')]
+        if len(addresses) >= proxies:
+            return addresses[-proxies]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def sticky_key(request):
+    client = request.META.get('HTTP_AUTHORIZATION') or client_address(request)
+    return f'replica:sticky:{hashlib.sha256(client.encode()).hexdigest()[:32]}'
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not replica_configured():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sticky_seconds = getattr(settings, 'REPLICA_STICKY_SECONDS', 5)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        cache = get_cache()
+        key = sticky_key(request)
+        safe = request.method in SAFE_METHODS
+        with replica_reads(safe and not cache.get(key)):
+            response = self.get_response(request)
+        if not safe and response.status_code < 400:
+            cache.set(key, True, timeout=self.sticky_seconds)
+        return response
+
+    async def __acall__(self, request):
+        cache = get_cache()
+        key = sticky_key(request)
+        safe = request.method in SAFE_METHODS
+        with replica_reads(safe and not await cache.aget(key)):
+            response = await self.get_response(request)
+        if not safe and response.status_code < 400:
+            await cache.aset(key, True, timeout=self.sticky_seconds)
+        return response
@@ -10,8 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
+from importlib.util import find_spec
 from pathlib import Path
 
+from expense_tracker.sqlite import sqlite_profile
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -45,6 +49,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'expense_tracker.instrumentation.InstrumentationMiddleware',
+    'expense_tracker.routers.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -74,17 +80,140 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'expense_tracker.wsgi.application'
 
+# DEPLOYMENT_PROFILE=api is for workers that only serve the API: it leaves out the docs
+# and admin apps, their middleware and their routes, so they are never imported at
+# startup. `manage.py import_report` shows what each profile costs.
+DEPLOYMENT_PROFILE = os.environ.get('DEPLOYMENT_PROFILE', 'full')
+if DEPLOYMENT_PROFILE not in ('full', 'api'):
+    raise ValueError(f"Unknown DEPLOYMENT_PROFILE {DEPLOYMENT_PROFILE!r}; expected 'full' or 'api'.")
+
+DOCS_AND_ADMIN_APPS = (
+    'django.contrib.admin',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+    'drf_yasg',
+)
+
+if DEPLOYMENT_PROFILE == 'api':
+    INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in DOCS_AND_ADMIN_APPS]
+    MIDDLEWARE = [name for name in MIDDLEWARE if not name.startswith('django.contrib.messages.')]
+    TEMPLATES[0]['OPTIONS']['context_processors'] = [
+        name for name in TEMPLATES[0]['OPTIONS']['context_processors'] if not name.startswith('django.contrib.messages.')
+    ]
+
+# Seconds an API-only worker may take to import its handler and URLconf; checked by the test suite
+COLD_START_BUDGET_SECONDS = 1.5
+
+# Seconds one user's ledger may take over 50,000 expenditures; checked by the test suite
+# and reported by `manage.py benchmark_ledger`
+LEDGER_BUDGET_SECONDS = 0.05
+
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# DATABASE_PROFILE=production turns on WAL, BEGIN IMMEDIATE and persistent connections
+# for several workers sharing the file; see expense_tracker/sqlite.py
+DATABASE_PROFILE = os.environ.get('DATABASE_PROFILE', 'development')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        **sqlite_profile(DATABASE_PROFILE),
+    },
+    # Reads of GET requests; see expense_tracker/routers.py. Without DATABASE_REPLICA_NAME
+    # this is a read-only connection to the primary file, which in WAL mode adds readers
+    # without taking write locks. Tests read the primary through it.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('DATABASE_REPLICA_NAME') or f"file:{BASE_DIR / 'db.sqlite3'}?mode=ro",
+        **sqlite_profile(DATABASE_PROFILE, read_only=True),
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+DATABASE_ROUTERS = ['expense_tracker.routers.PrimaryReplicaRouter']
+# Seconds a client's reads stay on the primary after it writes, remembered in
+# REPLICA_STICKY_CACHE; with several workers that cache must be shared by all of them
+REPLICA_STICKY_SECONDS = 5
+REPLICA_STICKY_CACHE = 'default'
+# Reverse proxies in front of the app that append the client address to X-Forwarded-For;
+# 0 trusts no forwarded address and tells anonymous clients apart by REMOTE_ADDR
+TRUSTED_PROXY_COUNT = 0
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Local memory is per process. When several workers serve the API, point the summary
+# cache at a shared backend such as django.core.cache.backends.filebased.FileBasedCache
+# or django.core.cache.backends.db.DatabaseCache (run `manage.py createcachetable`).
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
+EXPENSES_SUMMARY_CACHE = 'default'
+EXPENSES_SUMMARY_CACHE_TIMEOUT = 300
+# Concurrent misses for the same summary share one computation (see expenses/summary_cache.py).
+# EXPENSES_SUMMARY_LOCK extends that across processes through EXPENSES_SUMMARY_CACHE, which
+# must then be shared (Redis, Memcached or the database cache).
+EXPENSES_SUMMARY_COALESCING = True
+EXPENSES_SUMMARY_LOCK = False
+EXPENSES_SUMMARY_LOCK_TIMEOUT = 10
+
+# How long the occasion change feed holds back new log entries (see expenses/changes.py).
+# SQLite commits writes one at a time; with concurrent writers set it above the longest write transaction.
+EXPENSES_CHANGES_SETTLE_SECONDS = 0
+
+# Background jobs (see expenses/jobs.py), run by `manage.py run_jobs`: failed jobs are retried
+# after JOBS_RETRY_BASE_SECONDS, doubling each time, and jobs running longer than
+# JOBS_LOCK_TIMEOUT are assumed to have lost their worker
+JOBS_TASK_MODULES = ['expenses.tasks']
+JOBS_POLL_INTERVAL = 1
+JOBS_MAX_ATTEMPTS = 5
+JOBS_RETRY_BASE_SECONDS = 10
+JOBS_RETRY_MAX_SECONDS = 60 * 60
+JOBS_LOCK_TIMEOUT = 60 * 10
+
+# `manage.py archive_history` (see expenses/archive.py) moves cleared expenditures older than
+# ARCHIVE_AFTER_DAYS to the archive tables, ARCHIVE_BATCH_SIZE per transaction
+ARCHIVE_AFTER_DAYS = 365
+ARCHIVE_BATCH_SIZE = 500
+
+# Idempotency-Key replays on the write endpoints (see expenses/idempotency.py): how long a
+# key's response is kept, and after how long an unfinished request's claim can be taken over
+IDEMPOTENCY_KEY_TTL = 60 * 60 * 24
+IDEMPOTENCY_LOCK_TIMEOUT = 60
+
+# Users resolved by JWT authentication (see users/user_cache.py)
+USER_AUTH_CACHE = 'default'
+USER_AUTH_CACHE_TIMEOUT = 60
+USER_AUTH_CACHE_MAX_ENTRIES = 1024
+# Also keep cached users in USER_AUTH_CACHE so other processes can reuse them
+USER_AUTH_CACHE_SHARED = False
+
+# Per-request query/SQL/serializer/auth timings as log records and Server-Timing headers
+REQUEST_INSTRUMENTATION = os.environ.get('REQUEST_INSTRUMENTATION', '') == '1'
+# Send the Server-Timing header to every client rather than to staff users only
+SERVER_TIMING_HEADER = os.environ.get('SERVER_TIMING_HEADER', '') == '1'
+# Queries at least this slow (in ms) are logged with their origin; None disables the slow-query log
+SLOW_QUERY_THRESHOLD_MS = 100
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'expense_tracker.instrumentation': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+        'expense_tracker.slow_queries': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -127,10 +256,25 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# JSON is encoded and parsed with orjson when it is installed, and MessagePack is offered to
+# clients that send `Accept: application/msgpack` when msgpack is (see expense_tracker/renderers.py)
+MSGPACK_ENABLED = find_spec('msgpack') is not None
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ),
+    'DEFAULT_RENDERER_CLASSES': [
+        'expense_tracker.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        *(['expense_tracker.renderers.MessagePackRenderer'] if MSGPACK_ENABLED else []),
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'expense_tracker.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+        *(['expense_tracker.renderers.MessagePackParser'] if MSGPACK_ENABLED else []),
+    ],
 }
 
 from datetime import timedelta
@@ -151,3 +295,16 @@ SIMPLE_JWT = {
 }
 
 AUTH_USER_MODEL = 'users.CustomUser'
+
+# API schema for the docs, built with `manage.py generate_openapi_schema` (see expense_tracker/swagger.py)
+OPENAPI_SCHEMA_DIR = BASE_DIR / 'openapi'
+# Generate the schema on every request instead of serving the built file
+OPENAPI_SCHEMA_LIVE = DEBUG
+OPENAPI_SCHEMA_MAX_AGE = 60 * 60 * 24
+
+SWAGGER_SETTINGS = {
+    'SPEC_URL': ('openapi-schema', {'format': 'json'}),
+}
+REDOC_SETTINGS = {
+    'SPEC_URL': ('openapi-schema', {'format': 'json'}),
+}
@@ -1,16 +1,110 @@
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
+"""
+API schema for the ``/swagger/`` and ``/redoc/`` docs.
+
+Generating the schema introspects every view and serializer, so it is built once with
+``manage.py generate_openapi_schema`` at build or deploy time and served from
+``OPENAPI_SCHEMA_DIR`` with long-lived cache headers and a content-hash ETag. With
+``OPENAPI_SCHEMA_LIVE`` (the default under ``DEBUG``) it is generated on every request
+instead, so the docs follow code changes during development.
+"""
+import hashlib
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.shortcuts import render
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.views.decorators.http import require_safe
 from drf_yasg import openapi
+from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+from drf_yasg.generators import OpenAPISchemaGenerator
+from drf_yasg.renderers import ReDocRenderer, SwaggerUIRenderer
+from drf_yasg.views import get_schema_view
+from rest_framework import permissions
+
+UI_RENDERERS = {
+    'swagger': SwaggerUIRenderer,
+    'redoc': ReDocRenderer,
+}
+
+SCHEMA_FORMATS = {
+    'json': (OpenAPICodecJson, 'application/json'),
+    'yaml': (OpenAPICodecYaml, 'application/yaml'),
+}
+
+api_info = openapi.Info(
+    title="Expense Tracker API",
+    default_version='v1',
+    description="API documentation for the Expense Tracker application",
+    terms_of_service="https://www.google.com/policies/terms/",
+    contact=openapi.Contact(email="contact@example.com"),
+    license=openapi.License(name="BSD License"),
+)
 
 schema_view = get_schema_view(
-    openapi.Info(
-        title="Expense Tracker API",
-        default_version='v1',
-        description="API documentation for the Expense Tracker application",
-        terms_of_service="https://www.google.com/policies/terms/",
-        contact=openapi.Contact(email="contact@example.com"),
-        license=openapi.License(name="BSD License"),
-    ),
+    api_info,
     public=True,
     permission_classes=(permissions.AllowAny,),
-)
\ No newline at end of file
+)
+
+
+def schema_path(schema_format):
+    return Path(settings.OPENAPI_SCHEMA_DIR) / f'openapi.{schema_format}'
+
+
+def generate_schema(schema_format):
+    """
+    The public schema of every API route, encoded as ``schema_format``.
+    """
+    schema = OpenAPISchemaGenerator(api_info).get_schema(request=None, public=True)
+    codec_class, _ = SCHEMA_FORMATS[schema_format]
+    return codec_class(validators=[]).encode(schema)
+
+
+@lru_cache(maxsize=None)
+def load_schema(path):
+    """
+    The schema file's bytes and ETag, read once per process; deploys regenerate the file
+    and restart the workers.
+    """
+    content = Path(path).read_bytes()
+    return content, f'"{hashlib.sha256(content).hexdigest()[:32]}"'
+
+
+@require_safe
+def schema_file_view(request, format):
+    if format not in SCHEMA_FORMATS:
+        raise Http404("Unknown schema format.")
+    if settings.OPENAPI_SCHEMA_LIVE:
+        return schema_view.without_ui(cache_timeout=0)(request, format=format)
+
+    try:
+        content, etag = load_schema(str(schema_path(format)))
+    except FileNotFoundError:
+        raise Http404("The API schema has not been generated; run `manage.py generate_openapi_schema`.")
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(content, content_type=SCHEMA_FORMATS[format][1])
+        response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=settings.OPENAPI_SCHEMA_MAX_AGE)
+    return response
+
+
+def docs_view(renderer):
+    """
+    The Swagger UI or ReDoc page: drf-yasg's template, filled in without a schema object.
+    The page loads the schema from ``schema_file_view`` (``SWAGGER_SETTINGS['SPEC_URL']``),
+    so rendering it builds no schema of the API.
+    """
+    renderer_class = UI_RENDERERS[renderer]
+
+    @require_safe
+    def view(request):
+        context = {'request': request}
+        renderer_class().set_context(context)
+        context['title'] = api_info.title
+        return render(request, renderer_class.template, context)
+
+    return view
@@ -14,14 +14,25 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.contrib import admin
+from django.apps import apps
 from django.urls import path, include
-from .swagger import schema_view
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
     path('api/users/', include('users.urls')),
     path('api/expenses/', include('expenses.urls')),
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
 ]
+
+# Left out with DEPLOYMENT_PROFILE=api; imported here so API-only workers never load them
+if apps.is_installed('django.contrib.admin'):
+    from django.contrib import admin
+
+    urlpatterns.append(path('admin/', admin.site.urls))
+
+if apps.is_installed('drf_yasg'):
+    from .swagger import docs_view, schema_file_view
+
+    urlpatterns += [
+        path('openapi.<str:format>', schema_file_view, name='openapi-schema'),
+        path('swagger/', docs_view('swagger'), name='schema-swagger-ui'),
+        path('redoc/', docs_view('redoc'), name='schema-redoc'),
+    ]
@@ -1,6 +1,27 @@
 from django.apps import AppConfig
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
 
 
 class ExpensesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'expenses'
+
+    def ready(self):
+        from . import changes, shares
+
+        expenditure = self.get_model('Expenditure')
+        payment_log = self.get_model('PaymentLog')
+        m2m_changed.connect(
+            shares.utilizers_changed, sender=expenditure.utilizers.through, dispatch_uid='expenses.shares.utilizers',
+        )
+        post_save.connect(shares.expenditure_saved, sender=expenditure, dispatch_uid='expenses.shares.saved')
+
+        m2m_changed.connect(
+            changes.utilizers_changed, sender=expenditure.utilizers.through, dispatch_uid='expenses.changes.utilizers',
+        )
+        post_save.connect(changes.expenditure_saved, sender=expenditure, dispatch_uid='expenses.changes.saved')
+        post_delete.connect(changes.expenditure_deleted, sender=expenditure, dispatch_uid='expenses.changes.deleted')
+        post_save.connect(changes.payment_log_saved, sender=payment_log, dispatch_uid='expenses.changes.payment_saved')
+        pre_delete.connect(
+            changes.payment_log_deleting, sender=payment_log, dispatch_uid='expenses.changes.payment_deleting',
+        )
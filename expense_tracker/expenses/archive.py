@@ -0,0 +1,203 @@
+"""
+Moving settled history out of the hot tables, behind ``manage.py archive_history``.
+
+A cleared expenditure of an occasion created before the cutoff, with no payment at or
+after it, moves to ``ArchivedExpenditure`` under its original id, its shares folded into
+a JSON list and its payment logs into ``ArchivedPaymentLog``. Its utilizer and share rows
+are deleted.
+Each batch is one transaction, so an interrupted run leaves every expenditure either
+fully live or fully archived, and running the command again carries on where it stopped.
+
+Archived rows stay part of every total. What they contributed to balances is kept per
+occasion and pair of users in ``ArchivedBalance``, which ``expenses.settlement`` and
+``expenses.ledger`` add to their sums; the stored occasion totals and spend rollups are
+left as they are, and ``computed_totals()``/``computed_rollups()`` count archived rows
+so rebuilds agree with them. No change log tombstones are written: archived rows have
+not been deleted, and clients that synced them can keep them. The change feed lists
+rows archived since a client's cursor under ``archived``.
+
+Run one archiver at a time.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+from django.db.models import Exists, F, OuterRef
+from django.utils import timezone
+
+from . import changes, summary_cache
+from .models import (
+    ArchivedBalance, ArchivedExpenditure, ArchivedPaymentLog, Expenditure, ExpenditureShare, Occasion, PaymentLog,
+)
+from .shares import amount_cents
+
+BATCH_SIZE = 500
+INSERT_BATCH_SIZE = 2000
+# The live tables archiving shrinks, with the M2M table of Expenditure.utilizers
+HOT_MODELS = (Expenditure, Expenditure.utilizers.through, ExpenditureShare, PaymentLog)
+
+
+def default_cutoff():
+    return timezone.now() - timedelta(days=getattr(settings, 'ARCHIVE_AFTER_DAYS', 365))
+
+
+def archivable(cutoff):
+    """
+    Cleared expenditures of an occasion created before ``cutoff`` with no payment at or after it.
+    """
+    return Expenditure.objects.filter(cleared=True, created_at__lt=cutoff, occasion__isnull=False).exclude(
+        Exists(PaymentLog.objects.filter(expenditure_id=OuterRef('pk'), timestamp__gte=cutoff))
+    )
+
+
+def _carry_deltas(expenditures, shares, payment_logs):
+    """
+    ``{(occasion_id, debtor_id, creditor_id): [owed_cents, paid_cents]}`` for the archived rows.
+    """
+    occasion_ids = {expenditure['id']: expenditure['occasion_id'] for expenditure in expenditures}
+    deltas = defaultdict(lambda: [0, 0])
+    for share in shares:
+        if share['user_id'] != share['expender_id']:
+            deltas[share['occasion_id'], share['user_id'], share['expender_id']][0] += share['amount_cents']
+    for log in payment_logs:
+        if log['payer_id'] != log['payee_id']:
+            deltas[occasion_ids[log['expenditure_id']], log['payer_id'], log['payee_id']][1] += amount_cents(log['amount'])
+    return deltas
+
+
+def _add_to_carry(deltas):
+    """
+    Add ``deltas`` to ``ArchivedBalance``. A batch can touch thousands of pairs, so rather
+    than an UPDATE per row the touched rows are read, deleted and inserted again with the
+    sums: a handful of statements whatever their number.
+    """
+    keys = set(deltas)
+    existing = ArchivedBalance.objects.filter(
+        occasion_id__in={key[0] for key in keys},
+        debtor_id__in={key[1] for key in keys},
+        creditor_id__in={key[2] for key in keys},
+    ).values_list('id', 'occasion_id', 'debtor_id', 'creditor_id', 'owed_cents', 'paid_cents')
+    replaced = []
+    for row_id, occasion_id, debtor_id, creditor_id, owed, paid in existing:
+        key = occasion_id, debtor_id, creditor_id
+        if key in keys:
+            replaced.append(row_id)
+            deltas[key][0] += owed
+            deltas[key][1] += paid
+    for offset in range(0, len(replaced), INSERT_BATCH_SIZE):
+        ArchivedBalance.objects.filter(id__in=replaced[offset:offset + INSERT_BATCH_SIZE]).delete()
+    ArchivedBalance.objects.bulk_create([
+        ArchivedBalance(occasion_id=occasion_id, debtor_id=debtor_id, creditor_id=creditor_id, owed_cents=owed, paid_cents=paid)
+        for (occasion_id, debtor_id, creditor_id), (owed, paid) in deltas.items()
+    ], batch_size=INSERT_BATCH_SIZE)
+
+
+@transaction.atomic
+def archive_batch(cutoff, batch_size=BATCH_SIZE):
+    """
+    Archive up to ``batch_size`` archivable expenditures, lowest ids first.
+    Returns ``(expenditures, payment_logs)`` archived.
+    """
+    ids = list(archivable(cutoff).select_for_update().order_by('id').values_list('id', flat=True)[:batch_size])
+    if not ids:
+        return 0, 0
+    expenditures = list(Expenditure.objects.filter(id__in=ids).values(
+        'id', 'occasion_id', 'event_name', 'amount', 'expender_id', 'created_at',
+    ))
+    shares = list(ExpenditureShare.objects.filter(expenditure_id__in=ids).order_by('expenditure_id', 'user_id').values(
+        'expenditure_id', 'occasion_id', 'user_id', 'expender_id', 'amount_cents',
+    ))
+    payment_logs = list(PaymentLog.objects.filter(expenditure_id__in=ids).values(
+        'id', 'expenditure_id', 'payer_id', 'payee_id', 'amount', 'timestamp',
+    ))
+
+    utilizers = defaultdict(list)
+    for share in shares:
+        utilizers[share['expenditure_id']].append([share['user_id'], share['amount_cents']])
+    ArchivedExpenditure.objects.bulk_create([
+        ArchivedExpenditure(utilizers=utilizers[expenditure['id']], **expenditure) for expenditure in expenditures
+    ], batch_size=INSERT_BATCH_SIZE)
+    ArchivedPaymentLog.objects.bulk_create(
+        [ArchivedPaymentLog(**log) for log in payment_logs], batch_size=INSERT_BATCH_SIZE,
+    )
+    _add_to_carry(_carry_deltas(expenditures, shares, payment_logs))
+
+    # Utilizer links and shares have no delete receivers, so these are plain DELETEs
+    Expenditure.utilizers.through.objects.filter(expenditure_id__in=ids).delete()
+    ExpenditureShare.objects.filter(expenditure_id__in=ids).delete()
+    with changes.no_tombstones():
+        PaymentLog.objects.filter(expenditure_id__in=ids).delete()
+        Expenditure.objects.filter(id__in=ids).delete()
+
+    # Totals are unchanged, but cached summaries list expenditures that are gone
+    occasion_ids = {expenditure['occasion_id'] for expenditure in expenditures}
+    Occasion.objects.filter(pk__in=occasion_ids).update(version=F('version') + 1)
+    summary_cache.record_invalidations(len(occasion_ids))
+    return len(expenditures), len(payment_logs)
+
+
+def archive(cutoff, batch_size=BATCH_SIZE, max_batches=None):
+    """
+    Archive batches until nothing before ``cutoff`` is left or ``max_batches`` have run.
+    Yields ``(expenditures, payment_logs)`` per batch.
+    """
+    done = 0
+    while max_batches is None or done < max_batches:
+        archived = archive_batch(cutoff, batch_size)
+        if not archived[0]:
+            return
+        done += 1
+        yield archived
+
+
+def table_sizes(models=HOT_MODELS):
+    """
+    ``{table: (table_bytes, index_bytes)}`` for the tables of ``models``, or ``None`` when
+    the database cannot tell (SQLite without the ``dbstat`` table, other vendors).
+    """
+    tables = [model._meta.db_table for model in models]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            try:
+                cursor.execute(
+                    "SELECT m.tbl_name, m.type, SUM(s.pgsize) FROM dbstat s JOIN sqlite_master m ON m.name = s.name "
+                    f"WHERE m.tbl_name IN ({', '.join(['%s'] * len(tables))}) GROUP BY m.tbl_name, m.type",
+                    tables,
+                )
+            except OperationalError:
+                return None
+            sizes = dict.fromkeys(tables, (0, 0))
+            for table, kind, size in cursor.fetchall():
+                table_bytes, index_bytes = sizes[table]
+                sizes[table] = (table_bytes + size, index_bytes) if kind == 'table' else (table_bytes, index_bytes + size)
+            return sizes
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                "SELECT relname, pg_table_size(oid), pg_indexes_size(oid) FROM pg_class WHERE relname = ANY(%s)",
+                [tables],
+            )
+            return {table: (table_bytes, index_bytes) for table, table_bytes, index_bytes in cursor.fetchall()}
+    return None
+
+
+def free_bytes():
+    """
+    Bytes of unused pages inside the SQLite file, which ``VACUUM`` returns to the filesystem.
+    """
+    if connection.vendor != 'sqlite':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA freelist_count")
+        pages = cursor.fetchone()[0]
+        cursor.execute("PRAGMA page_size")
+        return pages * cursor.fetchone()[0]
+
+
+def vacuum(models=HOT_MODELS):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            for model in models:
+                cursor.execute(f'VACUUM {connection.ops.quote_name(model._meta.db_table)}')
+        elif connection.vendor == 'sqlite':
+            cursor.execute('VACUUM')
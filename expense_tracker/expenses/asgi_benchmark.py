@@ -0,0 +1,196 @@
+"""
+Compare the same requests served three ways at increasing concurrency:
+
+* ``wsgi``: synchronous views through the WSGI handler, one thread per concurrent client,
+  the way a threaded WSGI server runs them.
+* ``asgi-sync``: the synchronous DRF views through the ASGI handler, which runs each one
+  in the shared sync thread.
+* ``asgi-async``: the native async views through the ASGI handler.
+
+No server or network is involved; the test clients call the handlers in-process, so the
+numbers isolate the handler and view model.
+"""
+import asyncio
+import itertools
+import statistics
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+from django.db import connections
+from django.test import AsyncClient, Client
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import RefreshToken
+
+MODES = ('wsgi', 'asgi-sync', 'asgi-async')
+SYNC_ROUTES = {'summary': 'occasion-summary', 'create': 'expenditure-create'}
+ASYNC_ROUTES = {'summary': 'async-occasion-summary', 'create': 'async-expenditure-create'}
+
+
+@dataclass
+class Workload:
+    name: str
+    method: str
+    prepare: Callable
+
+
+def build_workloads(user_ids, read_occasion, write_occasion):
+    counter = itertools.count()
+
+    def expenditure_item():
+        index = next(counter)
+        return {
+            'occasion': write_occasion.id,
+            'event_name': f'ASGI {index}',
+            'amount': f'{(index % 1000) + 1}.25',
+            'expender': user_ids[index % len(user_ids)],
+            'utilizers': [user_ids[(index + offset) % len(user_ids)] for offset in range(1, 4)],
+        }
+
+    return {
+        'summary': Workload('summary', 'get', lambda routes: (
+            reverse(routes['summary'], kwargs={'pk': read_occasion.id}), None,
+        )),
+        'create': Workload('create', 'post', lambda routes: (reverse(routes['create']), expenditure_item())),
+    }
+
+
+class ThreadSampler:
+    """
+    Record the highest number of live threads while the block runs.
+    """
+    def __init__(self, interval=0.002):
+        self.interval = interval
+        self.peak = 0
+        self.stopped = threading.Event()
+
+    def sample(self):
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, threading.active_count())
+
+    def __enter__(self):
+        self.peak = threading.active_count()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+        # The sampler itself is not part of the workload
+        self.peak -= 1
+
+
+def run_wsgi(workload, requests, concurrency, headers):
+    counter = itertools.count()
+    lock = threading.Lock()
+    latencies, errors = [], []
+
+    def client_thread():
+        client = Client(headers=headers)
+        try:
+            while True:
+                with lock:
+                    if next(counter) >= requests:
+                        return
+                    url, data = workload.prepare(SYNC_ROUTES)
+                start = time.perf_counter()
+                try:
+                    response = send(client, workload, url, data)
+                except Exception as error:
+                    errors.append(repr(error))
+                    continue
+                latencies.append(time.perf_counter() - start)
+                if response.status_code >= 400:
+                    errors.append(response.status_code)
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=client_thread) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors
+
+
+def run_asgi(workload, requests, concurrency, headers, routes):
+    counter = itertools.count()
+    latencies, errors = [], []
+
+    async def client_task(client):
+        while next(counter) < requests:
+            url, data = workload.prepare(routes)
+            start = time.perf_counter()
+            try:
+                response = await asend(client, workload, url, data)
+            except Exception as error:
+                errors.append(repr(error))
+                continue
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors.append(response.status_code)
+
+    async def main():
+        client = AsyncClient(headers=headers)
+        await asyncio.gather(*(client_task(client) for _ in range(concurrency)))
+
+    asyncio.run(main())
+    return latencies, errors
+
+
+def send(client, workload, url, data):
+    if workload.method == 'get':
+        return client.get(url, data)
+    return client.post(url, data, content_type='application/json')
+
+
+async def asend(client, workload, url, data):
+    if workload.method == 'get':
+        return await client.get(url, data)
+    return await client.post(url, data, content_type='application/json')
+
+
+def run_mode(mode, workload, requests, concurrency, headers):
+    with ThreadSampler() as threads:
+        start = time.perf_counter()
+        if mode == 'wsgi':
+            latencies, errors = run_wsgi(workload, requests, concurrency, headers)
+        else:
+            routes = ASYNC_ROUTES if mode == 'asgi-async' else SYNC_ROUTES
+            latencies, errors = run_asgi(workload, requests, concurrency, headers, routes)
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    result = {
+        'mode': mode,
+        'workload': workload.name,
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'peak_threads': threads.peak,
+    }
+    if latencies:
+        result['p50_ms'] = round(latencies[len(latencies) // 2] * 1000, 3)
+        result['p99_ms'] = round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 3)
+        result['mean_ms'] = round(statistics.fmean(latencies) * 1000, 3)
+    if errors:
+        result['first_error'] = str(errors[0])
+    return result
+
+
+def run_comparison(user, user_ids, read_occasion, write_occasion, concurrency=(1, 10, 100), requests=300,
+                   modes=MODES, workloads=('summary', 'create')):
+    """
+    Run every workload in every mode at each concurrency level and return the result rows.
+    """
+    headers = {'Authorization': f'Bearer {RefreshToken.for_user(user).access_token}'}
+    available = build_workloads(user_ids, read_occasion, write_occasion)
+    results = []
+    for name in workloads:
+        for level in concurrency:
+            for mode in modes:
+                results.append(run_mode(mode, available[name], requests, level, headers))
+    return results
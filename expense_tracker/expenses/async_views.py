@@ -0,0 +1,203 @@
+"""
+Native async versions of the summary, create and clear endpoints for ASGI deployments.
+
+DRF views are synchronous, so under ASGI each request holds a worker thread from start
+to finish. These are plain Django async views instead: they authenticate with
+``CachedJWTAuthentication.aauthenticate()``, read through the async ORM, and only hand
+the write transaction itself to a thread, since Django transactions are sync-only.
+Request and response bodies match the synchronous endpoints, and the create and clear
+endpoints accept an ``Idempotency-Key`` like them.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from django.views import View
+from rest_framework import exceptions, serializers, status
+from rest_framework.request import Request
+
+from expense_tracker import renderers
+from users.authentication import CachedJWTAuthentication
+
+from . import summary_cache
+from .changes import record_expenditure_changes
+from .clearing import acheck_clears, apply_clears
+from .idempotency import aidempotent, store_claimed
+from .models import Expenditure, Occasion
+from .pagination import KeysetPagination
+from .serializers import (
+    BulkExpenditureItemSerializer,
+    ClearExpenseItemSerializer,
+    ExpenditureSerializer,
+    OccasionSummarySerializer,
+)
+from .shares import add_utilizers
+from .totals import record_expenditure
+from .views import OccasionExpenditureSummaryView, clear_message, payment_log_summary
+
+User = get_user_model()
+
+DOES_NOT_EXIST = serializers.PrimaryKeyRelatedField.default_error_messages['does_not_exist']
+
+
+class AsyncAPIView(View):
+    """
+    The parts of DRF's ``APIView`` these endpoints need: JWT authentication, JSON in and
+    out, and API exceptions turned into error responses.
+    """
+    authentication = CachedJWTAuthentication()
+    renderer = renderers.FastJSONRenderer()
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        # Same as DRF's views: requests authenticate with a token, not a session cookie
+        view.csrf_exempt = True
+        return view
+
+    def render(self, data, status_code=status.HTTP_200_OK, headers=None):
+        return HttpResponse(
+            self.renderer.render(data), status=status_code, content_type='application/json', headers=headers,
+        )
+
+    def parse_json(self, request):
+        if request.content_type != 'application/json':
+            raise exceptions.UnsupportedMediaType(request.content_type)
+        try:
+            return renderers.loads(request.body or b'{}')
+        except ValueError as exc:
+            raise exceptions.ParseError(f'JSON parse error - {exc}')
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            authenticated = await self.authentication.aauthenticate(request)
+            request.user, request.auth = authenticated or (AnonymousUser(), None)
+            return await super().dispatch(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            return self.handle_exception(exc)
+
+    def handle_exception(self, exc):
+        headers = None
+        if isinstance(exc, exceptions.AuthenticationFailed):
+            headers = {'WWW-Authenticate': self.authentication.authenticate_header(self.request)}
+        detail = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+        return self.render(detail, exc.status_code, headers)
+
+    async def commit(self, respond):
+        """
+        ``respond()``, which writes and builds the response, in a transaction in a thread.
+        The response of a request with an ``Idempotency-Key`` is stored in the same transaction.
+        """
+        @sync_to_async
+        @transaction.atomic
+        def run():
+            response = respond()
+            store_claimed(response)
+            return response
+        return await run()
+
+
+class AsyncOccasionSummaryView(AsyncAPIView):
+    expenditure_queryset = OccasionExpenditureSummaryView.expenditure_queryset
+    ordering = OccasionExpenditureSummaryView.ordering
+
+    async def get(self, request, pk):
+        try:
+            occasion = await Occasion.objects.aget(pk=pk)
+        except Occasion.DoesNotExist:
+            return self.render({"error": "Occasion not found."}, status.HTTP_404_NOT_FOUND)
+
+        etag = summary_cache.summary_etag(occasion, request)
+        last_modified = int(occasion.last_activity_at.timestamp()) if occasion.last_activity_at else None
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            patch_vary_headers(not_modified, ['Accept'])
+            return not_modified
+
+        data, content = await summary_cache.aget_or_build(
+            occasion, request, lambda: self.build_summary(occasion, request),
+        )
+        if content is None:
+            response = self.render(data)
+        else:
+            response = HttpResponse(content, content_type='application/json')
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ['Accept'])
+        return response
+
+    async def build_summary(self, occasion, request):
+        paginator = KeysetPagination()
+        occasion.expenditure_page = await paginator.apaginate_queryset(
+            self.expenditure_queryset.filter(occasion=occasion), Request(request), self,
+        )
+        data = OccasionSummarySerializer(occasion).data
+        data['expenditures_next'] = paginator.get_next_link()
+        return data
+
+
+def create_expenditure(data):
+    expenditure = Expenditure.objects.create(
+        occasion_id=data.get('occasion'),
+        event_name=data['event_name'],
+        amount=data['amount'],
+        expender_id=data['expender'],
+    )
+    add_utilizers([(expenditure, data['utilizers'])])
+    record_expenditure(expenditure)
+    record_expenditure_changes([expenditure])
+    return ExpenditureSerializer(expenditure).data
+
+
+class AsyncExpenditureCreateView(AsyncAPIView):
+    @aidempotent
+    async def post(self, request):
+        serializer = BulkExpenditureItemSerializer(data=self.parse_json(request))
+        if not serializer.is_valid():
+            return self.render(serializer.errors, status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+
+        errors = await self.check_references(data)
+        if errors:
+            return self.render(errors, status.HTTP_400_BAD_REQUEST)
+        return await self.commit(lambda: self.render(create_expenditure(data), status.HTTP_201_CREATED))
+
+    async def check_references(self, data):
+        errors = {}
+        user_ids = {data['expender'], *data['utilizers']}
+        found = {user_id async for user_id in User.objects.filter(id__in=user_ids).values_list('id', flat=True)}
+        if data['expender'] not in found:
+            errors['expender'] = [DOES_NOT_EXIST.format(pk_value=data['expender'])]
+        missing = [user_id for user_id in data['utilizers'] if user_id not in found]
+        if missing:
+            errors['utilizers'] = [DOES_NOT_EXIST.format(pk_value=missing[0])]
+        occasion_id = data.get('occasion')
+        if occasion_id is not None and not await Occasion.objects.filter(pk=occasion_id).aexists():
+            errors['occasion'] = [DOES_NOT_EXIST.format(pk_value=occasion_id)]
+        return errors
+
+
+class AsyncClearExpenseView(AsyncAPIView):
+    @aidempotent
+    async def post(self, request):
+        serializer = ClearExpenseItemSerializer(data=self.parse_json(request))
+        if not serializer.is_valid():
+            return self.render(serializer.errors, status.HTTP_400_BAD_REQUEST)
+
+        accepted, errors = await acheck_clears([serializer.validated_data])
+        if errors:
+            return self.render({'non_field_errors': errors[0]['errors']}, status.HTTP_400_BAD_REQUEST)
+        return await self.commit(lambda: self.clear(accepted))
+
+    def clear(self, accepted):
+        cleared, errors = apply_clears(accepted)
+        if errors:
+            return self.render({'non_field_errors': errors[0]['errors']}, status.HTTP_400_BAD_REQUEST)
+        return self.render({
+            "message": clear_message(cleared[0][1]),
+            "payment_log": payment_log_summary(cleared[0][1]),
+        })
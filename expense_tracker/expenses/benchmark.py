@@ -0,0 +1,127 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models import F
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from .models import Expenditure, ExpenditureShare, Occasion, PaymentLog
+from .shares import add_utilizers, payoffs
+from .rollups import rebuild_rollups
+from .totals import rebuild_totals
+
+User = get_user_model()
+
+BATCH_SIZE = 5000
+
+
+@contextmanager
+def isolated_database(keepdb=False):
+    """
+    Run the body against a throwaway test database so benchmarks never touch real data.
+
+    The test environment is set up as well, so the body can drive views with the test client.
+    """
+    old_name = connection.settings_dict['NAME']
+    setup_test_environment(debug=False)
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keepdb)
+    # Point TEST['MIRROR'] aliases (the read replica) at the throwaway database as well
+    mirrors = {
+        alias: connections[alias].settings_dict['NAME'] for alias in connections
+        if connections[alias].settings_dict['TEST'].get('MIRROR') == DEFAULT_DB_ALIAS
+    }
+    for alias in mirrors:
+        connections[alias].close()
+        connections[alias].creation.set_as_test_mirror(connection.settings_dict)
+    try:
+        yield
+    finally:
+        for alias, name in mirrors.items():
+            connections[alias].close()
+            connections[alias].settings_dict['NAME'] = name
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+        teardown_test_environment()
+
+
+@contextmanager
+def timer(results, name):
+    start = time.perf_counter()
+    yield
+    results[name] = time.perf_counter() - start
+
+
+def seed_users(count, prefix='bench-user'):
+    User.objects.bulk_create(
+        [User(username=f'{prefix}-{i}', password='!') for i in range(count)],
+        batch_size=BATCH_SIZE,
+    )
+    return list(User.objects.filter(username__startswith=f'{prefix}-').values_list('id', flat=True))
+
+
+def seed_occasion(expenditures, user_ids, utilizers_per_expenditure=4, seed=0, name='Benchmark Occasion'):
+    """
+    Bulk insert one occasion with ``expenditures`` expenditures spread over ``user_ids``.
+    """
+    rng = random.Random(seed)
+    occasion = Occasion.objects.create(name=name, date=date(2025, 1, 1) + timedelta(days=seed))
+
+    group_size = min(utilizers_per_expenditure, len(user_ids))
+    for offset in range(0, expenditures, BATCH_SIZE):
+        rows = [
+            Expenditure(
+                occasion=occasion,
+                event_name=f'Expense {offset + i}',
+                amount=Decimal(rng.randint(100, 100000)) / 100,
+                expender_id=rng.choice(user_ids),
+            )
+            for i in range(min(BATCH_SIZE, expenditures - offset))
+        ]
+        Expenditure.objects.bulk_create(rows)
+        add_utilizers([(row, rng.sample(user_ids, group_size)) for row in rows])
+    rebuild_totals(Occasion.objects.filter(pk=occasion.pk))
+    rebuild_rollups(Occasion.objects.filter(pk=occasion.pk))
+    return occasion
+
+
+def seed_payments(occasion, fraction, seed=0):
+    """
+    Clear a random ``fraction`` of the occasion's expenditures, each paid off in one
+    payment by one of its utilizers.
+    """
+    rng = random.Random(seed)
+    expenditures = dict(
+        Expenditure.objects.filter(occasion=occasion, cleared=False).order_by('id').values_list('id', 'expender_id')
+    )
+    chosen = sorted(rng.sample(list(expenditures), int(len(expenditures) * fraction)))
+    for offset in range(0, len(chosen), BATCH_SIZE):
+        batch = chosen[offset:offset + BATCH_SIZE]
+        PaymentLog.objects.bulk_create([
+            PaymentLog(expenditure_id=expenditure_id, payer_id=payer_id, payee_id=expenditures[expenditure_id], amount=amount)
+            for expenditure_id, payer_id, amount in payoffs(batch)
+        ])
+        ExpenditureShare.objects.filter(expenditure_id__in=batch).update(paid_cents=F('amount_cents'))
+        Expenditure.objects.filter(id__in=batch).update(cleared=True)
+    return len(chosen)
+
+
+def seed_dataset(users, occasions, expenditures, utilizers_per_expenditure=4, cleared=0.3, seed=0, prefix='bench-user'):
+    """
+    Bulk insert ``users`` users and ``occasions`` occasions of ``expenditures`` expenditures each.
+
+    The same arguments always produce the same rows. Returns ``(user_ids, occasions)``.
+    """
+    user_ids = seed_users(users, prefix=prefix)
+    seeded = []
+    for index in range(occasions):
+        occasion = seed_occasion(
+            expenditures, user_ids, utilizers_per_expenditure, seed=seed + index, name=f'Occasion {index + 1}',
+        )
+        seed_payments(occasion, cleared, seed=seed + index)
+        seeded.append(occasion)
+    rebuild_totals(Occasion.objects.filter(pk__in=[occasion.pk for occasion in seeded]))
+    rebuild_rollups(Occasion.objects.filter(pk__in=[occasion.pk for occasion in seeded]))
+    return user_ids, seeded
@@ -0,0 +1,141 @@
+"""
+The per-occasion change log behind ``occasions/<pk>/changes/?since=<cursor>``.
+
+Every write to an expenditure or payment log appends a ``ChangeLogEntry`` in the same
+transaction. The API write paths call ``record_changes()`` next to
+``expenses.totals``; single-row ORM writes (the admin, the shell, utilizer edits) are
+caught by the signal handlers below. Deletes append a tombstone, except inside
+``no_tombstones()``, for rows that move elsewhere rather than go away (archiving).
+
+Entry ids are assigned at insert but become visible at commit, so on a database with
+concurrent writers a slow transaction can commit an id below a cursor a client already
+holds. ``EXPENSES_CHANGES_SETTLE_SECONDS`` holds back entries younger than that many
+seconds; set it above the longest write transaction on such databases. SQLite runs one
+write transaction at a time, hence the default of 0.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import ChangeLogEntry, Expenditure
+
+BATCH_SIZE = 2000
+
+_tombstones = ContextVar('change_log_tombstones', default=True)
+
+
+@contextmanager
+def no_tombstones():
+    """
+    Deletes in the block are not recorded by the signal handlers.
+    """
+    token = _tombstones.set(False)
+    try:
+        yield
+    finally:
+        _tombstones.reset(token)
+
+
+def expenditure_entries(expenditures, deleted=False):
+    return [
+        ChangeLogEntry(
+            occasion_id=expenditure.occasion_id, kind=ChangeLogEntry.EXPENDITURE, object_id=expenditure.id, deleted=deleted,
+        )
+        for expenditure in expenditures if expenditure.occasion_id is not None
+    ]
+
+
+def payment_log_entries(payment_logs, occasion_ids, deleted=False):
+    """
+    ``occasion_ids`` maps each payment log's expenditure id to its occasion id.
+    """
+    return [
+        ChangeLogEntry(
+            occasion_id=occasion_ids[log.expenditure_id], kind=ChangeLogEntry.PAYMENT_LOG, object_id=log.id, deleted=deleted,
+        )
+        for log in payment_logs if occasion_ids.get(log.expenditure_id) is not None
+    ]
+
+
+def record_changes(entries):
+    """
+    Append ``entries`` to the log with one INSERT per ``BATCH_SIZE``.
+    """
+    ChangeLogEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE)
+
+
+def record_expenditure_changes(expenditures, deleted=False):
+    record_changes(expenditure_entries(expenditures, deleted))
+
+
+def latest_cursor(occasion_id):
+    return (
+        ChangeLogEntry.objects.filter(occasion_id=occasion_id)
+        .order_by('-id').values_list('id', flat=True).first()
+    ) or 0
+
+
+def changes_since(occasion_id, cursor, limit):
+    """
+    The changes logged for an occasion after ``cursor``, oldest first, at most ``limit``
+    entries. Returns ``(upserts, deletes, next_cursor, has_more)``; ``upserts`` and
+    ``deletes`` map each kind to the ids whose latest entry is a write or a delete.
+    """
+    entries = ChangeLogEntry.objects.filter(occasion_id=occasion_id, id__gt=cursor)
+    settle = getattr(settings, 'EXPENSES_CHANGES_SETTLE_SECONDS', 0)
+    if settle:
+        entries = entries.filter(created_at__lte=timezone.now() - timedelta(seconds=settle))
+    entries = list(entries.order_by('id').values_list('id', 'kind', 'object_id', 'deleted')[:limit + 1])
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    latest = {}
+    for _, kind, object_id, deleted in entries:
+        latest[kind, object_id] = deleted
+    upserts = {kind: [] for kind, _ in ChangeLogEntry.KIND_CHOICES}
+    deletes = {kind: [] for kind, _ in ChangeLogEntry.KIND_CHOICES}
+    for (kind, object_id), deleted in latest.items():
+        (deletes if deleted else upserts)[kind].append(object_id)
+    next_cursor = entries[-1][0] if entries else cursor
+    return upserts, deletes, next_cursor, has_more
+
+
+def expenditure_saved(sender, instance, created, raw=False, **kwargs):
+    # New expenditures are logged by the write paths together with their utilizers
+    if created or raw:
+        return
+    record_expenditure_changes([instance])
+
+
+def expenditure_deleted(sender, instance, **kwargs):
+    if _tombstones.get():
+        record_expenditure_changes([instance], deleted=True)
+
+
+def utilizers_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == 'pre_clear':
+        # Changed from the user's side: after the clear there is no telling which expenditures it touched
+        record_expenditure_changes(instance.expenditures_utilized.only('id', 'occasion_id'))
+    elif action in ('post_add', 'post_remove') and reverse:
+        record_expenditure_changes(Expenditure.objects.filter(pk__in=pk_set).only('id', 'occasion_id'))
+    elif action in ('post_add', 'post_remove', 'post_clear') and not reverse:
+        record_expenditure_changes([instance])
+
+
+def _payment_log_changed(payment_log, deleted=False):
+    occasion_id = Expenditure.objects.filter(pk=payment_log.expenditure_id).values_list('occasion_id', flat=True).first()
+    record_changes(payment_log_entries([payment_log], {payment_log.expenditure_id: occasion_id}, deleted))
+
+
+def payment_log_saved(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        _payment_log_changed(instance)
+
+
+def payment_log_deleting(sender, instance, **kwargs):
+    # pre_delete, so a cascade from the expenditure has not removed it yet and its occasion is still known
+    if _tombstones.get():
+        _payment_log_changed(instance, deleted=True)
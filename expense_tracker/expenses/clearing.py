@@ -0,0 +1,289 @@
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from django.db import connections, router, transaction
+from django.db.models import Case, Exists, F, IntegerField, OuterRef, Q, Value, When
+
+from .changes import expenditure_entries, payment_log_entries, record_changes
+from .models import ArchivedExpenditure, Expenditure, ExpenditureShare, PaymentLog
+from .shares import amount_cents
+from .totals import record_payments
+
+NOT_FOUND = "Expenditure does not exist."
+ALREADY_CLEARED = "This expense has already been cleared."
+AMOUNT_NOT_POSITIVE = "The payment amount must be greater than zero."
+AMOUNT_TOO_LARGE = "The payment amount must not exceed what is still owed."
+PAYER_NOT_UTILIZER = "The payer must be one of the utilizers."
+PAYER_IS_EXPENDER = "The expender cannot pay towards their own expenditure."
+
+# Shares updated per statement, two query parameters each
+UPDATE_BATCH_SIZE = 400
+
+
+@dataclass
+class PendingClear:
+    index: int
+    expenditure: Expenditure
+    payer: object
+    amount: Decimal
+    # Share id -> cents of this payment applied to it
+    allocations: dict = field(default_factory=dict)
+
+
+class ClearRaceLost(Exception):
+    pass
+
+
+def _expenditures():
+    return (
+        Expenditure.objects.select_related('expender')
+        .only('id', 'occasion_id', 'amount', 'cleared', 'created_at', 'expender__id', 'expender__username')
+    )
+
+
+def _shares(expenditure_ids):
+    return (
+        ExpenditureShare.objects.filter(expenditure_id__in=expenditure_ids)
+        .select_related('user')
+        .only('id', 'expenditure_id', 'amount_cents', 'paid_cents', 'user__id', 'user__username')
+        .order_by('expenditure_id', 'user_id')
+    )
+
+
+def _group_shares(shares):
+    grouped = {}
+    for share in shares:
+        grouped.setdefault(share.expenditure_id, {})[share.user_id] = share
+    return grouped
+
+
+def check_clears(items):
+    """
+    Check payment requests against the database in two queries, whatever their number.
+
+    Returns ``(accepted, errors)`` where ``errors`` holds ``{'index', 'errors'}`` entries.
+    Payments towards the same expenditure in one batch are checked against what the
+    earlier ones leave owing. Ids not found are looked up among archived expenditures
+    with a third query.
+    """
+    ids = {item['expenditure_id'] for item in items}
+    expenditures = _expenditures().in_bulk(ids)
+    missing = ids - expenditures.keys()
+    archived = set(ArchivedExpenditure.objects.filter(id__in=missing).values_list('id', flat=True)) if missing else set()
+    return judge_clears(items, expenditures, _group_shares(_shares(list(expenditures))), archived)
+
+
+async def acheck_clears(items):
+    """
+    ``check_clears()`` through the async ORM.
+    """
+    ids = {item['expenditure_id'] for item in items}
+    expenditures = await _expenditures().ain_bulk(ids)
+    missing = ids - expenditures.keys()
+    archived = (
+        {expenditure_id async for expenditure_id in ArchivedExpenditure.objects.filter(id__in=missing).values_list('id', flat=True)}
+        if missing else set()
+    )
+    return judge_clears(items, expenditures, _group_shares([share async for share in _shares(list(expenditures))]), archived)
+
+
+def allocate(payer_id, cents, shares, owed):
+    """
+    Spread ``cents`` over the unpaid shares: the payer's own share first, then everyone
+    else's in user id order. ``owed`` maps share ids to cents still owed and is updated.
+    """
+    order = sorted(shares.values(), key=lambda share: (share.user_id != payer_id, share.user_id))
+    allocations = {}
+    for share in order:
+        if not cents:
+            break
+        paid = min(cents, owed[share.id])
+        if paid:
+            allocations[share.id] = paid
+            owed[share.id] -= paid
+            cents -= paid
+    return allocations
+
+
+def judge_clears(items, expenditures, shares, archived=()):
+    accepted, errors = [], []
+    owed = {
+        share.id: share.amount_cents - share.paid_cents
+        for by_user in shares.values() for share in by_user.values()
+    }
+    for index, item in enumerate(items):
+        expenditure = expenditures.get(item['expenditure_id'])
+        by_user = shares.get(item['expenditure_id'], {})
+        payer_share = by_user.get(item['payer_id'])
+        outstanding = sum(owed[share.id] for share in by_user.values())
+        cents = amount_cents(item['amount'])
+        if expenditure is None:
+            error = ALREADY_CLEARED if item['expenditure_id'] in archived else NOT_FOUND
+        elif expenditure.cleared or not outstanding:
+            error = ALREADY_CLEARED
+        elif cents <= 0:
+            error = AMOUNT_NOT_POSITIVE
+        elif cents > outstanding:
+            error = AMOUNT_TOO_LARGE
+        elif payer_share is None:
+            error = PAYER_NOT_UTILIZER
+        elif item['payer_id'] == expenditure.expender_id:
+            error = PAYER_IS_EXPENDER
+        else:
+            allocations = allocate(item['payer_id'], cents, by_user, owed)
+            accepted.append(PendingClear(index, expenditure, payer_share.user, item['amount'], allocations))
+            continue
+        errors.append({'index': index, 'errors': [error]})
+    return accepted, errors
+
+
+def _allocated(batch, allocations, sign=1):
+    return Case(
+        *[When(id=share_id, then=Value(sign * allocations[share_id])) for share_id in batch],
+        output_field=IntegerField(),
+    )
+
+
+def _pay_shares(allocations):
+    """
+    Add the allocated cents to the shares' ``paid_cents``; raise ``ClearRaceLost``, with
+    nothing changed, if another payment got there first: a share would end up overpaid,
+    or its expenditure has been cleared.
+
+    Each batch is one UPDATE that pays all of its shares or none of them, so its row
+    count tells a lost race apart without a savepoint to roll back to.
+    """
+    share_ids = list(allocations)
+    paid = []
+    for offset in range(0, len(share_ids), UPDATE_BATCH_SIZE):
+        batch = share_ids[offset:offset + UPDATE_BATCH_SIZE]
+        new_paid = F('paid_cents') + _allocated(batch, allocations)
+        blocked = ExpenditureShare.objects.filter(id__in=batch).alias(new_paid=new_paid).filter(
+            Q(new_paid__gt=F('amount_cents')) | Q(expenditure__cleared=True),
+        )
+        updated = ExpenditureShare.objects.filter(id__in=batch).filter(~Exists(blocked)).update(paid_cents=new_paid)
+        if updated != len(batch):
+            # Only a share deleted meanwhile leaves some of the batch paid
+            if updated:
+                paid.extend(batch)
+            _unpay_shares(paid, allocations)
+            raise ClearRaceLost
+        paid.extend(batch)
+
+
+def _unpay_shares(share_ids, allocations):
+    for offset in range(0, len(share_ids), UPDATE_BATCH_SIZE):
+        batch = share_ids[offset:offset + UPDATE_BATCH_SIZE]
+        ExpenditureShare.objects.filter(id__in=batch).update(
+            paid_cents=F('paid_cents') + _allocated(batch, allocations, -1),
+        )
+
+
+def _lock_uncleared(ids):
+    """
+    The ids that are still uncleared, locked until the transaction ends so concurrent
+    payments towards the same expenditure queue up behind each other.
+
+    Backends without row locks (SQLite) already run one write transaction at a time, so
+    the ids are returned unchecked; a payment towards an expenditure cleared meanwhile is
+    turned away by ``_pay_shares()``.
+    """
+    if not connections[router.db_for_write(Expenditure)].features.has_select_for_update:
+        return set(ids)
+    return set(
+        Expenditure.objects.select_for_update().filter(id__in=ids, cleared=False)
+        .order_by('id').values_list('id', flat=True)
+    )
+
+
+def _apply_each(accepted):
+    """
+    Re-check and apply payments one by one after a batch lost a race, so only the
+    payments that no longer fit are turned away.
+    """
+    applied, errors = [], []
+    for pending in accepted:
+        rechecked, item_errors = check_clears([{
+            'expenditure_id': pending.expenditure.id,
+            'payer_id': pending.payer.id,
+            'amount': pending.amount,
+        }])
+        if rechecked:
+            try:
+                _pay_shares(rechecked[0].allocations)
+            except ClearRaceLost:
+                item_errors = [{'errors': [ALREADY_CLEARED]}]
+            else:
+                rechecked[0].index = pending.index
+                applied.append(rechecked[0])
+                continue
+        errors.append({'index': pending.index, 'errors': item_errors[0]['errors']})
+    return applied, errors
+
+
+def _mark_cleared(ids):
+    """
+    Flip ``cleared`` on every expenditure in ``ids`` that has nothing left owing and
+    return those expenditures' ids.
+    """
+    unpaid = ExpenditureShare.objects.filter(expenditure_id=OuterRef('pk'), paid_cents__lt=F('amount_cents'))
+    paid_off = list(
+        Expenditure.objects.filter(id__in=ids, cleared=False).exclude(Exists(unpaid)).values_list('id', flat=True)
+    )
+    if paid_off:
+        Expenditure.objects.filter(id__in=paid_off).update(cleared=True)
+    return set(paid_off)
+
+
+@transaction.atomic
+def apply_clears(accepted):
+    """
+    Apply the accepted payments to the shares, log them and clear every expenditure
+    they pay off.
+
+    Returns ``(payment_logs, errors)``; payments that lost a race with a concurrent one
+    come back as errors instead of payment logs. The expenditure of each logged payment
+    has ``cleared`` set if the payment finished it off.
+    """
+    uncleared = _lock_uncleared({pending.expenditure.id for pending in accepted})
+    errors = [
+        {'index': pending.index, 'errors': [ALREADY_CLEARED]}
+        for pending in accepted if pending.expenditure.id not in uncleared
+    ]
+    accepted = [pending for pending in accepted if pending.expenditure.id in uncleared]
+
+    allocations = {}
+    for pending in accepted:
+        for share_id, cents in pending.allocations.items():
+            allocations[share_id] = allocations.get(share_id, 0) + cents
+    try:
+        # The common case is one conditional UPDATE per batch of shares
+        _pay_shares(allocations)
+    except ClearRaceLost:
+        accepted, race_errors = _apply_each(accepted)
+        errors.extend(race_errors)
+
+    paid_off = _mark_cleared({pending.expenditure.id for pending in accepted})
+    for pending in accepted:
+        pending.expenditure.cleared = pending.expenditure.id in paid_off
+
+    payment_logs = PaymentLog.objects.bulk_create([
+        PaymentLog(
+            expenditure=pending.expenditure,
+            payer=pending.payer,
+            payee=pending.expenditure.expender,
+            amount=pending.amount,
+        )
+        for pending in accepted
+    ])
+    if payment_logs:
+        expenditures = {pending.expenditure.id: pending.expenditure for pending in accepted}
+        cleared = [expenditures[expenditure_id] for expenditure_id in paid_off]
+        record_payments(
+            [expenditure.occasion_id for expenditure in expenditures.values()],
+            cleared,
+            payment_logs[-1].timestamp,
+        )
+        occasion_ids = {expenditure_id: expenditure.occasion_id for expenditure_id, expenditure in expenditures.items()}
+        record_changes(expenditure_entries(cleared) + payment_log_entries(payment_logs, occasion_ids))
+    return [(pending.index, log) for pending, log in zip(accepted, payment_logs)], errors
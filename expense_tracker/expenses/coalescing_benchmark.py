@@ -0,0 +1,84 @@
+"""
+Burst load on one occasion summary, the way a push notification sends a whole group to
+it at once: every round invalidates the summary, then ``clients`` threads request it at
+the same moment. Run with and without ``EXPENSES_SUMMARY_COALESCING`` to compare the
+process CPU time spent per request and how many requests computed the summary.
+"""
+import statistics
+import threading
+import time
+
+from django.db import connections
+from django.db.models import F
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from . import summary_cache
+from .models import Occasion
+
+MODES = ('uncoalesced', 'coalesced')
+
+
+def run_burst(occasion, clients, rounds):
+    url = reverse('occasion-summary', kwargs={'pk': occasion.id})
+    start_round, end_round = threading.Barrier(clients + 1), threading.Barrier(clients + 1)
+    latencies, errors = [], []
+
+    def client_thread():
+        client = Client()
+        try:
+            for _ in range(rounds):
+                start_round.wait()
+                start = time.perf_counter()
+                response = client.get(url)
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors.append(response.status_code)
+                end_round.wait()
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=client_thread) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+
+    wall = cpu = 0.0
+    for _ in range(rounds):
+        # A new version, as after a write: every request in the round misses the cache
+        Occasion.objects.filter(pk=occasion.pk).update(version=F('version') + 1)
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        start_round.wait()
+        end_round.wait()
+        cpu += time.process_time() - cpu_start
+        wall += time.perf_counter() - wall_start
+    for thread in threads:
+        thread.join()
+    return latencies, errors, wall, cpu
+
+
+def run_comparison(occasion, clients=50, rounds=10, modes=MODES):
+    results = []
+    for mode in modes:
+        with override_settings(EXPENSES_SUMMARY_COALESCING=mode == 'coalesced'):
+            summary_cache.reset_stats()
+            latencies, errors, wall, cpu = run_burst(occasion, clients, rounds)
+            counts = summary_cache.stats()
+        requests = clients * rounds
+        result = {
+            'mode': mode,
+            'clients': clients,
+            'requests': requests,
+            'errors': len(errors),
+            'computed': counts['computed'],
+            'coalesced': counts['coalesced'],
+            'hits': counts['hits'],
+            'wall_seconds': wall,
+            'cpu_seconds': cpu,
+            'cpu_ms_per_request': cpu / requests * 1000,
+        }
+        if latencies:
+            latencies.sort()
+            result['p50_ms'] = statistics.median(latencies) * 1000
+            result['p99_ms'] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+        results.append(result)
+    return results
@@ -0,0 +1,18 @@
+"""
+The JSON encoding of API responses (``expense_tracker.renderers``), also used for what
+jobs store, so stored data reads back the way the API would send it.
+"""
+import decimal
+
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class ExactJSONEncoder(JSONEncoder):
+    """
+    DRF's encoder, except that Decimals are exact strings, the way serializer
+    ``DecimalField``s render them, rather than floats.
+    """
+    def default(self, obj):
+        if isinstance(obj, decimal.Decimal):
+            return format(obj, 'f')
+        return super().default(obj)
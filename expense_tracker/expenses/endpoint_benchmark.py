@@ -0,0 +1,252 @@
+"""
+In-process benchmark of every route in ``expenses.urls`` and ``users.urls``.
+
+Requests go through the full Django stack with the test client (JWT authentication,
+middleware, serializers, rendering) but no network, so the numbers isolate the
+application and the database. Each scenario is timed over ``iterations`` requests,
+then replayed ``alloc_iterations`` times under ``tracemalloc`` for allocation peaks,
+which would otherwise distort the latencies.
+"""
+import itertools
+import statistics
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Callable
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from expenses import urls as expenses_urls
+from users import urls as users_urls
+
+from . import jobs, summary_cache
+from .models import Expenditure
+from .shares import payoffs
+
+User = get_user_model()
+
+PERCENTILES = (50, 95, 99)
+BENCHMARK_PASSWORD = 'bench-password'
+BULK_ITEMS = 100
+BATCH_CLEARS = 10
+
+
+@dataclass
+class Scenario:
+    label: str
+    route: str
+    prepare: Callable
+    method: str = 'get'
+
+
+def route_names():
+    return [pattern.name for pattern in itertools.chain(expenses_urls.urlpatterns, users_urls.urlpatterns)]
+
+
+def uncleared_pool(occasion):
+    """
+    Iterator of ``(expenditure_id, payer_id, amount)`` for clear requests, lowest id first.
+    """
+    return iter(payoffs(Expenditure.objects.filter(occasion=occasion)))
+
+
+def build_scenarios(user, user_ids, read_occasion, write_occasion):
+    """
+    One or more scenarios per route. ``prepare`` runs outside the timed section and
+    returns ``(url, data)``, so write scenarios can pick fresh rows for every request.
+    """
+    clears = uncleared_pool(write_occasion)
+    counter = itertools.count()
+    refresh = str(RefreshToken.for_user(user))
+
+    def expenditure_item(prefix):
+        index = next(counter)
+        return {
+            'occasion': write_occasion.id,
+            'event_name': f'{prefix} {index}',
+            'amount': f'{(index % 1000) + 1}.25',
+            'expender': user_ids[index % len(user_ids)],
+            'utilizers': [user_ids[(index + offset) % len(user_ids)] for offset in range(1, 4)],
+        }
+
+    def clear_item():
+        expenditure_id, payer_id, amount = next(clears)
+        return {'expenditure_id': expenditure_id, 'payer_id': payer_id, 'amount': amount}
+
+    def cold_summary():
+        summary_cache.get_cache().clear()
+        return reverse('occasion-summary', kwargs={'pk': read_occasion.id}), None
+
+    def register():
+        index = next(counter)
+        return reverse('register'), {'username': f'bench-register-{index}', 'password': BENCHMARK_PASSWORD}
+
+    return [
+        Scenario('occasion-list', 'occasion-create', lambda: (reverse('occasion-create'), None)),
+        Scenario('occasion-create', 'occasion-create', lambda: (
+            reverse('occasion-create'), {'name': f'Benchmark {next(counter)}', 'date': '2025-06-01'},
+        ), 'post'),
+        Scenario('expenditure-list', 'expenditure-create', lambda: (
+            reverse('expenditure-create'), {'occasion': read_occasion.id},
+        )),
+        Scenario('expenditure-create', 'expenditure-create', lambda: (
+            reverse('expenditure-create'), expenditure_item('Benchmark'),
+        ), 'post'),
+        Scenario('expenditure-bulk-create', 'expenditure-bulk-create', lambda: (
+            reverse('expenditure-bulk-create'), {'expenditures': [expenditure_item('Bulk') for _ in range(BULK_ITEMS)]},
+        ), 'post'),
+        Scenario('payment-log-list', 'payment-log-list', lambda: (
+            reverse('payment-log-list'), {'occasion': read_occasion.id},
+        )),
+        Scenario('expenditure-export', 'expenditure-export', lambda: (
+            reverse('expenditure-export', kwargs={'export_format': 'csv'}), {'occasion': read_occasion.id},
+        )),
+        Scenario('payment-log-export', 'payment-log-export', lambda: (
+            reverse('payment-log-export', kwargs={'export_format': 'ndjson'}), {'occasion': read_occasion.id},
+        )),
+        Scenario('clear-expense', 'clear-expense', lambda: (reverse('clear-expense'), clear_item()), 'post'),
+        Scenario('clear-expense-batch', 'clear-expense-batch', lambda: (
+            reverse('clear-expense-batch'), {'clears': [clear_item() for _ in range(BATCH_CLEARS)]},
+        ), 'post'),
+        Scenario('occasion-summary', 'occasion-summary', lambda: (
+            reverse('occasion-summary', kwargs={'pk': read_occasion.id}), None,
+        )),
+        Scenario('occasion-summary-uncached', 'occasion-summary', cold_summary),
+        Scenario('occasion-settlement', 'occasion-settlement', lambda: (
+            reverse('occasion-settlement', kwargs={'pk': read_occasion.id}), None,
+        )),
+        Scenario('occasion-archive', 'occasion-archive', lambda: (
+            reverse('occasion-archive', kwargs={'pk': read_occasion.id}), None,
+        )),
+        Scenario('spend-analytics', 'spend-analytics', lambda: (
+            reverse('spend-analytics'), {'occasion': read_occasion.id, 'bucket': 'week'},
+        )),
+        # Queued jobs stay pending, so repeated requests share one job, as a burst of clients would
+        Scenario('occasion-settlement-job', 'occasion-settlement-job', lambda: (
+            reverse('occasion-settlement-job', kwargs={'pk': read_occasion.id}), None,
+        ), 'post'),
+        Scenario('occasion-totals-rebuild', 'occasion-totals-rebuild', lambda: (
+            reverse('occasion-totals-rebuild', kwargs={'pk': write_occasion.id}), None,
+        ), 'post'),
+        Scenario('job-detail', 'job-detail', lambda: (
+            reverse('job-detail', kwargs={'pk': jobs.enqueue('occasion_settlement', {'occasion_id': read_occasion.id})[0].id}),
+            None,
+        )),
+        # A client catching up on the occasion the write scenarios add to, one page at a time
+        Scenario('occasion-changes', 'occasion-changes', lambda: (
+            reverse('occasion-changes', kwargs={'pk': write_occasion.id}), {'since': 0},
+        )),
+        Scenario('async-occasion-summary', 'async-occasion-summary', lambda: (
+            reverse('async-occasion-summary', kwargs={'pk': read_occasion.id}), None,
+        )),
+        Scenario('async-expenditure-create', 'async-expenditure-create', lambda: (
+            reverse('async-expenditure-create'), expenditure_item('Async'),
+        ), 'post'),
+        Scenario('async-clear-expense', 'async-clear-expense', lambda: (
+            reverse('async-clear-expense'), clear_item(),
+        ), 'post'),
+        Scenario('my-ledger', 'my-ledger', lambda: (reverse('my-ledger'), None)),
+        Scenario('summary-cache-stats', 'summary-cache-stats', lambda: (reverse('summary-cache-stats'), None)),
+        Scenario('register', 'register', register, 'post'),
+        Scenario('token-obtain', 'token_obtain_pair', lambda: (
+            reverse('token_obtain_pair'), {'username': user.username, 'password': BENCHMARK_PASSWORD},
+        ), 'post'),
+        Scenario('token-refresh', 'token_refresh', lambda: (reverse('token_refresh'), {'refresh': refresh}), 'post'),
+    ]
+
+
+def missing_routes(scenarios):
+    covered = {scenario.route for scenario in scenarios}
+    return [name for name in route_names() if name not in covered]
+
+
+def percentiles(samples):
+    if len(samples) < 2:
+        return {f'p{p}': samples[0] for p in PERCENTILES}
+    cuts = statistics.quantiles(samples, n=100, method='inclusive')
+    return {f'p{p}': cuts[p - 1] for p in PERCENTILES}
+
+
+def send(client, scenario, url, data):
+    if scenario.method == 'get':
+        response = client.get(url, data)
+    else:
+        response = getattr(client, scenario.method)(url, data, format='json')
+    if response.streaming:
+        # Drain exports inside the measured section; the rows are produced lazily
+        for _ in response.streaming_content:
+            pass
+    if response.status_code >= 400:
+        raise AssertionError(f"{scenario.label} returned {response.status_code}: {getattr(response, 'data', '')}")
+    return response
+
+
+def measure(client, scenario, iterations, warmup=2, alloc_iterations=5):
+    for _ in range(warmup):
+        send(client, scenario, *scenario.prepare())
+
+    latencies, query_counts = [], []
+    for _ in range(iterations):
+        url, data = scenario.prepare()
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            send(client, scenario, url, data)
+            latencies.append((time.perf_counter() - start) * 1000)
+        query_counts.append(len(queries))
+
+    peaks = []
+    if alloc_iterations:
+        tracemalloc.start()
+        try:
+            for _ in range(alloc_iterations):
+                url, data = scenario.prepare()
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                send(client, scenario, url, data)
+                peaks.append((tracemalloc.get_traced_memory()[1] - before) / 1024)
+        finally:
+            tracemalloc.stop()
+
+    return {
+        'route': scenario.route,
+        'method': scenario.method.upper(),
+        'iterations': iterations,
+        **{f'{name}_ms': round(value, 3) for name, value in percentiles(latencies).items()},
+        'mean_ms': round(statistics.fmean(latencies), 3),
+        'queries_per_request': round(statistics.fmean(query_counts), 2),
+        'max_queries': max(query_counts),
+        'alloc_peak_kib': round(statistics.median(peaks), 1) if peaks else None,
+    }
+
+
+def run_suite(user_ids, occasions, iterations=50, warmup=2, alloc_iterations=5, only=None):
+    """
+    Benchmark every scenario against already seeded data and return ``{label: result}``.
+
+    The first seeded user is made a staff member with a known password so the admin
+    and login routes can be exercised; reads use the first occasion, writes the last.
+    """
+    user = User.objects.get(id=user_ids[0])
+    user.is_staff = True
+    user.set_password(BENCHMARK_PASSWORD)
+    user.save()
+
+    scenarios = build_scenarios(user, user_ids, occasions[0], occasions[-1])
+    missing = missing_routes(scenarios)
+    if missing:
+        raise AssertionError(f"No benchmark scenario for routes: {', '.join(missing)}")
+
+    results = {}
+    for scenario in scenarios:
+        if only and scenario.label not in only:
+            continue
+        # A fresh access token per scenario, so long runs never outlive its lifetime
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+        results[scenario.label] = measure(client, scenario, iterations, warmup, alloc_iterations)
+    return results
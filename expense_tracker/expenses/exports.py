@@ -0,0 +1,120 @@
+"""
+Streaming CSV and NDJSON exports of expenditures and payment logs.
+
+Rows are read with ``QuerySet.iterator(chunk_size=...)`` (a server-side cursor where the
+backend has one) and encoded one at a time, so an export holds at most one chunk of
+rows in memory however long it is.
+"""
+import csv
+
+from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Prefetch
+
+from .models import Expenditure, PaymentLog
+
+User = get_user_model()
+
+CHUNK_SIZE = 2000
+
+EXPENDITURE_COLUMNS = [
+    'id', 'occasion_id', 'event_name', 'amount', 'expender_id', 'expender',
+    'utilizer_ids', 'utilizers', 'cleared', 'created_at',
+]
+PAYMENT_LOG_COLUMNS = [
+    'id', 'expenditure_id', 'occasion_id', 'payer_id', 'payer', 'payee_id', 'payee', 'amount', 'timestamp',
+]
+
+
+class Echo:
+    """
+    File-like object whose ``write`` hands the line back instead of storing it.
+    """
+    def write(self, value):
+        return value
+
+
+def expenditure_queryset(occasion=None, start=None, end=None):
+    queryset = Expenditure.objects.select_related('expender').only(
+        'id', 'occasion_id', 'event_name', 'amount', 'cleared', 'created_at', 'expender__id', 'expender__username',
+    ).prefetch_related(
+        Prefetch('utilizers', queryset=User.objects.only('id', 'username').order_by('id')),
+    )
+    if occasion is not None:
+        queryset = queryset.filter(occasion_id=occasion)
+    if start is not None:
+        queryset = queryset.filter(created_at__gte=start)
+    if end is not None:
+        queryset = queryset.filter(created_at__lt=end)
+    return queryset.order_by('created_at', 'id')
+
+
+def payment_log_queryset(occasion=None, start=None, end=None):
+    queryset = PaymentLog.objects.values(
+        'id', 'expenditure_id', 'payer_id', 'payee_id', 'amount', 'timestamp',
+        occasion_id=F('expenditure__occasion_id'),
+        payer_name=F('payer__username'),
+        payee_name=F('payee__username'),
+    )
+    if occasion is not None:
+        queryset = queryset.filter(expenditure__occasion_id=occasion)
+    if start is not None:
+        queryset = queryset.filter(timestamp__gte=start)
+    if end is not None:
+        queryset = queryset.filter(timestamp__lt=end)
+    return queryset.order_by('timestamp', 'id')
+
+
+def expenditure_records(queryset, chunk_size=CHUNK_SIZE):
+    for expenditure in queryset.iterator(chunk_size=chunk_size):
+        utilizers = list(expenditure.utilizers.all())
+        yield {
+            'id': expenditure.id,
+            'occasion_id': expenditure.occasion_id,
+            'event_name': expenditure.event_name,
+            'amount': expenditure.amount,
+            'expender_id': expenditure.expender.id,
+            'expender': expenditure.expender.username,
+            'utilizer_ids': [user.id for user in utilizers],
+            'utilizers': [user.username for user in utilizers],
+            'cleared': expenditure.cleared,
+            'created_at': expenditure.created_at,
+        }
+
+
+def payment_log_records(queryset, chunk_size=CHUNK_SIZE):
+    for row in queryset.iterator(chunk_size=chunk_size):
+        row['payer'] = row.pop('payer_name')
+        row['payee'] = row.pop('payee_name')
+        yield row
+
+
+def _csv_value(value):
+    if isinstance(value, list):
+        return ';'.join(str(item) for item in value)
+    return value
+
+
+def stream_csv(records, columns):
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for record in records:
+        yield writer.writerow([_csv_value(record[column]) for column in columns])
+
+
+def stream_ndjson(records, columns):
+    encoder = DjangoJSONEncoder()
+    for record in records:
+        yield encoder.encode({column: record[column] for column in columns}) + '\n'
+
+
+FORMATS = {
+    'csv': (stream_csv, 'text/csv'),
+    'ndjson': (stream_ndjson, 'application/x-ndjson'),
+}
+
+# What each export streams, by its file name: the filtered queryset, its records and their columns
+EXPORTS = {
+    'expenditures': (expenditure_queryset, expenditure_records, EXPENDITURE_COLUMNS),
+    'payment-logs': (payment_log_queryset, payment_log_records, PAYMENT_LOG_COLUMNS),
+}
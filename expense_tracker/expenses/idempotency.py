@@ -0,0 +1,256 @@
+"""
+Idempotency keys for the write endpoints, so clients can retry them safely.
+
+A request sent with an ``Idempotency-Key`` header claims the key in ``IdempotencyKey``
+before it runs, and its response is stored in the same transaction as its writes.
+Retries with the same key, from the same user to the same path, get the stored
+response back without any validation or writes, or a 409 while the first request is
+still running. Reusing a key for a different request body is refused with a 422.
+Keys are scoped to the user, so anonymous requests can't send one.
+
+Keys expire ``IDEMPOTENCY_KEY_TTL`` seconds after they were claimed; expired rows are
+ignored and deleted by ``manage.py purge_idempotency_keys``. A claim whose request
+never finished (the worker died) can be taken over after ``IDEMPOTENCY_LOCK_TIMEOUT``.
+"""
+import contextvars
+import functools
+import hashlib
+import zlib
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+KEY_INVALID = f"The Idempotency-Key header must be 1 to {MAX_KEY_LENGTH} characters long."
+KEY_ANONYMOUS = "The Idempotency-Key header can only be sent by authenticated users."
+KEY_IN_PROGRESS = "A request with this Idempotency-Key is still being processed."
+KEY_REUSED = "This Idempotency-Key was already used for a different request."
+
+
+def _ttl():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 60 * 60 * 24))
+
+
+def _lock_timeout():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_LOCK_TIMEOUT', 60))
+
+
+def key_hash(request, key):
+    return hashlib.sha256(f'{request.user.pk}\n{request.path}\n{key}'.encode()).hexdigest()
+
+
+def request_hash(request):
+    digest = hashlib.sha256(f'{request.method}\n{request.get_full_path()}\n'.encode())
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+def _is_stale(record, now):
+    if record.created_at <= now - _ttl():
+        return True
+    return record.status_code is None and record.created_at <= now - _lock_timeout()
+
+
+def claim(hashed_key, hashed_request):
+    """
+    Claim a key for this request. Returns ``None`` once the request owns the key,
+    otherwise the record of the request that does.
+    """
+    now = timezone.now()
+    record = IdempotencyKey.objects.filter(key_hash=hashed_key).first()
+    if record is None:
+        try:
+            with transaction.atomic():
+                IdempotencyKey.objects.create(key_hash=hashed_key, request_hash=hashed_request, created_at=now)
+            return None
+        except IntegrityError:
+            # Another request with the same key got there first
+            return IdempotencyKey.objects.get(key_hash=hashed_key)
+
+    if _is_stale(record, now):
+        taken = IdempotencyKey.objects.filter(pk=record.pk, created_at=record.created_at).update(
+            request_hash=hashed_request, status_code=None, response=None, created_at=now,
+        )
+        if taken:
+            return None
+        record.refresh_from_db()
+    return record
+
+
+def store(hashed_key, response):
+    """
+    Store the rendered ``response``: its bytes and content type, whichever renderer the
+    request negotiated.
+    """
+    IdempotencyKey.objects.filter(key_hash=hashed_key).update(
+        status_code=response.status_code,
+        content_type=response['Content-Type'],
+        response=zlib.compress(response.content),
+    )
+
+
+def release(hashed_key):
+    IdempotencyKey.objects.filter(key_hash=hashed_key, status_code__isnull=True).delete()
+
+
+def replay(record):
+    response = HttpResponse(
+        zlib.decompress(record.response), status=record.status_code, content_type=record.content_type,
+    )
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def begin(request, key, respond):
+    """
+    Claim ``key`` for ``request``. Returns ``(hashed_key, None)`` when the request owns
+    it and is to run, otherwise ``(None, response)`` with the response to send instead;
+    ``respond(data, status_code)`` builds error responses.
+    """
+    if not request.user.is_authenticated:
+        return None, respond({'error': KEY_ANONYMOUS}, status.HTTP_400_BAD_REQUEST)
+    if not key or len(key) > MAX_KEY_LENGTH:
+        return None, respond({'error': KEY_INVALID}, status.HTTP_400_BAD_REQUEST)
+
+    hashed_key, hashed_request = key_hash(request, key), request_hash(request)
+    record = claim(hashed_key, hashed_request)
+    if record is None:
+        return hashed_key, None
+    if record.request_hash != hashed_request:
+        return None, respond({'error': KEY_REUSED}, status.HTTP_422_UNPROCESSABLE_ENTITY)
+    if record.status_code is None:
+        return None, respond({'error': KEY_IN_PROGRESS}, status.HTTP_409_CONFLICT)
+    return None, replay(record)
+
+
+def finish(hashed_key, response):
+    """
+    Store ``response`` for the key, or release the key for a server error so the client
+    can retry it.
+    """
+    if response.status_code < 500:
+        store(hashed_key, response)
+    else:
+        release(hashed_key)
+
+
+def _render(view, request, response, *args, **kwargs):
+    # What dispatch() does with the response after the handler, done early to store the bytes sent
+    response = view.finalize_response(request, response, *args, **kwargs)
+    return response.render() if hasattr(response, 'render') else response
+
+
+def idempotent(handler):
+    """
+    Decorate a view's ``post`` so that requests with an ``Idempotency-Key`` run once.
+    Client errors are stored like successes, whether the handler returns them or raises
+    them (a serializer's ``ValidationError``).
+    """
+    @functools.wraps(handler)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return handler(view, request, *args, **kwargs)
+        hashed_key, response = begin(request, key, lambda data, status_code: Response(data, status=status_code))
+        if response is not None:
+            return response
+
+        try:
+            with transaction.atomic():
+                response = _render(view, request, handler(view, request, *args, **kwargs), *args, **kwargs)
+                if response.status_code < 500:
+                    store(hashed_key, response)
+                    return response
+                # A server error is not stored, and neither is anything the handler wrote
+                transaction.set_rollback(True)
+        except APIException as exc:
+            # The handler's writes are rolled back; the error is stored as it will be sent
+            response = _render(view, request, view.handle_exception(exc), *args, **kwargs)
+        except Exception:
+            release(hashed_key)
+            raise
+        finish(hashed_key, response)
+        return response
+    return wrapper
+
+
+class _Claim:
+    def __init__(self, hashed_key):
+        self.hashed_key = hashed_key
+        self.stored = False
+
+
+# The key claimed by the async request being handled, for store_claimed()
+_claimed = contextvars.ContextVar('idempotency_claimed', default=None)
+
+
+def store_claimed(response):
+    """
+    Store ``response`` for the key the current async request claimed, if it claimed one.
+    Call it in the transaction of the request's writes, which a server error rolls back.
+    """
+    claimed = _claimed.get()
+    if claimed is None:
+        return
+    if response.status_code < 500:
+        store(claimed.hashed_key, response)
+        claimed.stored = True
+    else:
+        transaction.set_rollback(True)
+
+
+def aidempotent(handler):
+    """
+    ``idempotent`` for the ``post`` of an ``AsyncAPIView``. The view writes in a thread,
+    so it stores its response itself with ``store_claimed()`` in the transaction of its
+    writes; responses it sends without writing anything are stored here.
+    """
+    @functools.wraps(handler)
+    async def wrapper(view, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return await handler(view, request, *args, **kwargs)
+        hashed_key, response = await sync_to_async(begin)(request, key, view.render)
+        if response is not None:
+            return response
+
+        claimed = _Claim(hashed_key)
+        token = _claimed.set(claimed)
+        try:
+            response = await handler(view, request, *args, **kwargs)
+        except APIException as exc:
+            response = view.handle_exception(exc)
+        except Exception:
+            await sync_to_async(release)(hashed_key)
+            raise
+        finally:
+            _claimed.reset(token)
+        if not claimed.stored:
+            await sync_to_async(finish)(hashed_key, response)
+        return response
+    return wrapper
+
+
+def purge_expired(batch_size=1000):
+    """
+    Delete the keys past ``IDEMPOTENCY_KEY_TTL`` in batches and return how many were deleted.
+    """
+    cutoff = timezone.now() - _ttl()
+    deleted = 0
+    while True:
+        ids = list(IdempotencyKey.objects.filter(created_at__lte=cutoff).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
@@ -0,0 +1,13 @@
+"""
+Entry point of the worker processes started by ``manage.py run_jobs --workers``.
+
+Spawned processes import it before Django is set up, so it must not import models at module level.
+"""
+import django
+
+
+def worker_process(worker_id, burst, max_jobs):
+    django.setup()
+    from .jobs import stop_on_signals, work
+
+    work(worker_id, burst=burst, max_jobs=max_jobs, stop=stop_on_signals())
@@ -0,0 +1,208 @@
+"""
+A job queue in the database, for recomputations too slow for the request path.
+
+``enqueue()`` adds a job for a task registered with ``@task``, or returns the identical
+job that is already pending, so a burst of requests for the same recomputation runs it
+once. ``manage.py run_jobs`` starts workers that claim due jobs one at a time: with
+``SELECT ... FOR UPDATE SKIP LOCKED`` where the database has it, otherwise with a
+conditional UPDATE, which is enough on SQLite since it runs one write at a time.
+
+A job that raises is retried after ``JOBS_RETRY_BASE_SECONDS``, doubling with each
+attempt up to ``JOBS_RETRY_MAX_SECONDS``, until it has run ``JOBS_MAX_ATTEMPTS`` times.
+Jobs still running after ``JOBS_LOCK_TIMEOUT`` seconds are taken to belong to a dead
+worker and are put back in the queue.
+"""
+import hashlib
+import json
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+from importlib import import_module
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .encoders import ExactJSONEncoder
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+# How many due jobs a worker tries in turn when others claim them first
+CLAIM_CANDIDATES = 10
+
+
+def task(function):
+    """
+    Register ``function`` as a job task under its name. Its arguments and return value must be JSON.
+    """
+    TASKS[function.__name__] = function
+    return function
+
+
+def get_task(name):
+    for module in getattr(settings, 'JOBS_TASK_MODULES', ['expenses.tasks']):
+        import_module(module)
+    return TASKS.get(name)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def retry_delay(attempts):
+    base = _setting('JOBS_RETRY_BASE_SECONDS', 10)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), _setting('JOBS_RETRY_MAX_SECONDS', 60 * 60)))
+
+
+def dedup_key(task_name, args):
+    return hashlib.sha256(json.dumps([task_name, args], sort_keys=True, cls=ExactJSONEncoder).encode()).hexdigest()
+
+
+def enqueue(task_name, args=None, delay=0, max_attempts=None):
+    """
+    Queue ``task_name(**args)`` to run in ``delay`` seconds. Returns ``(job, created)``;
+    ``created`` is false when an identical job was already pending and is returned instead.
+    """
+    if get_task(task_name) is None:
+        raise ValueError(f"Unknown job task: {task_name}")
+    args = args or {}
+    key = dedup_key(task_name, args)
+    run_at = timezone.now() + timedelta(seconds=delay)
+    while True:
+        try:
+            with transaction.atomic():
+                job = Job.objects.create(
+                    task=task_name, args=args, dedup_key=key, run_at=run_at,
+                    max_attempts=max_attempts or _setting('JOBS_MAX_ATTEMPTS', 5),
+                )
+            return job, True
+        except IntegrityError:
+            job = Job.objects.filter(dedup_key=key, status=Job.PENDING).first()
+        if job is not None:
+            # A pending job waiting out a retry backoff runs as soon as it is asked for again
+            if job.run_at > run_at:
+                Job.objects.filter(pk=job.pk, status=Job.PENDING, run_at__gt=run_at).update(run_at=run_at)
+                job.run_at = run_at
+            return job, False
+        # The pending job was claimed in the meantime; try again
+
+
+def claim(worker_id):
+    """
+    Mark the oldest due pending job as running on ``worker_id`` and return it, or ``None``.
+    """
+    now = timezone.now()
+    due = Job.objects.filter(status=Job.PENDING, run_at__lte=now).order_by('run_at', 'id')
+    if connections[Job.objects.db].features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job = due.select_for_update(skip_locked=True).first()
+            if job is None:
+                return None
+            job.status, job.attempts, job.locked_by, job.locked_at = Job.RUNNING, job.attempts + 1, worker_id, now
+            job.save(update_fields=['status', 'attempts', 'locked_by', 'locked_at'])
+            return job
+
+    for job_id in due.values_list('id', flat=True)[:CLAIM_CANDIDATES]:
+        claimed = Job.objects.filter(pk=job_id, status=Job.PENDING).update(
+            status=Job.RUNNING, attempts=F('attempts') + 1, locked_by=worker_id, locked_at=now,
+        )
+        if claimed:
+            return Job.objects.get(pk=job_id)
+    return None
+
+
+def _retry_or_fail(job, error):
+    """
+    Put a job whose attempt failed back in the queue with a backoff, or fail it for good.
+    """
+    now = timezone.now()
+    running = Job.objects.filter(pk=job.pk, status=Job.RUNNING, locked_by=job.locked_by)
+    if job.attempts < job.max_attempts:
+        try:
+            with transaction.atomic():
+                running.update(status=Job.PENDING, run_at=now + retry_delay(job.attempts), error=error, locked_at=None)
+            return
+        except IntegrityError:
+            # An identical job was queued meanwhile and will do the work instead
+            error += "\nAn identical pending job replaces this one."
+    running.update(status=Job.FAILED, error=error, finished_at=now)
+
+
+def run(job):
+    """
+    Run a claimed job and record its result, or schedule its retry.
+    """
+    function = get_task(job.task)
+    if function is None:
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.FAILED, error=f"Unknown job task: {job.task}", finished_at=timezone.now(),
+        )
+        return
+    started = time.perf_counter()
+    try:
+        result = function(**job.args)
+    except Exception:
+        logger.exception("Job %s (%s) failed on attempt %s", job.id, job.task, job.attempts)
+        _retry_or_fail(job, traceback.format_exc())
+        return
+    Job.objects.filter(pk=job.pk, status=Job.RUNNING, locked_by=job.locked_by).update(
+        status=Job.SUCCEEDED, result=result, error='', finished_at=timezone.now(),
+    )
+    logger.info("Job %s (%s) finished in %.3fs", job.id, job.task, time.perf_counter() - started)
+
+
+def requeue_stale():
+    """
+    Retry, or fail, the running jobs whose worker has not finished them within
+    ``JOBS_LOCK_TIMEOUT``. Returns how many were found.
+    """
+    cutoff = timezone.now() - timedelta(seconds=_setting('JOBS_LOCK_TIMEOUT', 60 * 10))
+    stale = list(Job.objects.filter(status=Job.RUNNING, locked_at__lt=cutoff))
+    for job in stale:
+        _retry_or_fail(job, f"Worker {job.locked_by} did not finish the job within JOBS_LOCK_TIMEOUT.")
+    return len(stale)
+
+
+def default_worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def work(worker_id=None, burst=False, max_jobs=None, stop=None):
+    """
+    Claim and run jobs until ``stop`` is set, ``max_jobs`` have run, or, with ``burst``,
+    no job is due. Returns how many jobs ran.
+    """
+    worker_id = worker_id or default_worker_id()
+    stop = stop or threading.Event()
+    done = 0
+    while not stop.is_set() and (max_jobs is None or done < max_jobs):
+        close_old_connections()
+        job = claim(worker_id)
+        if job is None:
+            if requeue_stale():
+                continue
+            if burst:
+                break
+            stop.wait(_setting('JOBS_POLL_INTERVAL', 1))
+            continue
+        run(job)
+        done += 1
+    return done
+
+
+def stop_on_signals():
+    """
+    An event set by SIGTERM or SIGINT, so a worker finishes its current job before exiting.
+    """
+    stop = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *args: stop.set())
+    return stop
@@ -0,0 +1,67 @@
+from collections import defaultdict
+
+from django.db.models import Q, Sum
+
+from .models import ArchivedBalance, ExpenditureShare, PaymentLog
+from .settlement import from_cents, to_cents
+
+LEDGER_FIELDS = ('owed_to_user', 'owed_by_user', 'paid_by_user', 'paid_to_user')
+
+
+def user_ledger_cents(user_id):
+    """
+    What ``user_id`` and each counterparty owe each other, per occasion, in cents.
+
+    Returns ``{(occasion_id, counterparty_id): {field: cents}}`` for the fields in
+    ``LEDGER_FIELDS``. Each field comes from one grouped aggregate query, plus one query
+    for what archived expenditures contribute (see ``expenses.archive``).
+    """
+    shares = ExpenditureShare.objects.all()
+    queries = {
+        # Shares of other utilizers in expenditures the user paid for
+        'owed_to_user': shares.filter(expender_id=user_id).exclude(user_id=user_id).values_list(
+            'occasion_id', 'user_id',
+        ).annotate(cents=Sum('amount_cents')),
+        # The user's shares in expenditures someone else paid for
+        'owed_by_user': shares.filter(user_id=user_id).exclude(expender_id=user_id).values_list(
+            'occasion_id', 'expender_id',
+        ).annotate(cents=Sum('amount_cents')),
+        'paid_by_user': PaymentLog.objects.filter(payer_id=user_id).exclude(payee_id=user_id).values_list(
+            'expenditure__occasion_id', 'payee_id',
+        ).annotate(cents=Sum(to_cents('amount'))),
+        'paid_to_user': PaymentLog.objects.filter(payee_id=user_id).exclude(payer_id=user_id).values_list(
+            'expenditure__occasion_id', 'payer_id',
+        ).annotate(cents=Sum(to_cents('amount'))),
+    }
+
+    ledger = defaultdict(lambda: dict.fromkeys(LEDGER_FIELDS, 0))
+    for field, rows in queries.items():
+        for occasion_id, counterparty_id, cents in rows:
+            ledger[(occasion_id, counterparty_id)][field] += cents
+
+    carried = ArchivedBalance.objects.filter(Q(debtor_id=user_id) | Q(creditor_id=user_id)).values_list(
+        'occasion_id', 'debtor_id', 'creditor_id', 'owed_cents', 'paid_cents',
+    )
+    for occasion_id, debtor_id, creditor_id, owed, paid in carried:
+        if debtor_id == user_id:
+            entry = ledger[(occasion_id, creditor_id)]
+            entry['owed_by_user'] += owed
+            entry['paid_by_user'] += paid
+        else:
+            entry = ledger[(occasion_id, debtor_id)]
+            entry['owed_to_user'] += owed
+            entry['paid_to_user'] += paid
+    return ledger
+
+
+def net_cents(entry):
+    """
+    Positive when the counterparty owes the user, negative when the user owes them.
+    """
+    return entry['owed_to_user'] - entry['owed_by_user'] + entry['paid_by_user'] - entry['paid_to_user']
+
+
+def as_amounts(entry):
+    amounts = {field: from_cents(entry[field]) for field in LEDGER_FIELDS}
+    amounts['net'] = from_cents(net_cents(entry))
+    return amounts
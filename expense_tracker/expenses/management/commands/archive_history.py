@@ -0,0 +1,91 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from expenses import archive
+
+
+def megabytes(size):
+    return f"{size / 2 ** 20:.2f} MB"
+
+
+class Command(BaseCommand):
+    help = (
+        "Move cleared expenditures older than a cutoff, with their utilizers and payment logs, "
+        "to the archive tables in batches, and report the table and index space freed."
+    )
+
+    def add_arguments(self, parser):
+        cutoff = parser.add_mutually_exclusive_group()
+        cutoff.add_argument(
+            '--older-than-days', type=int,
+            help="Archive expenditures created more than this many days ago (default: ARCHIVE_AFTER_DAYS).",
+        )
+        cutoff.add_argument('--before', help="Archive expenditures created before this date or datetime.")
+        parser.add_argument(
+            '--batch-size', type=int, default=getattr(settings, 'ARCHIVE_BATCH_SIZE', archive.BATCH_SIZE),
+            help="Expenditures per transaction.",
+        )
+        parser.add_argument('--max-batches', type=int, help="Stop after this many batches; run again to carry on.")
+        parser.add_argument('--dry-run', action='store_true', help="Only count what would be archived.")
+        parser.add_argument('--vacuum', action='store_true', help="Return the freed space to the filesystem afterwards.")
+
+    def get_cutoff(self, options):
+        if options['before']:
+            value = options['before']
+            cutoff = parse_datetime(value)
+            if cutoff is None and parse_date(value) is not None:
+                cutoff = parse_datetime(f'{value}T00:00:00')
+            if cutoff is None:
+                raise CommandError(f"Invalid --before: {value}")
+            return timezone.make_aware(cutoff) if timezone.is_naive(cutoff) else cutoff
+        if options['older_than_days'] is not None:
+            return timezone.now() - timedelta(days=options['older_than_days'])
+        return archive.default_cutoff()
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        cutoff = self.get_cutoff(options)
+
+        if options['dry_run']:
+            count = archive.archivable(cutoff).count()
+            self.stdout.write(f"{count} expenditures created before {cutoff.isoformat()} would be archived.")
+            return
+
+        before = archive.table_sizes()
+        started = time.perf_counter()
+        expenditures = payment_logs = 0
+        for batch, (archived, logs) in enumerate(archive.archive(cutoff, options['batch_size'], options['max_batches']), 1):
+            expenditures += archived
+            payment_logs += logs
+            self.stdout.write(f"Batch {batch}: {archived} expenditures, {logs} payment logs.")
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {expenditures} expenditures and {payment_logs} payment logs created before "
+            f"{cutoff.isoformat()} in {time.perf_counter() - started:.1f}s."
+        ))
+        if options['max_batches'] and archive.archivable(cutoff).exists():
+            self.stdout.write("More expenditures are left to archive; run the command again to continue.")
+
+        if options['vacuum']:
+            archive.vacuum()
+        self.report(before, archive.table_sizes())
+
+    def report(self, before, after):
+        if before is None or after is None:
+            self.stdout.write("This database does not report table sizes.")
+            return
+        freed = 0
+        for table in before:
+            for label, index in (("table", 0), ("indexes", 1)):
+                was, now = before[table][index], after.get(table, (0, 0))[index]
+                freed += was - now
+                self.stdout.write(f"{table} {label}: {megabytes(was)} -> {megabytes(now)}")
+        self.stdout.write(self.style.SUCCESS(f"Reclaimed {megabytes(freed)} of table and index space."))
+        free = archive.free_bytes()
+        if free:
+            self.stdout.write(f"{megabytes(free)} of free pages stay in the database file until it is vacuumed (--vacuum).")
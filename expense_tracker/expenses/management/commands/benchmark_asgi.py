@@ -0,0 +1,66 @@
+import json
+import os
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from expenses.asgi_benchmark import MODES, run_comparison
+from expenses.benchmark import isolated_database, seed_dataset
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Compare WSGI, ASGI with sync views and ASGI with async views at increasing concurrency."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--expenditures', type=int, default=2000, help="Expenditures per occasion.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 100])
+        parser.add_argument('--requests', type=int, default=300, help="Requests per mode and concurrency level.")
+        parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+        parser.add_argument('--workloads', nargs='+', choices=('summary', 'create'), default=['summary', 'create'])
+        parser.add_argument('--output', help="Write the results to this JSON file.")
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            # A file rather than SQLite's shared in-memory database, whose table locks
+            # would fail concurrent writers instead of making them wait
+            test_settings = connection.settings_dict['TEST']
+            old_test_name = test_settings.get('NAME')
+            test_settings['NAME'] = os.path.join(directory, 'asgi-benchmark.sqlite3')
+            try:
+                with isolated_database():
+                    user_ids, occasions = seed_dataset(
+                        options['users'], 2, options['expenditures'], seed=options['seed'],
+                    )
+                    connection.close()
+                    results = run_comparison(
+                        User.objects.get(pk=user_ids[0]), user_ids, occasions[0], occasions[1],
+                        options['concurrency'], options['requests'], options['modes'], options['workloads'],
+                    )
+            finally:
+                test_settings['NAME'] = old_test_name
+
+        self.write_table(results)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump({'results': results}, handle, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def write_table(self, results):
+        self.stdout.write(
+            f"{'workload':<10}{'mode':<12}{'clients':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}"
+            f"{'threads':>9}{'errors':>8}"
+        )
+        for result in results:
+            self.stdout.write(
+                f"{result['workload']:<10}{result['mode']:<12}{result['concurrency']:>8}"
+                f"{result['requests_per_second']:>10.1f}{result.get('p50_ms', 0):>10.2f}"
+                f"{result.get('p99_ms', 0):>10.2f}{result['peak_threads']:>9}{result['errors']:>8}"
+            )
+            if 'first_error' in result:
+                self.stdout.write(f"    first error: {result['first_error']}")
@@ -0,0 +1,49 @@
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from expenses.benchmark import isolated_database, seed_dataset
+from expenses.coalescing_benchmark import MODES, run_comparison
+
+
+class Command(BaseCommand):
+    help = "Send bursts of identical summary requests with and without request coalescing and compare CPU time."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--expenditures', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--clients', type=int, default=50, help="Concurrent requests per burst.")
+        parser.add_argument('--rounds', type=int, default=10, help="Bursts per mode.")
+        parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            # A file rather than SQLite's shared in-memory database, so each client
+            # thread's connection reads the seeded rows
+            test_settings = connection.settings_dict['TEST']
+            old_test_name = test_settings.get('NAME')
+            test_settings['NAME'] = os.path.join(directory, 'coalescing-benchmark.sqlite3')
+            try:
+                with isolated_database():
+                    _, occasions = seed_dataset(options['users'], 1, options['expenditures'], seed=options['seed'])
+                    connection.close()
+                    results = run_comparison(occasions[0], options['clients'], options['rounds'], options['modes'])
+            finally:
+                test_settings['NAME'] = old_test_name
+
+        self.stdout.write(
+            f"{'mode':<13}{'requests':>9}{'computed':>10}{'coalesced':>11}{'hits':>6}"
+            f"{'cpu s':>8}{'cpu ms/req':>12}{'p50 ms':>9}{'p99 ms':>9}{'errors':>8}"
+        )
+        for result in results:
+            self.stdout.write(
+                f"{result['mode']:<13}{result['requests']:>9}{result['computed']:>10}{result['coalesced']:>11}"
+                f"{result['hits']:>6}{result['cpu_seconds']:>8.2f}{result['cpu_ms_per_request']:>12.2f}"
+                f"{result.get('p50_ms', 0):>9.1f}{result.get('p99_ms', 0):>9.1f}{result['errors']:>8}"
+            )
+        if len(results) == 2 and results[0]['cpu_seconds']:
+            saved = 1 - results[1]['cpu_seconds'] / results[0]['cpu_seconds']
+            self.stdout.write(f"Coalescing saved {saved:.0%} of the CPU time.")
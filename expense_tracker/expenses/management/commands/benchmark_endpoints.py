@@ -0,0 +1,87 @@
+import json
+import platform
+from datetime import datetime, timezone
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from expenses.benchmark import isolated_database, seed_dataset, timer
+from expenses.endpoint_benchmark import run_suite
+
+
+class Command(BaseCommand):
+    help = "Benchmark every API route in-process against a seeded throwaway database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--occasions', type=int, default=3)
+        parser.add_argument('--expenditures', type=int, default=5000, help="Expenditures per occasion.")
+        parser.add_argument('--utilizers', type=int, default=4, help="Utilizers per expenditure.")
+        parser.add_argument('--cleared', type=float, default=0.3)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--iterations', type=int, default=50, help="Timed requests per scenario.")
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--alloc-iterations', type=int, default=5, help="Requests replayed under tracemalloc.")
+        parser.add_argument('--only', nargs='*', help="Scenario labels to run (default: all).")
+        parser.add_argument('--output', help="Write the results to this JSON file.")
+        parser.add_argument('--baseline', help="Earlier JSON results to compare p50 latencies against.")
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as handle:
+                baseline = json.load(handle)['results']
+
+        timings = {}
+        with isolated_database():
+            with timer(timings, 'seed'):
+                user_ids, occasions = seed_dataset(
+                    options['users'], options['occasions'], options['expenditures'],
+                    options['utilizers'], options['cleared'], options['seed'],
+                )
+            self.stdout.write(f"Seeded dataset in {timings['seed']:.2f}s")
+            try:
+                results = run_suite(
+                    user_ids, occasions, options['iterations'], options['warmup'],
+                    options['alloc_iterations'], options['only'],
+                )
+            except AssertionError as error:
+                raise CommandError(str(error))
+            vendor = connection.vendor
+
+        self.write_table(results, baseline)
+        if options['output']:
+            report = {
+                'meta': {
+                    'created_at': datetime.now(timezone.utc).isoformat(),
+                    'python': platform.python_version(),
+                    'django': django.get_version(),
+                    'database': vendor,
+                    'options': {
+                        name: options[name] for name in (
+                            'users', 'occasions', 'expenditures', 'utilizers', 'cleared', 'seed',
+                            'iterations', 'warmup', 'alloc_iterations',
+                        )
+                    },
+                },
+                'results': results,
+            }
+            with open(options['output'], 'w') as handle:
+                json.dump(report, handle, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def write_table(self, results, baseline=None):
+        header = f"{'scenario':<28}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}{'alloc KiB':>11}"
+        if baseline:
+            header += f"{'p50 vs base':>13}"
+        self.stdout.write(header)
+        for label, result in results.items():
+            alloc = result['alloc_peak_kib']
+            line = (
+                f"{label:<28}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+                f"{result['queries_per_request']:>9.1f}{alloc if alloc is not None else '-':>11}"
+            )
+            if baseline and label in baseline:
+                line += f"{result['p50_ms'] / baseline[label]['p50_ms']:>12.2f}x"
+            self.stdout.write(line)
@@ -0,0 +1,62 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from expenses.benchmark import isolated_database, seed_users, timer
+from expenses.models import Expenditure, Occasion
+
+
+class Command(BaseCommand):
+    help = "Compare rows/sec of the single-item and bulk expenditure endpoints in a throwaway database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--single', type=int, default=500, help="Expenditures posted one at a time.")
+        parser.add_argument('--bulk', type=int, default=20000, help="Expenditures posted through the bulk endpoint.")
+        parser.add_argument('--batch', type=int, default=5000, help="Expenditures per bulk request.")
+        parser.add_argument('--participants', type=int, default=50)
+
+    def make_items(self, count, occasion_id, user_ids, rng):
+        return [
+            {
+                'occasion': occasion_id,
+                'event_name': f'Imported {i}',
+                'amount': f'{rng.randint(100, 100000) / 100:.2f}',
+                'expender': rng.choice(user_ids),
+                'utilizers': rng.sample(user_ids, 4),
+            }
+            for i in range(count)
+        ]
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        results = {}
+        with isolated_database():
+            client = APIClient()
+            user_ids = seed_users(options['participants'])
+            occasion = Occasion.objects.create(name='Import', date='2025-01-01')
+
+            single_items = self.make_items(options['single'], occasion.id, user_ids, rng)
+            with timer(results, 'single'):
+                for item in single_items:
+                    client.post(reverse('expenditure-create'), item, format='json')
+
+            bulk_items = self.make_items(options['bulk'], occasion.id, user_ids, rng)
+            with timer(results, 'bulk'):
+                for offset in range(0, len(bulk_items), options['batch']):
+                    response = client.post(
+                        reverse('expenditure-bulk-create'),
+                        {'expenditures': bulk_items[offset:offset + options['batch']]},
+                        format='json',
+                    )
+                    assert not response.data['errors'], response.data['errors'][:3]
+
+            expected = options['single'] + options['bulk']
+            assert Expenditure.objects.count() == expected
+
+        single_rate = options['single'] / results['single']
+        bulk_rate = options['bulk'] / results['bulk']
+        self.stdout.write(f"single-item: {options['single']} rows in {results['single']:.2f}s ({single_rate:.0f} rows/s)")
+        self.stdout.write(f"bulk:        {options['bulk']} rows in {results['bulk']:.2f}s ({bulk_rate:.0f} rows/s)")
+        self.stdout.write(f"speedup:     {bulk_rate / single_rate:.1f}x")
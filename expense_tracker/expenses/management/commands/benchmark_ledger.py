@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from expenses.benchmark import isolated_database, seed_occasion, seed_users, timer
+from expenses.ledger import user_ledger_cents
+
+
+class Command(BaseCommand):
+    help = "Time one user's cross-occasion ledger on synthetic occasions in a throwaway database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--expenditures', type=int, default=50000, help="Expenditures across all occasions.")
+        parser.add_argument('--occasions', type=int, default=5)
+        parser.add_argument('--participants', type=int, default=4)
+        parser.add_argument('--utilizers', type=int, default=4, help="Utilizers per expenditure.")
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        results = {}
+        per_occasion = options['expenditures'] // options['occasions']
+        with isolated_database():
+            with timer(results, 'seed'):
+                user_ids = seed_users(options['participants'])
+                for index in range(options['occasions']):
+                    seed_occasion(per_occasion, user_ids, options['utilizers'], seed=index)
+            self.stdout.write(
+                f"Seeded {options['occasions']} occasions of {per_occasion} expenditures over "
+                f"{options['participants']} participants in {results['seed']:.2f}s"
+            )
+
+            best = None
+            for run in range(options['repeat']):
+                with timer(results, 'ledger'):
+                    ledger = user_ledger_cents(user_ids[0])
+                best = results['ledger'] if best is None else min(best, results['ledger'])
+                self.stdout.write(f"run {run + 1}: ledger {results['ledger'] * 1000:.1f}ms, {len(ledger)} entries")
+            self.stdout.write(f"best {best * 1000:.1f}ms, budget {settings.LEDGER_BUDGET_SECONDS * 1000:.0f}ms")
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from expense_tracker import renderers
+from expenses.benchmark import isolated_database, seed_dataset
+from expenses.renderer_benchmark import run_comparison, summary_payload
+
+
+class Command(BaseCommand):
+    help = "Compare encode/decode time and payload size of the API renderers on one large occasion summary."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--expenditures', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--repeat', type=int, default=20, help="Encodes and decodes per codec; the median is reported.")
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            _, occasions = seed_dataset(options['users'], 1, options['expenditures'], seed=options['seed'])
+            data = summary_payload(occasions[0])
+        results = run_comparison(data, options['repeat'])
+
+        if renderers.orjson is None:
+            self.stdout.write("orjson is not installed: fast-json falls back to the stdlib encoder.")
+        if renderers.msgpack is None:
+            self.stdout.write("msgpack is not installed: MessagePack is left out.")
+        self.stdout.write(f"{'codec':<11}{'bytes':>11}{'gzip bytes':>12}{'encode ms':>11}{'decode ms':>11}")
+        for result in results:
+            self.stdout.write(
+                f"{result['codec']:<11}{result['bytes']:>11}{result['gzip_bytes']:>12}"
+                f"{result['encode_ms']:>11.2f}{result['decode_ms']:>11.2f}"
+            )
+        baseline = results[0]['encode_ms']
+        for result in results[1:]:
+            if result['encode_ms']:
+                self.stdout.write(f"{result['codec']} encodes {baseline / result['encode_ms']:.1f}x faster than drf-json.")
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from expenses.benchmark import isolated_database, seed_occasion, seed_users, timer
+from expenses.settlement import occasion_balances, simplify_debts
+
+
+class Command(BaseCommand):
+    help = "Time the settlement engine on a synthetic occasion in a throwaway database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--expenditures', type=int, default=100000)
+        parser.add_argument('--participants', type=int, default=1000)
+        parser.add_argument('--utilizers', type=int, default=4, help="Utilizers per expenditure.")
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        results = {}
+        with isolated_database():
+            with timer(results, 'seed'):
+                user_ids = seed_users(options['participants'])
+                occasion = seed_occasion(options['expenditures'], user_ids, options['utilizers'])
+            self.stdout.write(
+                f"Seeded {options['expenditures']} expenditures over {options['participants']} "
+                f"participants in {results['seed']:.2f}s"
+            )
+
+            for run in range(options['repeat']):
+                with timer(results, 'balances'):
+                    balances = occasion_balances(occasion.id)
+                with timer(results, 'transfers'):
+                    transfers = simplify_debts(balances)
+                self.stdout.write(
+                    f"run {run + 1}: balances {results['balances'] * 1000:.1f}ms, "
+                    f"transfers {results['transfers'] * 1000:.1f}ms, "
+                    f"{len(balances)} balances -> {len(transfers)} transfers"
+                )
@@ -0,0 +1,28 @@
+import hashlib
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from expense_tracker.swagger import SCHEMA_FORMATS, generate_schema
+
+
+class Command(BaseCommand):
+    help = "Write the API schema served to the docs pages; run at build or deploy time."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--formats', nargs='+', choices=sorted(SCHEMA_FORMATS), default=sorted(SCHEMA_FORMATS))
+        parser.add_argument('--output-dir', help="Directory to write to (default: OPENAPI_SCHEMA_DIR).")
+
+    def handle(self, *args, **options):
+        directory = Path(options['output_dir'] or settings.OPENAPI_SCHEMA_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        for schema_format in options['formats']:
+            content = generate_schema(schema_format)
+            path = directory / f'openapi.{schema_format}'
+            # Replace the file in one step so running workers never read half of it
+            temporary = path.with_name(f'.{path.name}.tmp')
+            temporary.write_bytes(content)
+            os.replace(temporary, path)
+            self.stdout.write(f"Wrote {path} ({len(content)} bytes, sha256 {hashlib.sha256(content).hexdigest()[:12]})")
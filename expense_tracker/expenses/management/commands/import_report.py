@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from expense_tracker.coldstart import ENTRY_POINTS, cold_start_seconds, import_report
+
+
+class Command(BaseCommand):
+    help = "Report what a fresh WSGI/ASGI worker imports at startup and what each module costs."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entry', nargs='+', choices=sorted(ENTRY_POINTS), default=sorted(ENTRY_POINTS))
+        parser.add_argument('--profile', nargs='+', choices=('full', 'api'), default=['full', 'api'])
+        parser.add_argument('--top', type=int, default=20, help="Modules and packages to list.")
+        parser.add_argument('--check-budget', action='store_true',
+                            help="Fail if an api profile cold start exceeds COLD_START_BUDGET_SECONDS.")
+
+    def handle(self, *args, **options):
+        over_budget = []
+        for entry in options['entry']:
+            for profile in options['profile']:
+                report = import_report(entry, profile, options['top'])
+                seconds = cold_start_seconds(entry, profile)
+                self.stdout.write(
+                    f"\n{entry} / {profile}: {seconds * 1000:.0f}ms cold start "
+                    f"({report['seconds'] * 1000:.0f}ms under -X importtime), {report['modules_imported']} modules"
+                )
+                self.stdout.write(f"  {'cumulative ms':>13}  {'self ms':>8}  module")
+                for name, self_us, cumulative_us in report['slowest_modules']:
+                    self.stdout.write(f"  {cumulative_us / 1000:>13.1f}  {self_us / 1000:>8.1f}  {name}")
+                self.stdout.write(f"  {'self ms':>13}  package")
+                for name, self_us in report['packages']:
+                    self.stdout.write(f"  {self_us / 1000:>13.1f}  {name}")
+                if profile == 'api' and seconds > settings.COLD_START_BUDGET_SECONDS:
+                    over_budget.append(f"{entry}: {seconds:.2f}s")
+
+        if options['check_budget'] and over_budget:
+            raise CommandError(
+                f"Cold start over the {settings.COLD_START_BUDGET_SECONDS}s budget: {', '.join(over_budget)}"
+            )
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses.jobs import enqueue
+from expenses.models import Occasion
+from expenses.totals import find_drift, rebuild_totals
+
+
+class Command(BaseCommand):
+    help = "Rebuild the denormalized occasion totals from the expenditure and payment tables, or verify them."
+
+    def add_arguments(self, parser):
+        parser.add_argument('occasion_ids', nargs='*', type=int, help="Limit to these occasions (default: all).")
+        parser.add_argument(
+            '--verify', action='store_true',
+            help="Only report occasions whose stored totals have drifted; exit with an error if any have.",
+        )
+        parser.add_argument('--enqueue', action='store_true', help="Queue the rebuild for `run_jobs` instead of running it here.")
+
+    def handle(self, *args, **options):
+        occasions = Occasion.objects.all()
+        if options['occasion_ids']:
+            occasions = occasions.filter(pk__in=options['occasion_ids'])
+
+        if options['verify']:
+            drift = find_drift(occasions)
+            for occasion, field, stored, actual in drift:
+                self.stdout.write(f"Occasion {occasion.id}: {field} is {stored}, expected {actual}")
+            if drift:
+                raise CommandError(f"{len(drift)} stored totals are out of date.")
+            self.stdout.write(self.style.SUCCESS("All occasion totals are up to date."))
+            return
+
+        if options['enqueue']:
+            job, created = enqueue('rebuild_occasion_totals', {'occasion_ids': options['occasion_ids'] or None})
+            self.stdout.write(self.style.SUCCESS(f"{'Queued' if created else 'Already queued'}: job {job.id}."))
+            return
+
+        count = rebuild_totals(occasions)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt totals for {count} occasions."))
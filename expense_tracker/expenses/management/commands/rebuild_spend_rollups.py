@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses.jobs import enqueue
+from expenses.models import Occasion
+from expenses.rollups import find_drift, rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per occasion, user and day spend rollups from the expenditures, or verify them."
+
+    def add_arguments(self, parser):
+        parser.add_argument('occasion_ids', nargs='*', type=int, help="Limit to these occasions (default: all).")
+        parser.add_argument(
+            '--verify', action='store_true',
+            help="Only report rollups that disagree with the expenditures; exit with an error if any do.",
+        )
+        parser.add_argument('--enqueue', action='store_true', help="Queue the rebuild for `run_jobs` instead of running it here.")
+
+    def handle(self, *args, **options):
+        occasions = Occasion.objects.all()
+        if options['occasion_ids']:
+            occasions = occasions.filter(pk__in=options['occasion_ids'])
+
+        if options['verify']:
+            drift = find_drift(occasions)
+            for occasion_id, user_id, day, stored, actual in drift:
+                self.stdout.write(f"Occasion {occasion_id}, user {user_id}, {day}: stored {stored}, expected {actual}")
+            if drift:
+                raise CommandError(f"{len(drift)} spend rollups are out of date.")
+            self.stdout.write(self.style.SUCCESS("All spend rollups are up to date."))
+            return
+
+        if options['enqueue']:
+            job, created = enqueue('rebuild_spend_rollups', {'occasion_ids': options['occasion_ids'] or None})
+            self.stdout.write(self.style.SUCCESS(f"{'Queued' if created else 'Already queued'}: job {job.id}."))
+            return
+
+        count = rebuild_rollups(occasions)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {count} spend rollups."))
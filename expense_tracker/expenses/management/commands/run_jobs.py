@@ -0,0 +1,50 @@
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses.job_worker import worker_process
+from expenses.jobs import default_worker_id, stop_on_signals, work
+
+
+class Command(BaseCommand):
+    help = "Run background jobs from the job queue until stopped; SIGTERM lets running jobs finish first."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help="Worker processes to run (default 1).")
+        parser.add_argument('--burst', action='store_true', help="Exit once no job is due instead of waiting for more.")
+        parser.add_argument('--max-jobs', type=int, help="Exit after each worker has run this many jobs.")
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError("--workers must be at least 1.")
+        worker_id = default_worker_id()
+        if options['workers'] == 1:
+            done = work(worker_id, burst=options['burst'], max_jobs=options['max_jobs'], stop=stop_on_signals())
+            self.stdout.write(self.style.SUCCESS(f"Ran {done} jobs."))
+            return
+
+        # Spawned rather than forked, so no worker inherits the parent's database connections
+        context = multiprocessing.get_context('spawn')
+        processes = [
+            context.Process(
+                target=worker_process, args=(f'{worker_id}-{index}', options['burst'], options['max_jobs']),
+            )
+            for index in range(options['workers'])
+        ]
+        for process in processes:
+            process.start()
+
+        def forward(signum, frame):
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+        signal.signal(signal.SIGTERM, forward)
+        # Ctrl-C reaches the workers directly; the parent only waits for them
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        for process in processes:
+            process.join()
+        failed = [process.exitcode for process in processes if process.exitcode]
+        if failed:
+            raise CommandError(f"{len(failed)} of {len(processes)} workers exited with an error.")
+        self.stdout.write(self.style.SUCCESS(f"{len(processes)} workers stopped."))
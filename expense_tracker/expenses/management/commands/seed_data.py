@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+
+from expenses.benchmark import seed_dataset, timer
+from expenses.models import Expenditure, PaymentLog
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Bulk insert a reproducible synthetic dataset of users, occasions, expenditures and payment logs."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--occasions', type=int, default=10)
+        parser.add_argument('--expenditures', type=int, default=10000, help="Expenditures per occasion.")
+        parser.add_argument('--utilizers', type=int, default=4, help="Utilizers per expenditure.")
+        parser.add_argument('--cleared', type=float, default=0.3, help="Fraction of expenditures cleared with a payment.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='seed-user', help="Username prefix of the seeded users.")
+
+    def handle(self, *args, **options):
+        if not 0 <= options['cleared'] <= 1:
+            raise CommandError("--cleared must be between 0 and 1.")
+        if User.objects.filter(username__startswith=f"{options['prefix']}-").exists():
+            raise CommandError(f"Users named {options['prefix']}-* already exist; pick another --prefix.")
+
+        results = {}
+        with timer(results, 'seed'):
+            user_ids, occasions = seed_dataset(
+                options['users'], options['occasions'], options['expenditures'],
+                options['utilizers'], options['cleared'], options['seed'], options['prefix'],
+            )
+
+        occasion_ids = [occasion.id for occasion in occasions]
+        expenditures = Expenditure.objects.filter(occasion_id__in=occasion_ids).count()
+        payments = PaymentLog.objects.filter(expenditure__occasion_id__in=occasion_ids).count()
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(user_ids)} users, {len(occasions)} occasions, {expenditures} expenditures "
+            f"and {payments} payment logs in {results['seed']:.2f}s"
+        ))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses.stress import run_stress
+
+
+class Command(BaseCommand):
+    help = "Run mixed read/write traffic from several processes against a temporary SQLite file."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--profile', action='append', choices=['development', 'production'],
+            help="Database profile to stress; repeat to compare (default: both).",
+        )
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=10)
+        parser.add_argument('--write-ratio', type=float, default=0.3)
+        parser.add_argument('--expenditures', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        failed = False
+        for profile in options['profile'] or ['development', 'production']:
+            try:
+                result = run_stress(
+                    profile, options['workers'], options['seconds'], options['write_ratio'],
+                    expenditures=options['expenditures'], seed=options['seed'],
+                )
+            except RuntimeError as error:
+                raise CommandError(str(error))
+            self.stdout.write(
+                f"{profile:<12} {result['reads_per_second']:>8.1f} reads/s {result['writes_per_second']:>8.1f} writes/s  "
+                f"read p99 {result.get('read_p99_ms', 0):.1f}ms  write p99 {result.get('write_p99_ms', 0):.1f}ms  "
+                f"lock errors {result['lock_errors']}  other errors {result['errors']}"
+            )
+            failed = failed or (profile == 'production' and (result['lock_errors'] or result['errors']))
+        if failed:
+            raise CommandError("The production profile hit errors under load.")
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:05
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, Max, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_totals(apps, schema_editor):
+    # Same sums as expenses.totals.computed_totals, against the historical models
+    Occasion = apps.get_model('expenses', 'Occasion')
+    Expenditure = apps.get_model('expenses', 'Expenditure')
+    PaymentLog = apps.get_model('expenses', 'PaymentLog')
+    zero = Value(Decimal('0.00'), output_field=DecimalField(max_digits=14, decimal_places=2))
+    last_payments = dict(
+        PaymentLog.objects.values('expenditure__occasion_id')
+        .annotate(last=Max('timestamp'))
+        .values_list('expenditure__occasion_id', 'last')
+    )
+    rows = (
+        Expenditure.objects.filter(occasion__isnull=False)
+        .values('occasion_id')
+        .annotate(
+            total=Coalesce(Sum('amount'), zero),
+            rows=Count('id'),
+            cleared_total=Coalesce(Sum('amount', filter=Q(cleared=True)), zero),
+            uncleared_total=Coalesce(Sum('amount', filter=Q(cleared=False)), zero),
+            last=Max('created_at'),
+        )
+        .order_by()
+    )
+    for row in rows:
+        last_payment = last_payments.get(row['occasion_id'])
+        Occasion.objects.filter(pk=row['occasion_id']).update(
+            total_amount=row['total'],
+            expenditure_count=row['rows'],
+            cleared_amount=row['cleared_total'],
+            uncleared_amount=row['uncleared_total'],
+            last_activity_at=max(row['last'], last_payment) if last_payment else row['last'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0002_expenditure_paymentlog'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='occasion',
+            name='cleared_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='occasion',
+            name='expenditure_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='occasion',
+            name='last_activity_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='occasion',
+            name='total_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='occasion',
+            name='uncleared_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.RunPython(fill_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:08
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0003_occasion_totals'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='expenditure',
+            index=models.Index(fields=['created_at', 'id'], name='expenditure_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expenditure',
+            index=models.Index(fields=['occasion', 'created_at', 'id'], name='expenditure_occasion_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expenditure',
+            index=models.Index(fields=['occasion', 'cleared', 'created_at', 'id'], name='expenditure_occ_cleared_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expenditure',
+            index=models.Index(fields=['expender', 'created_at', 'id'], name='expenditure_expender_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='occasion',
+            index=models.Index(fields=['date', 'id'], name='occasion_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentlog',
+            index=models.Index(fields=['timestamp', 'id'], name='paymentlog_timestamp_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentlog',
+            index=models.Index(fields=['expenditure', 'timestamp', 'id'], name='paymentlog_expenditure_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentlog',
+            index=models.Index(fields=['payer', 'timestamp', 'id'], name='paymentlog_payer_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentlog',
+            index=models.Index(fields=['payee', 'timestamp', 'id'], name='paymentlog_payee_idx'),
+        ),
+    ]
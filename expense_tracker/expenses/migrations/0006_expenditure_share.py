@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:03
+
+import django.db.models.deletion
+from django.conf import settings
+from decimal import Decimal
+
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+
+
+def fill_shares(apps, schema_editor):
+    # Same split as expenses.shares, written out here against the historical models.
+    # Cleared expenditures were paid in full; otherwise only the expender's own share is.
+    Expenditure = apps.get_model('expenses', 'Expenditure')
+    ExpenditureShare = apps.get_model('expenses', 'ExpenditureShare')
+    links = Expenditure.utilizers.through.objects.order_by('expenditure_id', 'customuser_id')
+    expenditures = Expenditure.objects.in_bulk(
+        list(links.values_list('expenditure_id', flat=True).distinct())
+    )
+
+    users_by_expenditure = {}
+    for expenditure_id, user_id in links.values_list('expenditure_id', 'customuser_id').iterator():
+        users_by_expenditure.setdefault(expenditure_id, []).append(user_id)
+
+    shares = []
+    for expenditure_id, user_ids in users_by_expenditure.items():
+        expenditure = expenditures[expenditure_id]
+        cents = int((Decimal(str(expenditure.amount)) * 100).to_integral_value())
+        base, leftover = divmod(cents, len(user_ids))
+        for rank, user_id in enumerate(user_ids):
+            share = base + (1 if rank < leftover else 0)
+            paid = share if expenditure.cleared or user_id == expenditure.expender_id else 0
+            shares.append(ExpenditureShare(
+                expenditure_id=expenditure_id, user_id=user_id, occasion_id=expenditure.occasion_id,
+                expender_id=expenditure.expender_id, amount_cents=share, paid_cents=paid,
+            ))
+        if len(shares) >= BATCH_SIZE:
+            ExpenditureShare.objects.bulk_create(shares)
+            shares = []
+    ExpenditureShare.objects.bulk_create(shares)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0005_occasion_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExpenditureShare',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount_cents', models.PositiveIntegerField()),
+                ('paid_cents', models.PositiveIntegerField(default=0)),
+                ('expender', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('expenditure', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shares', to='expenses.expenditure')),
+                ('occasion', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='expenses.occasion')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='expenditure_shares', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['occasion', 'user'], name='share_occasion_user_idx'), models.Index(fields=['user', 'occasion', 'expender', 'amount_cents'], name='share_user_idx'), models.Index(fields=['expender', 'occasion', 'user', 'amount_cents'], name='share_expender_idx')],
+                'constraints': [models.UniqueConstraint(fields=('expenditure', 'user'), name='share_expenditure_user_uniq'), models.CheckConstraint(condition=models.Q(('paid_cents__lte', models.F('amount_cents'))), name='share_paid_lte_amount')],
+            },
+        ),
+        migrations.RunPython(fill_shares, migrations.RunPython.noop),
+    ]
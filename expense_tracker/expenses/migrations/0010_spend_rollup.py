@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:41
+
+import django.db.models.deletion
+from django.conf import settings
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+
+BATCH_SIZE = 2000
+
+
+def fill_rollups(apps, schema_editor):
+    # Same grouping as expenses.rollups.computed_rollups, against the historical models
+    Expenditure = apps.get_model('expenses', 'Expenditure')
+    SpendRollup = apps.get_model('expenses', 'SpendRollup')
+    zero = Value(Decimal('0.00'), output_field=DecimalField(max_digits=14, decimal_places=2))
+    rows = (
+        Expenditure.objects.filter(occasion__isnull=False)
+        .annotate(day=TruncDate('created_at'))
+        .values('occasion_id', 'expender_id', 'day')
+        .annotate(
+            total=Sum('amount'),
+            rows=Count('id'),
+            cleared_total=Coalesce(Sum('amount', filter=Q(cleared=True)), zero),
+        )
+        .order_by()
+    )
+    SpendRollup.objects.bulk_create([
+        SpendRollup(
+            occasion_id=row['occasion_id'], user_id=row['expender_id'], day=row['day'],
+            amount=row['total'], count=row['rows'], cleared_amount=row['cleared_total'],
+        )
+        for row in rows
+    ], batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0009_job'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpendRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('cleared_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('occasion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='expenses.occasion')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'day'], name='rollup_user_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('occasion', 'day', 'user'), name='rollup_occasion_day_user_uniq')],
+            },
+        ),
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0010_spend_rollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedExpenditure',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('event_name', models.CharField(max_length=255)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('utilizers', models.JSONField(default=list)),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('expender', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('occasion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_expenditures', to='expenses.occasion')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedPaymentLog',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('timestamp', models.DateTimeField()),
+                ('expenditure', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payments', to='expenses.archivedexpenditure')),
+                ('payee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('payer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('owed_cents', models.BigIntegerField(default=0)),
+                ('paid_cents', models.BigIntegerField(default=0)),
+                ('creditor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('debtor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('occasion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='expenses.occasion')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['debtor', 'occasion'], name='archived_balance_debtor_idx'), models.Index(fields=['creditor', 'occasion'], name='archived_balance_creditor_idx')],
+                'constraints': [models.UniqueConstraint(fields=('occasion', 'debtor', 'creditor'), name='archived_balance_uniq')],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedexpenditure',
+            index=models.Index(fields=['occasion', 'created_at', 'id'], name='archived_exp_occasion_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:05
+
+import expenses.encoders
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0011_archive'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='job',
+            name='result',
+            field=models.JSONField(blank=True, encoder=expenses.encoders.ExactJSONEncoder, null=True),
+        ),
+    ]
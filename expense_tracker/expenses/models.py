@@ -1,12 +1,27 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from .encoders import ExactJSONEncoder
+
 User = get_user_model()
 
 class Occasion(models.Model):
     name = models.CharField(max_length=255)
     date = models.DateField()
     description = models.TextField(blank=True, null=True)
+    # Running aggregates over this occasion's expenditures, maintained by expenses.totals
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    expenditure_count = models.PositiveIntegerField(default=0)
+    cleared_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    uncleared_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    last_activity_at = models.DateTimeField(blank=True, null=True)
+    # Bumped on every write that changes the summary; cached summaries are keyed by it
+    version = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date', 'id'], name='occasion_date_id_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -20,9 +35,71 @@ class Expenditure(models.Model):
     cleared = models.BooleanField(default=False)  # New field to track cleared status
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # Keyset pagination seeks on (created_at, id) after the equality filters
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='expenditure_created_id_idx'),
+            models.Index(fields=['occasion', 'created_at', 'id'], name='expenditure_occasion_idx'),
+            models.Index(fields=['occasion', 'cleared', 'created_at', 'id'], name='expenditure_occ_cleared_idx'),
+            models.Index(fields=['expender', 'created_at', 'id'], name='expenditure_expender_idx'),
+        ]
+
     def __str__(self):
         return f"{self.event_name} - {self.amount}"
 
+class ExpenditureShare(models.Model):
+    """
+    What one utilizer owes for an expenditure, and how much of it has been paid, in cents.
+
+    Kept in step with the expenditure by ``expenses.shares``. The occasion and expender
+    are copied from the expenditure so balances are grouped sums over this table alone.
+    """
+    expenditure = models.ForeignKey(Expenditure, on_delete=models.CASCADE, related_name='shares')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='expenditure_shares')
+    occasion = models.ForeignKey(Occasion, on_delete=models.CASCADE, related_name='+', null=True, blank=True)
+    expender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    amount_cents = models.PositiveIntegerField()
+    paid_cents = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['expenditure', 'user'], name='share_expenditure_user_uniq'),
+            models.CheckConstraint(condition=models.Q(paid_cents__lte=models.F('amount_cents')), name='share_paid_lte_amount'),
+        ]
+        indexes = [
+            models.Index(fields=['occasion', 'user'], name='share_occasion_user_idx'),
+            # amount_cents last so the ledger's grouped sums read these indexes alone
+            models.Index(fields=['user', 'occasion', 'expender', 'amount_cents'], name='share_user_idx'),
+            models.Index(fields=['expender', 'occasion', 'user', 'amount_cents'], name='share_expender_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} owes {self.amount_cents / 100:.2f} for {self.expenditure_id}"
+
+class SpendRollup(models.Model):
+    """
+    What one user paid for an occasion's expenditures created on one day, and how much of
+    that has been cleared. Maintained by ``expenses.rollups``; the analytics endpoint
+    reads these rows instead of the expenditures.
+    """
+    occasion = models.ForeignKey(Occasion, on_delete=models.CASCADE, related_name='+')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    day = models.DateField()
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.PositiveIntegerField(default=0)
+    cleared_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['occasion', 'day', 'user'], name='rollup_occasion_day_user_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'day'], name='rollup_user_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} spent {self.amount} on {self.day} for {self.occasion_id}"
+
 class PaymentLog(models.Model):
     expenditure = models.ForeignKey(Expenditure, on_delete=models.CASCADE, related_name='payments')
     payer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='payments_made')
@@ -30,5 +107,162 @@ class PaymentLog(models.Model):
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['timestamp', 'id'], name='paymentlog_timestamp_id_idx'),
+            models.Index(fields=['expenditure', 'timestamp', 'id'], name='paymentlog_expenditure_idx'),
+            models.Index(fields=['payer', 'timestamp', 'id'], name='paymentlog_payer_idx'),
+            models.Index(fields=['payee', 'timestamp', 'id'], name='paymentlog_payee_idx'),
+        ]
+
     def __str__(self):
         return f"Payment of {self.amount} from {self.payer} to {self.payee}"
+
+class IdempotencyKey(models.Model):
+    """
+    The stored response to a write request sent with an ``Idempotency-Key`` header.
+
+    ``key_hash`` identifies the key together with the user and path it was sent to;
+    ``status_code`` stays empty while the first request is still being processed.
+    See ``expenses.idempotency``.
+    """
+    key_hash = models.CharField(max_length=64, unique=True)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    content_type = models.CharField(max_length=100, default='application/json')
+    response = models.BinaryField(null=True)
+    created_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Idempotency key {self.key_hash[:12]} ({self.status_code or 'in progress'})"
+
+class ChangeLogEntry(models.Model):
+    """
+    One write to an expenditure or payment log of an occasion, appended in the same
+    transaction as the write. The id is the cursor of ``occasions/<pk>/changes/``.
+
+    ``occasion_id`` is a plain column rather than a foreign key: entries outlive the
+    rows they describe, and deleting an occasion leaves its log behind.
+    See ``expenses.changes``.
+    """
+    EXPENDITURE = 'expenditure'
+    PAYMENT_LOG = 'payment_log'
+    KIND_CHOICES = [(EXPENDITURE, 'Expenditure'), (PAYMENT_LOG, 'Payment log')]
+
+    occasion_id = models.BigIntegerField()
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # The feed seeks on (occasion_id, id) past the client's cursor
+        indexes = [
+            models.Index(fields=['occasion_id', 'id'], name='changelog_occasion_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"{'Deleted' if self.deleted else 'Changed'} {self.kind} {self.object_id}"
+
+class Job(models.Model):
+    """
+    A background task run by ``manage.py run_jobs``; see ``expenses.jobs``.
+
+    ``dedup_key`` identifies the task and its arguments: at most one identical job can
+    be pending at a time, so repeated requests for the same recomputation share it.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (RUNNING, 'Running'), (SUCCEEDED, 'Succeeded'), (FAILED, 'Failed')]
+
+    task = models.CharField(max_length=100)
+    args = models.JSONField(default=dict)
+    dedup_key = models.CharField(max_length=64)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField()
+    run_at = models.DateTimeField()
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    # Rendered like API responses, so a job's result matches the endpoint it stands in for
+    result = models.JSONField(null=True, blank=True, encoder=ExactJSONEncoder)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['dedup_key'], condition=models.Q(status='pending'), name='job_pending_dedup_uniq',
+            ),
+        ]
+        indexes = [
+            # Workers claim the oldest due pending job
+            models.Index(fields=['status', 'run_at', 'id'], name='job_status_run_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.id} ({self.status})"
+
+class ArchivedExpenditure(models.Model):
+    """
+    A cleared expenditure moved out of ``Expenditure`` by ``manage.py archive_history``,
+    under its original id. ``utilizers`` holds ``[user_id, share_cents]`` pairs from its
+    shares, all of which were paid. See ``expenses.archive``.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    occasion = models.ForeignKey(Occasion, on_delete=models.CASCADE, related_name='archived_expenditures')
+    event_name = models.CharField(max_length=255)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    expender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    utilizers = models.JSONField(default=list)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['occasion', 'created_at', 'id'], name='archived_exp_occasion_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event_name} - {self.amount} (archived)"
+
+class ArchivedPaymentLog(models.Model):
+    """
+    A payment log moved out of ``PaymentLog`` together with its expenditure, under its original id.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    expenditure = models.ForeignKey(ArchivedExpenditure, on_delete=models.CASCADE, related_name='payments')
+    payer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    payee = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    timestamp = models.DateTimeField()
+
+    def __str__(self):
+        return f"Payment of {self.amount} from {self.payer_id} to {self.payee_id} (archived)"
+
+class ArchivedBalance(models.Model):
+    """
+    What archived expenditures still contribute to balances, per occasion and pair of users:
+    the shares ``debtor`` owed ``creditor`` as expender, and what ``debtor`` paid ``creditor``.
+    Settlements and ledgers add these to the sums over the live tables.
+    """
+    occasion = models.ForeignKey(Occasion, on_delete=models.CASCADE, related_name='+')
+    debtor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    creditor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    owed_cents = models.BigIntegerField(default=0)
+    paid_cents = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['occasion', 'debtor', 'creditor'], name='archived_balance_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['debtor', 'occasion'], name='archived_balance_debtor_idx'),
+            models.Index(fields=['creditor', 'occasion'], name='archived_balance_creditor_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.debtor_id} owed {self.owed_cents} and paid {self.paid_cents} to {self.creditor_id}"
@@ -0,0 +1,118 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.encoding import force_str
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Forward-only cursor pagination that seeks on the full ordering key.
+
+    Unlike DRF's ``CursorPagination``, which seeks on the first ordering field and then
+    skips an offset to step over ties, the cursor here holds every ordering value of the
+    last row. The next page is a single indexed range scan however deep it is, provided
+    the view's ``ordering`` ends in a unique field and is covered by an index.
+    """
+    cursor_query_param = 'cursor'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = ('-id',)
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_ordering(self, view):
+        return tuple(getattr(view, 'ordering', None) or self.ordering)
+
+    def get_page_size(self, request):
+        try:
+            requested = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(requested, self.max_page_size))
+
+    def encode_cursor(self, row):
+        values = [force_str(getattr(row, field.lstrip('-'))) for field in self.ordering]
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def decode_cursor(self, queryset, encoded):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            if len(values) != len(self.ordering):
+                raise ValueError
+            return [
+                queryset.model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def seek(self, queryset, values):
+        """
+        Keep only rows strictly after ``values`` in ``self.ordering``.
+
+        The expanded comparison is ANDed with an inclusive bound on the first ordering
+        field so the database can turn it into an index range instead of a filter.
+        """
+        after = Q()
+        for index, (field, value) in enumerate(zip(self.ordering, values)):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            ties = {prior.lstrip('-'): prior_value for prior, prior_value in zip(self.ordering[:index], values)}
+            after |= Q(**ties, **{f'{name}__{lookup}': value})
+
+        first = self.ordering[0]
+        bound = 'lte' if first.startswith('-') else 'gte'
+        return queryset.filter(Q(**{f'{first.lstrip("-")}__{bound}': values[0]}) & after)
+
+    def page_queryset(self, queryset, request, view=None):
+        """
+        The queryset of the requested page plus one row, to tell whether another page follows.
+        """
+        self.request = request
+        self.ordering = self.get_ordering(view)
+        self.page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded:
+            queryset = self.seek(queryset, self.decode_cursor(queryset, encoded))
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, rows):
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.page_queryset(queryset, request, view)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        return self.set_page([row async for row in self.page_queryset(queryset, request, view)])
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,67 @@
+"""
+Encode and decode one large occasion summary with each renderer, to compare DRF's stdlib
+``JSONRenderer`` with the renderers of ``expense_tracker.renderers``: time per call and
+the payload size, raw and gzipped, as a client would download it.
+"""
+import gzip
+import json
+import statistics
+import time
+
+from rest_framework.renderers import JSONRenderer
+
+from expense_tracker import renderers
+
+from .serializers import OccasionSummarySerializer
+from .views import OccasionExpenditureSummaryView
+
+
+def summary_payload(occasion):
+    """
+    The summary endpoint's data with every expenditure of the occasion on one page.
+    """
+    occasion.expenditure_page = list(
+        OccasionExpenditureSummaryView.expenditure_queryset.filter(occasion=occasion)
+        .order_by(*OccasionExpenditureSummaryView.ordering)
+    )
+    return OccasionSummarySerializer(occasion).data
+
+
+def codecs():
+    """
+    ``{name: (encode, decode)}`` for the renderers available here.
+    """
+    available = {
+        'drf-json': (JSONRenderer().render, json.loads),
+        'fast-json': (renderers.FastJSONRenderer().render, renderers.loads),
+    }
+    if renderers.msgpack is not None:
+        available['msgpack'] = (
+            renderers.MessagePackRenderer().render,
+            lambda content: renderers.msgpack.unpackb(content, raw=False),
+        )
+    return available
+
+
+def _timed(function, argument, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(argument)
+        timings.append(time.perf_counter() - start)
+    return result, timings
+
+
+def run_comparison(data, repeat=20):
+    results = []
+    for name, (encode, decode) in codecs().items():
+        content, encode_timings = _timed(encode, data, repeat)
+        _, decode_timings = _timed(decode, content, repeat)
+        results.append({
+            'codec': name,
+            'bytes': len(content),
+            'gzip_bytes': len(gzip.compress(content)),
+            'encode_ms': statistics.median(encode_timings) * 1000,
+            'decode_ms': statistics.median(decode_timings) * 1000,
+        })
+    return results
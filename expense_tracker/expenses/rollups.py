@@ -0,0 +1,173 @@
+"""
+Spend rollups per occasion, user and day, behind the spend analytics endpoint.
+
+A user's spend is what they paid as an expenditure's expender, counted on the day the
+expenditure was created (in ``TIME_ZONE``); it moves into ``cleared_amount`` of that same
+day once the expenditure is cleared. ``expenses.totals`` keeps the rollups in step from
+the write paths, and ``rebuild_rollups()`` recomputes them from the expenditures.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .models import ArchivedExpenditure, Expenditure, SpendRollup
+
+# Keys per UPDATE; each one adds a WHEN to the CASE of every updated column
+UPDATE_BATCH_SIZE = 200
+INSERT_BATCH_SIZE = 2000
+AMOUNT = DecimalField(max_digits=14, decimal_places=2)
+ZERO = Value(Decimal('0.00'), output_field=AMOUNT)
+# Week and month buckets are re-bucketed from the daily rows in SQL; weeks start on Monday
+BUCKETS = {'day': None, 'week': TruncWeek, 'month': TruncMonth}
+
+
+def _key(expenditure):
+    return expenditure.occasion_id, expenditure.expender_id, timezone.localdate(expenditure.created_at)
+
+
+def _match(key):
+    occasion_id, user_id, day = key
+    return Q(occasion_id=occasion_id, user_id=user_id, day=day)
+
+
+def _add(deltas):
+    """
+    Add ``deltas`` (``{key: {field: value}}``, the same fields for every key) to the
+    existing rollup rows with one UPDATE per ``UPDATE_BATCH_SIZE`` keys.
+    """
+    keys = list(deltas)
+    fields = list(deltas[keys[0]])
+    for offset in range(0, len(keys), UPDATE_BATCH_SIZE):
+        batch = keys[offset:offset + UPDATE_BATCH_SIZE]
+        match = Q()
+        for key in batch:
+            match |= _match(key)
+        SpendRollup.objects.filter(match).update(**{
+            field: F(field) + Case(
+                *[When(_match(key), then=Value(deltas[key][field])) for key in batch],
+                output_field=IntegerField() if field == 'count' else AMOUNT,
+            )
+            for field in fields
+        })
+
+
+def add_expenditures(expenditures):
+    """
+    Count newly created expenditures in their rollups. Must run in the creating transaction.
+    """
+    deltas = defaultdict(lambda: {'amount': Decimal('0.00'), 'count': 0, 'cleared_amount': Decimal('0.00')})
+    for expenditure in expenditures:
+        if expenditure.occasion_id is None:
+            continue
+        delta = deltas[_key(expenditure)]
+        delta['amount'] += expenditure.amount
+        delta['count'] += 1
+        if expenditure.cleared:
+            delta['cleared_amount'] += expenditure.amount
+    if not deltas:
+        return
+    # Create missing rows empty and then add to all of them: unlike reading first, this
+    # cannot race with another transaction creating the same row
+    SpendRollup.objects.bulk_create(
+        [SpendRollup(occasion_id=occasion_id, user_id=user_id, day=day) for occasion_id, user_id, day in deltas],
+        batch_size=INSERT_BATCH_SIZE, ignore_conflicts=True,
+    )
+    _add(deltas)
+
+
+def add_cleared(expenditures):
+    """
+    Move newly cleared expenditures into ``cleared_amount``. Their rows exist since they were created.
+    """
+    deltas = defaultdict(lambda: {'cleared_amount': Decimal('0.00')})
+    for expenditure in expenditures:
+        if expenditure.occasion_id is not None:
+            deltas[_key(expenditure)]['cleared_amount'] += expenditure.amount
+    if deltas:
+        _add(deltas)
+
+
+def computed_rollups(occasions):
+    """
+    The rollup rows of ``occasions`` computed from their expenditures, archived ones included, unsaved.
+    """
+    def grouped(model, cleared):
+        return (
+            model.objects.filter(occasion__in=occasions)
+            .annotate(day=TruncDate('created_at'))
+            .values('occasion_id', 'expender_id', 'day')
+            .annotate(total=Sum('amount'), rows=Count('id'), cleared_total=Coalesce(Sum('amount', filter=cleared), ZERO))
+            .order_by()
+        )
+
+    rollups = {}
+    # Only cleared expenditures are archived
+    for row in [*grouped(Expenditure, Q(cleared=True)), *grouped(ArchivedExpenditure, None)]:
+        key = row['occasion_id'], row['expender_id'], row['day']
+        rollup = rollups.get(key)
+        if rollup is None:
+            rollups[key] = SpendRollup(
+                occasion_id=row['occasion_id'], user_id=row['expender_id'], day=row['day'],
+                amount=row['total'], count=row['rows'], cleared_amount=row['cleared_total'],
+            )
+        else:
+            rollup.amount += row['total']
+            rollup.count += row['rows']
+            rollup.cleared_amount += row['cleared_total']
+    return list(rollups.values())
+
+
+@transaction.atomic
+def rebuild_rollups(occasions):
+    """
+    Replace the rollups of ``occasions`` with freshly computed ones; returns how many rows were written.
+    """
+    SpendRollup.objects.filter(occasion__in=occasions).delete()
+    return len(SpendRollup.objects.bulk_create(computed_rollups(occasions), batch_size=INSERT_BATCH_SIZE))
+
+
+def find_drift(occasions):
+    """
+    ``(occasion_id, user_id, day, stored, actual)`` for every rollup that disagrees with the
+    expenditures, as ``(amount, count, cleared_amount)`` tuples; missing rows are zeros.
+    """
+    def values(row):
+        return row.amount, row.count, row.cleared_amount
+
+    stored = {(row.occasion_id, row.user_id, row.day): values(row) for row in SpendRollup.objects.filter(occasion__in=occasions)}
+    actual = {(row.occasion_id, row.user_id, row.day): values(row) for row in computed_rollups(occasions)}
+    empty = (Decimal('0.00'), 0, Decimal('0.00'))
+    return [
+        (*key, stored.get(key, empty), actual.get(key, empty))
+        for key in sorted(stored.keys() | actual.keys())
+        if stored.get(key, empty) != actual.get(key, empty)
+    ]
+
+
+def spend_series(bucket='day', occasion=None, user=None, start=None, end=None):
+    """
+    Spend per bucket, occasion and user between the ``start`` and ``end`` days (inclusive),
+    oldest first. Reads only rollup rows, so the cost follows the number of days and users
+    in range rather than the number of expenditures.
+    """
+    rows = SpendRollup.objects.all()
+    if occasion is not None:
+        rows = rows.filter(occasion_id=occasion)
+    if user is not None:
+        rows = rows.filter(user_id=user)
+    if start is not None:
+        rows = rows.filter(day__gte=start)
+    if end is not None:
+        rows = rows.filter(day__lte=end)
+    truncate = BUCKETS[bucket]
+    period = F('day') if truncate is None else truncate('day')
+    return (
+        rows.annotate(period=period)
+        .values('period', 'occasion_id', 'user_id', 'user__username')
+        .annotate(amount_total=Sum('amount'), count_total=Sum('count'), cleared_total=Sum('cleared_amount'))
+        .order_by('period', 'occasion_id', 'user_id')
+    )
@@ -1,23 +1,65 @@
+from collections.abc import Mapping
+from datetime import datetime, time, timedelta
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers, generics, status
-from .models import Expenditure, Occasion, PaymentLog
+from expense_tracker.instrumentation import InstrumentedSerializerMixin
+from .models import ArchivedExpenditure, ArchivedPaymentLog, Expenditure, Job, Occasion, PaymentLog
+from .changes import record_expenditure_changes
+from .clearing import apply_clears, check_clears
+from .settlement import from_cents
+from .shares import add_utilizers
+from .totals import record_expenditures
 from django.contrib.auth import get_user_model
 from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 
 User = get_user_model()
 
-class OccasionSerializer(serializers.ModelSerializer):
+BULK_BATCH_SIZE = 1000
+CHANGES_MAX_PAGE_SIZE = 1000
+
+class OccasionSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Occasion
         fields = ['id', 'name', 'date', 'description']
 
-class ExpenditureSerializer(serializers.ModelSerializer):
-    expender = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
-    utilizers = serializers.PrimaryKeyRelatedField(queryset=User.objects.all(), many=True)
+class ReferencedUserField(serializers.PrimaryKeyRelatedField):
+    """
+    A user by id, taken from the users its serializer fetched in one query for all of
+    its user fields; ids it didn't find get the usual lookup and error.
+    """
+    def to_internal_value(self, data):
+        users = getattr(self.root, 'referenced_users', {})
+        if isinstance(data, bool):
+            return super().to_internal_value(data)
+        try:
+            return users[int(data)]
+        except (KeyError, TypeError, ValueError):
+            return super().to_internal_value(data)
+
+
+class ExpenditureSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
+    expender = ReferencedUserField(queryset=User.objects.all())
+    utilizers = ReferencedUserField(queryset=User.objects.all(), many=True)
 
     class Meta:
         model = Expenditure
-        fields = ['id', 'occasion', 'event_name', 'amount', 'expender', 'utilizers', 'created_at']
+        fields = ['id', 'occasion', 'event_name', 'amount', 'expender', 'utilizers', 'cleared', 'created_at']
+        read_only_fields = ['cleared']
+
+    def to_internal_value(self, data):
+        # The expender and every utilizer in one query, instead of one query per id
+        ids = set()
+        if isinstance(data, Mapping):
+            utilizers = self.fields['utilizers'].get_value(data)
+            for value in [self.fields['expender'].get_value(data), *(utilizers if isinstance(utilizers, list) else [])]:
+                try:
+                    ids.add(int(value))
+                except (TypeError, ValueError):
+                    pass
+        self.referenced_users = User.objects.in_bulk(ids) if ids else {}
+        return super().to_internal_value(data)
 
     def validate_amount(self, value):
         if value <= 0:
@@ -29,48 +71,199 @@ class ExpenditureSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("At least one utilizer must be provided.")
         return value
 
-class ClearExpenseSerializer(serializers.Serializer):
-    expenditure_id = serializers.IntegerField()
-    payer_id = serializers.IntegerField()
+    def create(self, validated_data):
+        utilizers = validated_data.pop('utilizers')
+        expenditure = Expenditure.objects.create(**validated_data)
+        add_utilizers([(expenditure, [user.id for user in utilizers])])
+        return expenditure
+
+class BulkExpenditureItemSerializer(InstrumentedSerializerMixin, serializers.Serializer):
+    """
+    Validates one item of a bulk upload without touching the database.
+
+    Referenced users and occasions are resolved for the whole batch at once by
+    ``BulkExpenditureSerializer``.
+    """
+    occasion = serializers.IntegerField(required=False, allow_null=True)
+    event_name = serializers.CharField(max_length=255)
     amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    expender = serializers.IntegerField()
+    utilizers = serializers.ListField(child=serializers.IntegerField())
+
+    def validate_amount(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Amount must be greater than zero.")
+        return value
+
+    def validate_utilizers(self, value):
+        if not value:
+            raise serializers.ValidationError("At least one utilizer must be provided.")
+        return list(dict.fromkeys(value))
+
+
+class BulkExpenditureSerializer(InstrumentedSerializerMixin, serializers.Serializer):
+    expenditures = serializers.ListField(child=serializers.DictField(), allow_empty=False, max_length=5000)
 
     def validate(self, data):
-        try:
-            expenditure = Expenditure.objects.get(id=data['expenditure_id'])
-        except Expenditure.DoesNotExist:
-            raise serializers.ValidationError("Expenditure does not exist.")
+        # One item serializer is reused for every row; building a serializer per row
+        # (and deep-copying its fields) costs more than the validation itself.
+        item_serializer = BulkExpenditureItemSerializer()
+        items, errors = [], []
+        for index, raw in enumerate(data['expenditures']):
+            try:
+                items.append((index, item_serializer.run_validation(raw)))
+            except serializers.ValidationError as exc:
+                errors.append({'index': index, 'errors': exc.detail})
+
+        user_ids = {user_id for _, item in items for user_id in [item['expender'], *item['utilizers']]}
+        occasion_ids = {item['occasion'] for _, item in items if item.get('occasion') is not None}
+        known_users = set(User.objects.filter(id__in=user_ids).values_list('id', flat=True))
+        known_occasions = set(Occasion.objects.filter(id__in=occasion_ids).values_list('id', flat=True))
+
+        valid = []
+        for index, item in items:
+            item_errors = {}
+            if item.get('occasion') is not None and item['occasion'] not in known_occasions:
+                item_errors['occasion'] = [f'Invalid pk "{item["occasion"]}" - object does not exist.']
+            if item['expender'] not in known_users:
+                item_errors['expender'] = [f'Invalid pk "{item["expender"]}" - object does not exist.']
+            missing = [user_id for user_id in item['utilizers'] if user_id not in known_users]
+            if missing:
+                item_errors['utilizers'] = [f'Invalid pk "{user_id}" - object does not exist.' for user_id in missing]
+            if item_errors:
+                errors.append({'index': index, 'errors': item_errors})
+            else:
+                valid.append((index, item))
+
+        data['valid'] = valid
+        data['item_errors'] = sorted(errors, key=lambda error: error['index'])
+        return data
+
+    @transaction.atomic
+    def create(self, validated_data):
+        rows = [
+            Expenditure(
+                occasion_id=item.get('occasion'),
+                event_name=item['event_name'],
+                amount=item['amount'],
+                expender_id=item['expender'],
+            )
+            for _, item in validated_data['valid']
+        ]
+        Expenditure.objects.bulk_create(rows, batch_size=BULK_BATCH_SIZE)
+        add_utilizers((row, item['utilizers']) for row, (_, item) in zip(rows, validated_data['valid']))
+        record_expenditures(rows)
+        record_expenditure_changes(rows)
+        return [(index, row) for row, (index, _) in zip(rows, validated_data['valid'])]
+
+
+class ExpenditureFilterSerializer(InstrumentedSerializerMixin, serializers.Serializer):
+    occasion = serializers.IntegerField(required=False)
+    expender = serializers.IntegerField(required=False)
+    utilizer = serializers.IntegerField(required=False)
+    cleared = serializers.BooleanField(required=False)
+
+
+class PaymentLogSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = PaymentLog
+        fields = ['id', 'expenditure', 'payer', 'payee', 'amount', 'timestamp']
+
+
+class PaymentLogFilterSerializer(InstrumentedSerializerMixin, serializers.Serializer):
+    occasion = serializers.IntegerField(required=False)
+    expenditure = serializers.IntegerField(required=False)
+    payer = serializers.IntegerField(required=False)
+    payee = serializers.IntegerField(required=False)
+
+
+class ChangesFilterSerializer(InstrumentedSerializerMixin, serializers.Serializer):
+    since = serializers.IntegerField(required=False, min_value=0, help_text="Cursor returned by the previous call.")
+    page_size = serializers.IntegerField(required=False, min_value=1, max_value=CHANGES_MAX_PAGE_SIZE)
+
 
-        if expenditure.cleared:
-            raise serializers.ValidationError("This expense has already been cleared.")
+class SpendAnalyticsFilterSerializer(InstrumentedSerializerMixin, serializers.Serializer):
+    occasion = serializers.IntegerField(required=False)
+    user = serializers.IntegerField(required=False)
+    bucket = serializers.ChoiceField(choices=['day', 'week', 'month'], default='day')
+    start = serializers.DateField(required=False, help_text="First day to include.")
+    end = serializers.DateField(required=False, help_text="Last day to include.")
+
+    def validate(self, data):
+        if 'occasion' not in data and 'user' not in data:
+            raise serializers.ValidationError("Filter by occasion, user or both.")
+        if 'start' in data and 'end' in data and data['start'] > data['end']:
+            raise serializers.ValidationError("start must not be after end.")
+        return data
 
-        if data['amount'] != expenditure.amount:
-            raise serializers.ValidationError("The payment amount must match the expenditure amount.")
 
-        if data['payer_id'] not in expenditure.utilizers.values_list('id', flat=True):
-            raise serializers.ValidationError("The payer must be one of the utilizers.")
+class ExportFilterSerializer(InstrumentedSerializerMixin, serializers.Serializer):
+    occasion = serializers.IntegerField(required=False)
+    start = serializers.DateField(required=False, help_text="First day to include.")
+    end = serializers.DateField(required=False, help_text="Last day to include.")
 
+    def validate(self, data):
+        if 'start' in data and 'end' in data and data['start'] > data['end']:
+            raise serializers.ValidationError("start must not be after end.")
+        # Turn the inclusive day range into a half-open datetime range the indexes can use
+        if 'start' in data:
+            data['start'] = timezone.make_aware(datetime.combine(data['start'], time.min))
+        if 'end' in data:
+            data['end'] = timezone.make_aware(datetime.combine(data['end'] + timedelta(days=1), time.min))
+        return data
+
+
+class ClearExpenseItemSerializer(InstrumentedSerializerMixin, serializers.Serializer):
+    expenditure_id = serializers.IntegerField()
+    payer_id = serializers.IntegerField()
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+
+
+class ClearExpenseSerializer(ClearExpenseItemSerializer):
+    def validate(self, data):
+        accepted, errors = check_clears([data])
+        if errors:
+            raise serializers.ValidationError(errors[0]['errors'])
+        data['pending'] = accepted[0]
         return data
 
     def create(self, validated_data):
-        expenditure = Expenditure.objects.get(id=validated_data['expenditure_id'])
-        payer = User.objects.get(id=validated_data['payer_id'])
-        payee = expenditure.expender
+        payment_logs, errors = apply_clears([validated_data['pending']])
+        if errors:
+            raise serializers.ValidationError({'non_field_errors': errors[0]['errors']})
+        return payment_logs[0][1]
+
+
+class BatchClearExpenseSerializer(InstrumentedSerializerMixin, serializers.Serializer):
+    clears = serializers.ListField(child=serializers.DictField(), allow_empty=False, max_length=5000)
 
-        # Create a payment log
-        payment_log = PaymentLog.objects.create(
-            expenditure=expenditure,
-            payer=payer,
-            payee=payee,
-            amount=validated_data['amount']
-        )
+    def validate(self, data):
+        item_serializer = ClearExpenseItemSerializer()
+        items, errors = [], []
+        for index, raw in enumerate(data['clears']):
+            try:
+                items.append((index, item_serializer.run_validation(raw)))
+            except serializers.ValidationError as exc:
+                errors.append({'index': index, 'errors': exc.detail})
+
+        accepted, clear_errors = check_clears([item for _, item in items])
+        # check_clears numbers items by position in ``items``; map back to the request
+        for pending in accepted:
+            pending.index = items[pending.index][0]
+        for error in clear_errors:
+            error['index'] = items[error['index']][0]
+
+        data['accepted'] = accepted
+        data['item_errors'] = errors + clear_errors
+        return data
 
-        # Mark the expenditure as cleared
-        expenditure.cleared = True
-        expenditure.save()
+    def create(self, validated_data):
+        payment_logs, errors = apply_clears(validated_data['accepted'])
+        validated_data['item_errors'].extend(errors)
+        return payment_logs
 
-        return payment_log
 
-class ExpenditureSummarySerializer(serializers.ModelSerializer):
+class ExpenditureSummarySerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
     expender = serializers.StringRelatedField()
     utilizers = serializers.StringRelatedField(many=True)
 
@@ -79,16 +272,26 @@ class ExpenditureSummarySerializer(serializers.ModelSerializer):
         fields = ['id', 'event_name', 'amount', 'expender', 'utilizers', 'cleared', 'created_at']
 
 
-class OccasionSummarySerializer(serializers.ModelSerializer):
-    expenditures = ExpenditureSummarySerializer(many=True, read_only=True)
+class OccasionTotalsSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Occasion
+        fields = ['id', 'total_amount', 'expenditure_count', 'cleared_amount', 'uncleared_amount', 'last_activity_at']
+
+
+class OccasionSummarySerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
+    # The view attaches one keyset page of expenditures as ``expenditure_page``
+    expenditures = ExpenditureSummarySerializer(source='expenditure_page', many=True, read_only=True)
     total_amount = serializers.SerializerMethodField()
 
     class Meta:
         model = Occasion
-        fields = ['id', 'name', 'date', 'description', 'total_amount', 'expenditures']
+        fields = [
+            'id', 'name', 'date', 'description', 'total_amount', 'expenditure_count',
+            'cleared_amount', 'uncleared_amount', 'last_activity_at', 'expenditures',
+        ]
 
     def get_total_amount(self, obj):
-        return sum(expenditure.amount for expenditure in obj.expenditures.all())
+        return obj.total_amount
 
 class OccasionExpenditureSummaryView(generics.RetrieveAPIView):
     queryset = Occasion.objects.all()
@@ -100,4 +303,46 @@ class OccasionExpenditureSummaryView(generics.RetrieveAPIView):
             serializer = self.get_serializer(occasion)
             return Response(serializer.data, status=status.HTTP_200_OK)
         except Occasion.DoesNotExist:
-            raise NotFound({"error": "Occasion not found."})  # Custom error response
\ No newline at end of file
+            raise NotFound({"error": "Occasion not found."})  # Custom error response
+
+class SpendBucketSerializer(InstrumentedSerializerMixin, serializers.Serializer):
+    period = serializers.DateField()
+    occasion = serializers.IntegerField(source='occasion_id')
+    user = serializers.IntegerField(source='user_id')
+    username = serializers.CharField(source='user__username')
+    amount = serializers.DecimalField(max_digits=14, decimal_places=2, source='amount_total')
+    count = serializers.IntegerField(source='count_total')
+    cleared_amount = serializers.DecimalField(max_digits=14, decimal_places=2, source='cleared_total')
+
+
+class JobSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
+    # The last line of the traceback; the full one stays in the database
+    error = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = [
+            'id', 'task', 'args', 'status', 'attempts', 'max_attempts', 'run_at', 'created_at', 'finished_at',
+            'result', 'error',
+        ]
+
+    def get_error(self, obj):
+        return obj.error.strip().splitlines()[-1] if obj.error else ''
+
+
+class ArchivedPaymentLogSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = ArchivedPaymentLog
+        fields = ['id', 'payer', 'payee', 'amount', 'timestamp']
+
+
+class ArchivedExpenditureSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
+    utilizers = serializers.SerializerMethodField()
+    payments = ArchivedPaymentLogSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = ArchivedExpenditure
+        fields = ['id', 'occasion', 'event_name', 'amount', 'expender', 'utilizers', 'payments', 'created_at', 'archived_at']
+
+    def get_utilizers(self, obj):
+        return [{"user": user_id, "share": from_cents(cents)} for user_id, cents in obj.utilizers]
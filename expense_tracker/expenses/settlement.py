@@ -0,0 +1,130 @@
+import heapq
+from collections import defaultdict
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db.models import F, IntegerField, Sum
+from django.db.models.functions import Cast, Round
+
+from .models import ArchivedBalance, ExpenditureShare, PaymentLog
+
+CENTS = Decimal('0.01')
+
+
+def to_cents(field):
+    return Cast(Round(F(field) * 100), IntegerField())
+
+
+def from_cents(cents):
+    return (Decimal(cents) / 100).quantize(CENTS)
+
+
+def occasion_balances(occasion_id):
+    """
+    Net balance per user id for an occasion, in cents.
+
+    Positive balances are owed money, negative balances owe money. Every total is a
+    grouped sum over the stored shares or the payment logs; Python only merges the four
+    result sets, and what archived expenditures still contribute (see ``expenses.archive``).
+    """
+    balances = defaultdict(int)
+    shares = ExpenditureShare.objects.filter(occasion_id=occasion_id)
+    payments = PaymentLog.objects.filter(expenditure__occasion_id=occasion_id)
+
+    paid = shares.values('expender_id').annotate(cents=Sum('amount_cents'))
+    for row in paid:
+        balances[row['expender_id']] += row['cents']
+
+    used = shares.values('user_id').annotate(cents=Sum('amount_cents'))
+    for row in used:
+        balances[row['user_id']] -= row['cents']
+
+    sent = payments.values('payer_id').annotate(cents=Sum(to_cents('amount')))
+    for row in sent:
+        balances[row['payer_id']] += row['cents']
+
+    received = payments.values('payee_id').annotate(cents=Sum(to_cents('amount')))
+    for row in received:
+        balances[row['payee_id']] -= row['cents']
+
+    carried = ArchivedBalance.objects.filter(occasion_id=occasion_id).values_list(
+        'debtor_id', 'creditor_id', 'owed_cents', 'paid_cents',
+    )
+    for debtor_id, creditor_id, owed, paid in carried:
+        balances[creditor_id] += owed - paid
+        balances[debtor_id] -= owed - paid
+
+    return {user_id: cents for user_id, cents in balances.items() if cents}
+
+
+def simplify_debts(balances):
+    """
+    Turn net balances (in cents) into a short list of ``(debtor, creditor, cents)`` transfers.
+
+    Debtors and creditors whose balances cancel out exactly are paired first; the rest
+    are settled greedily, largest debtor against largest creditor. The result never
+    has more than ``participants - 1`` transfers.
+    """
+    if sum(balances.values()) != 0:
+        raise ValueError("Balances must sum to zero.")
+
+    transfers = []
+    debtors = defaultdict(list)
+    for user_id, cents in sorted(balances.items()):
+        if cents < 0:
+            debtors[-cents].append(user_id)
+
+    creditors = []
+    for user_id, cents in sorted(balances.items()):
+        if cents <= 0:
+            continue
+        if debtors.get(cents):
+            transfers.append((debtors[cents].pop(0), user_id, cents))
+        else:
+            creditors.append((-cents, user_id))
+
+    debtor_heap = [(-cents, user_id) for cents, users in debtors.items() for user_id in users]
+    heapq.heapify(debtor_heap)
+    heapq.heapify(creditors)
+
+    while debtor_heap and creditors:
+        owed, debtor = heapq.heappop(debtor_heap)
+        due, creditor = heapq.heappop(creditors)
+        cents = min(-owed, -due)
+        transfers.append((debtor, creditor, cents))
+        if -owed > cents:
+            heapq.heappush(debtor_heap, (owed + cents, debtor))
+        if -due > cents:
+            heapq.heappush(creditors, (due + cents, creditor))
+
+    return transfers
+
+
+def settle_occasion(occasion_id):
+    balances = occasion_balances(occasion_id)
+    return balances, simplify_debts(balances)
+
+
+def settlement_report(occasion_id):
+    """
+    The balances and transfers of ``settle_occasion()`` with usernames, as the settlement endpoint returns them.
+    """
+    balances, transfers = settle_occasion(occasion_id)
+    usernames = dict(get_user_model().objects.filter(id__in=balances).values_list('id', 'username'))
+    return {
+        "occasion": occasion_id,
+        "balances": [
+            {"user": user_id, "username": usernames.get(user_id), "balance": from_cents(cents)}
+            for user_id, cents in sorted(balances.items())
+        ],
+        "transfers": [
+            {
+                "from": debtor,
+                "from_username": usernames.get(debtor),
+                "to": creditor,
+                "to_username": usernames.get(creditor),
+                "amount": from_cents(cents),
+            }
+            for debtor, creditor, cents in transfers
+        ],
+    }
@@ -0,0 +1,156 @@
+"""
+Per-utilizer shares of each expenditure, stored in ``ExpenditureShare``.
+
+An expenditure is split evenly between its utilizers in whole cents; the leftover cents
+go one each to the utilizers with the lowest user ids, so the shares always add up to
+the exact amount. The expender's own share, if they are a utilizer, starts out paid.
+
+New expenditures get their utilizer links and shares in one bulk insert each through
+``add_utilizers()``. Later changes to the utilizers through the ORM (a ``m2m_changed``
+handler) or to the expenditure itself rewrite its shares.
+"""
+from decimal import Decimal
+
+from django.db.models import F, Sum
+
+from .models import Expenditure, ExpenditureShare
+
+UtilizerLink = Expenditure.utilizers.through
+UTILIZER_FIELD = Expenditure.utilizers.field.m2m_reverse_field_name()
+
+BATCH_SIZE = 2000
+
+
+def amount_cents(amount):
+    return int((Decimal(str(amount)) * 100).to_integral_value())
+
+
+def split_cents(cents, user_ids):
+    """
+    ``{user_id: cents}`` for an even split, leftover cents to the lowest user ids first.
+    """
+    user_ids = sorted(set(user_ids))
+    if not user_ids:
+        return {}
+    base, leftover = divmod(cents, len(user_ids))
+    return {user_id: base + (1 if rank < leftover else 0) for rank, user_id in enumerate(user_ids)}
+
+
+def build_shares(expenditure, user_ids, paid=None):
+    """
+    Unsaved share rows for ``expenditure``. ``paid`` maps user ids to cents already paid.
+    """
+    paid = paid or {}
+    shares = []
+    for user_id, cents in split_cents(amount_cents(expenditure.amount), user_ids).items():
+        if user_id == expenditure.expender_id:
+            paid_cents = cents
+        else:
+            paid_cents = min(paid.get(user_id, 0), cents)
+        shares.append(ExpenditureShare(
+            expenditure_id=expenditure.id,
+            user_id=user_id,
+            occasion_id=expenditure.occasion_id,
+            expender_id=expenditure.expender_id,
+            amount_cents=cents,
+            paid_cents=paid_cents,
+        ))
+    return shares
+
+
+def create_shares(expenditures_with_users):
+    """
+    Bulk insert the shares of new expenditures, given as ``(expenditure, user_ids)`` pairs.
+    """
+    return ExpenditureShare.objects.bulk_create(
+        [share for expenditure, user_ids in expenditures_with_users for share in build_shares(expenditure, user_ids)],
+        batch_size=BATCH_SIZE,
+    )
+
+
+def add_utilizers(expenditures_with_users):
+    """
+    Bulk insert the utilizer links and shares of new expenditures, given as
+    ``(expenditure, user_ids)`` pairs.
+    """
+    pairs = [(expenditure, list(dict.fromkeys(user_ids))) for expenditure, user_ids in expenditures_with_users]
+    UtilizerLink.objects.bulk_create(
+        [
+            UtilizerLink(expenditure_id=expenditure.id, **{f'{UTILIZER_FIELD}_id': user_id})
+            for expenditure, user_ids in pairs
+            for user_id in user_ids
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    return create_shares(pairs)
+
+
+def sync_shares(expenditure):
+    """
+    Rewrite the shares of one expenditure from its current amount and utilizers, keeping
+    what each remaining utilizer has paid.
+    """
+    user_ids = list(
+        UtilizerLink.objects.filter(expenditure_id=expenditure.id).values_list(f'{UTILIZER_FIELD}_id', flat=True)
+    )
+    existing = ExpenditureShare.objects.filter(expenditure_id=expenditure.id)
+    paid = dict(existing.values_list('user_id', 'paid_cents'))
+    if paid:
+        existing.delete()
+    ExpenditureShare.objects.bulk_create(build_shares(expenditure, user_ids, paid))
+
+
+def outstanding_cents(expenditure_ids):
+    """
+    ``{expenditure_id: cents still owed}`` for the given expenditures.
+    """
+    return dict(
+        ExpenditureShare.objects.filter(expenditure_id__in=expenditure_ids)
+        .values('expenditure_id')
+        .annotate(cents=Sum(F('amount_cents') - F('paid_cents')))
+        .values_list('expenditure_id', 'cents')
+    )
+
+
+def payoffs(expenditures):
+    """
+    ``(expenditure_id, payer_id, amount)`` for a payment that pays off each uncleared
+    expenditure in ``expenditures``: what is still owed, paid by the lowest-id utilizer
+    other than the expender. Lowest expenditure id first.
+    """
+    owed, payers = {}, {}
+    rows = (
+        ExpenditureShare.objects.filter(expenditure__in=expenditures, expenditure__cleared=False)
+        .order_by('expenditure_id', 'user_id')
+        .values_list('expenditure_id', 'user_id', 'expender_id', 'amount_cents', 'paid_cents')
+    )
+    for expenditure_id, user_id, expender_id, cents, paid in rows:
+        owed[expenditure_id] = owed.get(expenditure_id, 0) + cents - paid
+        if user_id != expender_id:
+            payers.setdefault(expenditure_id, user_id)
+    return [
+        (expenditure_id, payers[expenditure_id], (Decimal(cents) / 100).quantize(Decimal('0.01')))
+        for expenditure_id, cents in owed.items()
+        if cents and expenditure_id in payers
+    ]
+
+
+def utilizers_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        sync_shares(instance)
+        return
+    # Changed from the user's side: ``pk_set`` holds the expenditures (all of them on clear)
+    expenditures = Expenditure.objects.filter(pk__in=pk_set) if pk_set else Expenditure.objects.filter(
+        shares__user=instance,
+    )
+    for expenditure in expenditures.distinct():
+        sync_shares(expenditure)
+
+
+def expenditure_saved(sender, instance, created, raw=False, **kwargs):
+    # New expenditures have no utilizers yet; their shares follow when the utilizers are set
+    if created or raw:
+        return
+    sync_shares(instance)
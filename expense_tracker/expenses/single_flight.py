@@ -0,0 +1,81 @@
+"""
+Single-flight calls: concurrent callers asking for the same key share one run of the
+function instead of each running it.
+
+``SingleFlight.do()`` coalesces threads and ``SingleFlight.ado()`` coroutines on the same
+event loop. Both only coalesce within one process; see ``expenses.summary_cache`` for
+waiting on other processes through a cache lock.
+"""
+import asyncio
+import threading
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._async_flights = {}
+
+    def do(self, key, function):
+        """
+        Run ``function()`` unless another thread is already running it for ``key``, in
+        which case wait for that run instead. Returns ``(result, shared)``; an error
+        raised by the run is raised in every caller waiting on it.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            flight.result = function()
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result, False
+
+    async def ado(self, key, function):
+        """
+        ``do()`` for coroutines: ``await function()`` once per key at a time.
+
+        The run is a task of its own that every caller awaits through ``asyncio.shield``,
+        so cancelling the caller that started it (a client that disconnected) does not
+        cancel the run or fail the other callers waiting on it.
+        """
+        # Tasks belong to one event loop, so each loop has its own flights
+        loop = asyncio.get_running_loop()
+        flight_key = (loop, key)
+        task = self._async_flights.get(flight_key)
+        if task is not None:
+            return await asyncio.shield(task), True
+
+        task = self._async_flights[flight_key] = loop.create_task(function())
+        task.add_done_callback(lambda done: self._land(flight_key, done))
+        return await asyncio.shield(task), False
+
+    def _land(self, flight_key, task):
+        del self._async_flights[flight_key]
+        # Mark an error as retrieved in case every caller was cancelled before it
+        if not task.cancelled():
+            task.exception()
+
+    def __len__(self):
+        return len(self._flights) + len(self._async_flights)
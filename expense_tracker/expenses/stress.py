@@ -0,0 +1,171 @@
+"""
+Mixed read/write load from several processes against one SQLite file.
+
+Every process is started with the ``spawn`` method and points the ``default`` database
+at a temporary file before its first query, so the stress run never touches the
+configured database (or, under the test runner, the test database).
+"""
+import multiprocessing
+import os
+import queue
+import random
+import tempfile
+import time
+from collections import defaultdict
+
+from expense_tracker.sqlite import sqlite_profile
+
+OPERATIONS = {
+    'read': ('summary', 'expenditure-list'),
+    'write': ('expenditure-create', 'clear-expense'),
+}
+
+
+def use_database(path, profile):
+    """
+    Set up Django in a fresh process with ``default`` (and a read-only ``replica``) pointed at ``path``.
+    """
+    import django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'expense_tracker.settings')
+    django.setup()
+
+    from django.db import connections
+    reset = {'OPTIONS': {}, 'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False}
+    connections['default'].settings_dict.update({'NAME': path, **reset, **sqlite_profile(profile)})
+    if 'replica' in connections:
+        connections['replica'].settings_dict.update({
+            'NAME': f'file:{path}?mode=ro', **reset, **sqlite_profile(profile, read_only=True),
+        })
+
+
+def prepare_database(path, profile, users, expenditures, seed):
+    use_database(path, profile)
+    from django.core.management import call_command
+    from django.db import connections
+    from .benchmark import seed_dataset
+
+    call_command('migrate', verbosity=0)
+    seed_dataset(users, 1, expenditures, cleared=0.2, seed=seed, prefix='stress-user')
+    connections.close_all()
+
+
+def run_worker(index, workers, path, profile, seconds, write_ratio, seed, barrier, results):
+    use_database(path, profile)
+    from django.db import OperationalError, connections
+    from django.test.utils import setup_test_environment
+    from django.urls import reverse
+    from rest_framework.test import APIClient
+    from .models import Expenditure, Occasion
+    from .shares import UTILIZER_FIELD, UtilizerLink, payoffs
+
+    # Lets the test client's 'testserver' host through ALLOWED_HOSTS
+    setup_test_environment(debug=False)
+    rng = random.Random(seed + index)
+    client = APIClient()
+    occasion = Occasion.objects.get()
+    user_ids = list(UtilizerLink.objects.values_list(f'{UTILIZER_FIELD}_id', flat=True).distinct())
+    # Each worker clears its own share of the expenditures so clears never collide on a row
+    clears = iter([
+        payoff for payoff in payoffs(Expenditure.objects.filter(cleared=False))
+        if payoff[0] % workers == index
+    ])
+    connections.close_all()
+
+    def request(name):
+        if name == 'summary':
+            return client.get(reverse('occasion-summary', kwargs={'pk': occasion.id}))
+        if name == 'expenditure-list':
+            return client.get(reverse('expenditure-create'), {'occasion': occasion.id})
+        if name == 'expenditure-create':
+            return client.post(reverse('expenditure-create'), {
+                'occasion': occasion.id,
+                'event_name': f'Stress {index}',
+                'amount': f'{rng.randint(100, 10000) / 100:.2f}',
+                'expender': rng.choice(user_ids),
+                'utilizers': rng.sample(user_ids, 3),
+            }, format='json')
+        expenditure_id, payer_id, amount = next(clears)
+        return client.post(reverse('clear-expense'), {
+            'expenditure_id': expenditure_id, 'payer_id': payer_id, 'amount': amount,
+        }, format='json')
+
+    counts = defaultdict(int)
+    latencies = defaultdict(list)
+    barrier.wait()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        kind = 'write' if rng.random() < write_ratio else 'read'
+        name = rng.choice(OPERATIONS[kind])
+        start = time.perf_counter()
+        try:
+            response = request(name)
+        except StopIteration:
+            break
+        except OperationalError as error:
+            counts['lock_errors' if 'locked' in str(error) else 'errors'] += 1
+            continue
+        latencies[kind].append(time.perf_counter() - start)
+        counts[kind] += 1
+        if response.status_code >= 500:
+            counts['errors'] += 1
+    connections.close_all()
+    results.put({'counts': dict(counts), 'latencies': dict(latencies)})
+
+
+def run_stress(profile='production', workers=4, seconds=10.0, write_ratio=0.3, users=50, expenditures=5000, seed=0):
+    """
+    Run ``workers`` processes of mixed traffic for ``seconds`` and return the combined totals.
+    """
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'stress.sqlite3')
+        setup = context.Process(target=prepare_database, args=(path, profile, users, expenditures, seed))
+        setup.start()
+        setup.join()
+        if setup.exitcode != 0:
+            raise RuntimeError(f"Preparing the stress database failed with exit code {setup.exitcode}.")
+
+        barrier = context.Barrier(workers)
+        results = context.Queue()
+        processes = [
+            context.Process(
+                target=run_worker,
+                args=(index, workers, path, profile, seconds, write_ratio, seed, barrier, results),
+            )
+            for index in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        try:
+            reports = [results.get(timeout=seconds + 120) for _ in processes]
+        except queue.Empty:
+            for process in processes:
+                process.terminate()
+            raise RuntimeError("A stress worker died before reporting; see its traceback above.")
+        for process in processes:
+            process.join()
+
+    totals = defaultdict(int)
+    latencies = defaultdict(list)
+    for report in reports:
+        for name, count in report['counts'].items():
+            totals[name] += count
+        for kind, samples in report['latencies'].items():
+            latencies[kind].extend(samples)
+
+    summary = {
+        'profile': profile,
+        'workers': workers,
+        'seconds': seconds,
+        'reads': totals['read'],
+        'writes': totals['write'],
+        'reads_per_second': totals['read'] / seconds,
+        'writes_per_second': totals['write'] / seconds,
+        'lock_errors': totals['lock_errors'],
+        'errors': totals['errors'],
+    }
+    for kind, samples in latencies.items():
+        samples.sort()
+        summary[f'{kind}_p50_ms'] = samples[len(samples) // 2] * 1000
+        summary[f'{kind}_p99_ms'] = samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000
+    return summary
@@ -0,0 +1,232 @@
+"""
+Cache of rendered occasion summaries, keyed by occasion version.
+
+Every write that changes a summary bumps ``Occasion.version`` in the same UPDATE that
+maintains the running totals (see ``expenses.totals``), so cached entries for older
+versions are never read again and simply expire. The cache alias is chosen with
+``EXPENSES_SUMMARY_CACHE``; use a file or database cache when several processes serve
+the API so they share entries and counters.
+
+On a miss, concurrent requests for the same summary wait on one computation and share
+its rendered JSON (``EXPENSES_SUMMARY_COALESCING``). Within a process that is a
+single-flight call; with ``EXPENSES_SUMMARY_LOCK`` the computing request also holds a
+lock in the cache, and other processes poll for its result instead of computing it
+again. ``computed`` and ``coalesced`` count the misses each way.
+"""
+import asyncio
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from expense_tracker import renderers
+from .single_flight import SingleFlight
+
+STATS_KEYS = ('hits', 'misses', 'invalidations', 'computed', 'coalesced')
+
+LOCK_POLL_SECONDS = 0.01
+
+flights = SingleFlight()
+
+
+def get_cache():
+    return caches[getattr(settings, 'EXPENSES_SUMMARY_CACHE', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'EXPENSES_SUMMARY_CACHE_TIMEOUT', 300)
+
+
+def _coalescing():
+    return getattr(settings, 'EXPENSES_SUMMARY_COALESCING', True)
+
+
+def _locking():
+    return getattr(settings, 'EXPENSES_SUMMARY_LOCK', False)
+
+
+def _lock_timeout():
+    return getattr(settings, 'EXPENSES_SUMMARY_LOCK_TIMEOUT', 10)
+
+
+def _stats_key(name):
+    return f'expenses:summary-stats:{name}'
+
+
+def _increment(name, delta=1):
+    cache = get_cache()
+    key = _stats_key(name)
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # Evicted between add() and incr(); start counting again
+        cache.set(key, delta, timeout=None)
+
+
+async def _aincrement(name, delta=1):
+    cache = get_cache()
+    key = _stats_key(name)
+    await cache.aadd(key, 0, timeout=None)
+    try:
+        await cache.aincr(key, delta)
+    except ValueError:
+        await cache.aset(key, delta, timeout=None)
+
+
+def request_fingerprint(request):
+    """
+    Short hash of everything besides the occasion version that changes the payload: the
+    URL and the negotiated media type, since each format is a representation of its own.
+    Plain Django requests, which the async views serve as JSON, have no negotiated type.
+    """
+    media_type = getattr(request, 'accepted_media_type', None) or 'application/json'
+    return hashlib.sha256(f'{media_type} {request.build_absolute_uri()}'.encode()).hexdigest()[:16]
+
+
+def summary_key(occasion, request):
+    return f'expenses:summary:{occasion.id}:{occasion.version}:{request_fingerprint(request)}'
+
+
+def summary_etag(occasion, request):
+    return f'"{occasion.id}-{occasion.version}-{request_fingerprint(request)}"'
+
+
+def get_summary(occasion, request):
+    data = get_cache().get(summary_key(occasion, request))
+    _increment('hits' if data is not None else 'misses')
+    return data
+
+
+async def aget_summary(occasion, request):
+    data = await get_cache().aget(summary_key(occasion, request))
+    await _aincrement('hits' if data is not None else 'misses')
+    return data
+
+
+def render(data):
+    return renderers.dumps(data)
+
+
+def get_or_build(occasion, request, build):
+    """
+    The summary payload as ``(data, content)``, from the cache or from ``build()``.
+
+    ``content`` is the payload's JSON when this request computed it or waited on
+    another computation, and ``None`` on a cache hit.
+    """
+    key = summary_key(occasion, request)
+    data = get_summary(occasion, request)
+    if data is not None:
+        return data, None
+    if not _coalescing():
+        return _compute(key, build)
+
+    payload, shared = flights.do(key, lambda: _compute_once(key, build))
+    if shared:
+        _increment('coalesced')
+    return payload
+
+
+def _compute(key, build):
+    data = build()
+    content = render(data)
+    get_cache().set(key, data, timeout=_timeout())
+    _increment('computed')
+    return data, content
+
+
+def _compute_once(key, build):
+    """
+    ``_compute()``, unless another process holding the summary's cache lock finishes it first.
+    """
+    if not _locking():
+        return _compute(key, build)
+
+    cache, lock_key = get_cache(), f'{key}:lock'
+    deadline = time.monotonic() + _lock_timeout()
+    while not cache.add(lock_key, 1, timeout=_lock_timeout()):
+        time.sleep(LOCK_POLL_SECONDS)
+        data = cache.get(key)
+        if data is not None:
+            _increment('coalesced')
+            return data, render(data)
+        if time.monotonic() >= deadline:
+            # The lock holder is stuck or gone; compute without it
+            return _compute(key, build)
+    try:
+        # The previous holder may have stored the summary just before releasing the lock
+        data = cache.get(key)
+        if data is not None:
+            _increment('coalesced')
+            return data, render(data)
+        return _compute(key, build)
+    finally:
+        cache.delete(lock_key)
+
+
+async def aget_or_build(occasion, request, build):
+    """
+    ``get_or_build()`` through the async cache API; ``build`` is a coroutine function.
+    """
+    key = summary_key(occasion, request)
+    data = await aget_summary(occasion, request)
+    if data is not None:
+        return data, None
+    if not _coalescing():
+        return await _acompute(key, build)
+
+    payload, shared = await flights.ado(key, lambda: _acompute_once(key, build))
+    if shared:
+        await _aincrement('coalesced')
+    return payload
+
+
+async def _acompute(key, build):
+    data = await build()
+    content = render(data)
+    await get_cache().aset(key, data, timeout=_timeout())
+    await _aincrement('computed')
+    return data, content
+
+
+async def _acompute_once(key, build):
+    if not _locking():
+        return await _acompute(key, build)
+
+    cache, lock_key = get_cache(), f'{key}:lock'
+    deadline = time.monotonic() + _lock_timeout()
+    while not await cache.aadd(lock_key, 1, timeout=_lock_timeout()):
+        await asyncio.sleep(LOCK_POLL_SECONDS)
+        data = await cache.aget(key)
+        if data is not None:
+            await _aincrement('coalesced')
+            return data, render(data)
+        if time.monotonic() >= deadline:
+            return await _acompute(key, build)
+    try:
+        data = await cache.aget(key)
+        if data is not None:
+            await _aincrement('coalesced')
+            return data, render(data)
+        return await _acompute(key, build)
+    finally:
+        await cache.adelete(lock_key)
+
+
+def record_invalidations(count=1):
+    if count:
+        _increment('invalidations', count)
+
+
+def stats():
+    values = get_cache().get_many([_stats_key(name) for name in STATS_KEYS])
+    counts = {name: values.get(_stats_key(name), 0) for name in STATS_KEYS}
+    lookups = counts['hits'] + counts['misses']
+    counts['hit_rate'] = counts['hits'] / lookups if lookups else None
+    return counts
+
+
+def reset_stats():
+    get_cache().delete_many([_stats_key(name) for name in STATS_KEYS])
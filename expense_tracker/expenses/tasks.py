@@ -0,0 +1,25 @@
+"""
+Recomputations that can run as background jobs; see ``expenses.jobs``.
+"""
+from .jobs import task
+from .models import Occasion
+from .rollups import rebuild_rollups
+from .settlement import settlement_report
+from .totals import rebuild_totals
+
+
+@task
+def rebuild_occasion_totals(occasion_ids=None):
+    occasions = Occasion.objects.all() if occasion_ids is None else Occasion.objects.filter(pk__in=occasion_ids)
+    return {'rebuilt': rebuild_totals(occasions)}
+
+
+@task
+def rebuild_spend_rollups(occasion_ids=None):
+    occasions = Occasion.objects.all() if occasion_ids is None else Occasion.objects.filter(pk__in=occasion_ids)
+    return {'rollups': rebuild_rollups(occasions)}
+
+
+@task
+def occasion_settlement(occasion_id):
+    return settlement_report(occasion_id)
@@ -1,9 +1,54 @@
+import asyncio
+import csv
+import json
 import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import timedelta
+from importlib import import_module
+from unittest import mock, skipIf, skipUnless
+from decimal import Decimal
+from io import StringIO
+from django.apps import apps as django_apps
+from django.core.management import call_command
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management.base import CommandError
+from django.db import connection, connections
+from django.db.models import F
+from django.test import RequestFactory, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from rest_framework.test import APITestCase
-from rest_framework import status
+from django.utils import timezone
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APITestCase
+from rest_framework import generics, status
 from django.contrib.auth import get_user_model
-from .models import Occasion, Expenditure, PaymentLog
+from expense_tracker import routers
+from expense_tracker.instrumentation import InstrumentationMiddleware
+from expense_tracker.sqlite import sqlite_profile
+from expense_tracker import coldstart, renderers, swagger
+from users import user_cache
+from rest_framework_simplejwt.tokens import RefreshToken
+from .asgi_benchmark import MODES, run_comparison
+from .benchmark import seed_dataset, seed_occasion, seed_users
+from . import archive, coalescing_benchmark, endpoint_benchmark, exports, jobs, renderer_benchmark, rollups, summary_cache
+from .clearing import apply_clears, check_clears
+from .ledger import user_ledger_cents
+from .models import (
+    ArchivedExpenditure, ArchivedPaymentLog, ChangeLogEntry, Occasion, Expenditure, ExpenditureShare, IdempotencyKey, Job, PaymentLog, SpendRollup,
+)
+from .pagination import KeysetPagination
+from .settlement import occasion_balances, simplify_debts
+from .single_flight import SingleFlight
+from .shares import payoffs, split_cents
+from .stress import run_stress
+from .totals import find_drift, rebuild_totals
 
 User = get_user_model()
 
@@ -45,6 +90,18 @@ class OccasionTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         logger.info("test_create_occasion_invalid_date completed successfully in OccasionTests")
 
+    def test_list_occasions(self):
+        logger.info("Starting test_list_occasions in OccasionTests")
+        for day in ('2025-03-01', '2025-03-03', '2025-03-02'):
+            Occasion.objects.create(name=day, date=day)
+        response = self.client.get(self.create_url, {'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['name'] for row in response.data['results']], ['2025-03-03', '2025-03-02'])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([row['name'] for row in response.data['results']], ['2025-03-01'])
+        self.assertIsNone(response.data['next'])
+        logger.info("test_list_occasions completed successfully in OccasionTests")
+
 class ExpenditureTests(APITestCase):
 
     @classmethod
@@ -157,7 +214,7 @@ class ClearExpenseTests(APITestCase):
         data = {
             'expenditure_id': self.expenditure.id,
             'payer_id': self.utilizer1.id,
-            'amount': 100.00  # Incorrect amount
+            'amount': 200.00  # More than is owed
         }
         response = self.client.post(self.clear_expense_url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -197,6 +254,569 @@ class ClearExpenseTests(APITestCase):
         self.assertEqual(PaymentLog.objects.count(), 1)  # Only one payment log should exist
         logger.info("test_clear_expense_already_cleared completed successfully in ClearExpenseTests")
 
+class BatchClearExpenseTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # Create test users
+        cls.expender = User.objects.create_user(username='expender', password='password123')
+        cls.utilizer1 = User.objects.create_user(username='utilizer1', password='password123')
+        cls.utilizer2 = User.objects.create_user(username='utilizer2', password='password123')
+
+        # Create a test occasion with three expenditures
+        cls.occasion = Occasion.objects.create(name='Test Occasion', date='2025-03-27', description='Test Description')
+        cls.expenditures = []
+        for amount in ('10.00', '20.00', '30.00'):
+            expenditure = Expenditure.objects.create(
+                occasion=cls.occasion, event_name='Dinner Party', amount=amount, expender=cls.expender,
+            )
+            expenditure.utilizers.set([cls.utilizer1, cls.utilizer2])
+            cls.expenditures.append(expenditure)
+        rebuild_totals()
+
+        cls.batch_url = reverse('clear-expense-batch')
+
+        logger.info("Test data setup complete for BatchClearExpenseTests.")
+
+    def clear(self, expenditure, payer=None, amount=None):
+        return {
+            'expenditure_id': expenditure.id,
+            'payer_id': (payer or self.utilizer1).id,
+            'amount': str(amount or expenditure.amount),
+        }
+
+    def test_batch_clear_reports_each_item(self):
+        logger.info("Starting test_batch_clear_reports_each_item in BatchClearExpenseTests")
+        first, second, third = self.expenditures
+        response = self.client.post(self.batch_url, {'clears': [
+            self.clear(first),
+            self.clear(second, amount='25.00'),
+            self.clear(third, payer=self.utilizer2),
+            self.clear(first),
+            {'expenditure_id': 999, 'payer_id': self.utilizer1.id, 'amount': '1.00'},
+            {'expenditure_id': 'abc'},
+        ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['cleared'], 2)
+        results = response.data['results']
+        self.assertEqual([result['index'] for result in results], [0, 1, 2, 3, 4, 5])
+        self.assertEqual(results[0]['payment_log']['payee'], 'expender')
+        self.assertEqual(results[2]['payment_log']['payer'], 'utilizer2')
+        self.assertEqual(results[1]['errors'], ['The payment amount must not exceed what is still owed.'])
+        self.assertEqual(results[3]['errors'], ['This expense has already been cleared.'])
+        self.assertEqual(results[4]['errors'], ['Expenditure does not exist.'])
+        self.assertIn('expenditure_id', results[5]['errors'])
+
+        self.assertEqual(PaymentLog.objects.count(), 2)
+        self.assertEqual(
+            set(Expenditure.objects.filter(cleared=True).values_list('id', flat=True)), {first.id, third.id}
+        )
+        self.occasion.refresh_from_db()
+        self.assertEqual(self.occasion.cleared_amount, Decimal('40.00'))
+        self.assertEqual(self.occasion.uncleared_amount, Decimal('20.00'))
+        self.assertEqual(find_drift(), [])
+        logger.info("test_batch_clear_reports_each_item completed successfully in BatchClearExpenseTests")
+
+    def test_concurrent_clear_loses_race(self):
+        logger.info("Starting test_concurrent_clear_loses_race in BatchClearExpenseTests")
+        first, second, _ = self.expenditures
+        accepted, errors = check_clears([
+            {'expenditure_id': first.id, 'payer_id': self.utilizer1.id, 'amount': Decimal(first.amount)},
+            {'expenditure_id': second.id, 'payer_id': self.utilizer1.id, 'amount': Decimal(second.amount)},
+        ])
+        self.assertEqual((len(accepted), errors), (2, []))
+
+        # Another request clears the first expenditure after the checks passed
+        Expenditure.objects.filter(pk=first.pk).update(cleared=True)
+        payment_logs, errors = apply_clears(accepted)
+        self.assertEqual([index for index, _ in payment_logs], [1])
+        self.assertEqual(errors, [{'index': 0, 'errors': ['This expense has already been cleared.']}])
+        self.assertEqual(list(PaymentLog.objects.values_list('expenditure_id', flat=True)), [second.id])
+        logger.info("test_concurrent_clear_loses_race completed successfully in BatchClearExpenseTests")
+
+    def test_concurrent_payment_rechecks_each_item(self):
+        logger.info("Starting test_concurrent_payment_rechecks_each_item in BatchClearExpenseTests")
+        first, second, _ = self.expenditures
+        accepted, errors = check_clears([
+            {'expenditure_id': first.id, 'payer_id': self.utilizer1.id, 'amount': Decimal('10.00')},
+            {'expenditure_id': second.id, 'payer_id': self.utilizer1.id, 'amount': Decimal('20.00')},
+        ])
+        self.assertEqual((len(accepted), errors), (2, []))
+
+        # Another request pays utilizer2's half of the first expenditure after the checks passed
+        ExpenditureShare.objects.filter(expenditure=first, user=self.utilizer2).update(paid_cents=F('amount_cents'))
+        payment_logs, errors = apply_clears(accepted)
+        self.assertEqual([index for index, _ in payment_logs], [1])
+        self.assertEqual(errors, [{'index': 0, 'errors': ['The payment amount must not exceed what is still owed.']}])
+        self.assertEqual(
+            list(ExpenditureShare.objects.filter(expenditure=first).order_by('user_id').values_list('paid_cents', flat=True)),
+            [0, 500],
+        )
+        self.assertEqual(set(Expenditure.objects.filter(cleared=True).values_list('id', flat=True)), {second.id})
+        logger.info("test_concurrent_payment_rechecks_each_item completed successfully in BatchClearExpenseTests")
+
+    def test_batch_clear_nothing_cleared(self):
+        logger.info("Starting test_batch_clear_nothing_cleared in BatchClearExpenseTests")
+        response = self.client.post(self.batch_url, {'clears': [
+            self.clear(self.expenditures[0], payer=self.expender),
+        ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['results'][0]['errors'], ['The payer must be one of the utilizers.'])
+        logger.info("test_batch_clear_nothing_cleared completed successfully in BatchClearExpenseTests")
+
+class ExpenditureShareTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # Create test users
+        cls.expender = User.objects.create_user(username='expender', password='password123')
+        cls.utilizer1 = User.objects.create_user(username='utilizer1', password='password123')
+        cls.utilizer2 = User.objects.create_user(username='utilizer2', password='password123')
+
+        # 10.00 shared by all three: the expender's own share is paid, 6.66 is still owed
+        cls.occasion = Occasion.objects.create(name='Test Occasion', date='2025-03-27', description='Test Description')
+        cls.expenditure = Expenditure.objects.create(
+            occasion=cls.occasion, event_name='Lunch', amount='10.00', expender=cls.expender,
+        )
+        cls.expenditure.utilizers.set([cls.utilizer2, cls.expender, cls.utilizer1])
+        rebuild_totals()
+
+        cls.clear_expense_url = reverse('clear-expense')
+
+        logger.info("Test data setup complete for ExpenditureShareTests.")
+
+    def setUp(self):
+        # Cached summaries are keyed by occasion version, which repeats across rolled back tests
+        summary_cache.get_cache().clear()
+
+    def shares(self, expenditure=None):
+        return {
+            user_id: (cents, paid)
+            for user_id, cents, paid in ExpenditureShare.objects.filter(expenditure=expenditure or self.expenditure)
+            .values_list('user_id', 'amount_cents', 'paid_cents')
+        }
+
+    def pay(self, payer, amount):
+        return self.client.post(self.clear_expense_url, {
+            'expenditure_id': self.expenditure.id, 'payer_id': payer.id, 'amount': amount,
+        }, format='json')
+
+    def test_split_assigns_remainder_to_lowest_user_ids(self):
+        logger.info("Starting test_split_assigns_remainder_to_lowest_user_ids in ExpenditureShareTests")
+        self.assertEqual(split_cents(1001, [7, 3, 5]), {3: 334, 5: 334, 7: 333})
+        self.assertEqual(self.shares(), {
+            self.expender.id: (334, 334),
+            self.utilizer1.id: (333, 0),
+            self.utilizer2.id: (333, 0),
+        })
+        logger.info("test_split_assigns_remainder_to_lowest_user_ids completed successfully in ExpenditureShareTests")
+
+    def test_create_endpoints_insert_shares(self):
+        logger.info("Starting test_create_endpoints_insert_shares in ExpenditureShareTests")
+        response = self.client.post(reverse('expenditure-create'), {
+            'occasion': self.occasion.id, 'event_name': 'Taxi', 'amount': '0.05',
+            'expender': self.utilizer1.id, 'utilizers': [self.expender.id, self.utilizer2.id],
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.shares(response.data['id']), {self.expender.id: (3, 0), self.utilizer2.id: (2, 0)})
+
+        response = self.client.post(reverse('expenditure-bulk-create'), {'expenditures': [{
+            'event_name': 'Bus', 'amount': '3.00', 'expender': self.utilizer2.id,
+            'utilizers': [self.utilizer2.id, self.utilizer1.id],
+        }]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            self.shares(response.data['created'][0]['id']),
+            {self.utilizer1.id: (150, 0), self.utilizer2.id: (150, 150)},
+        )
+        logger.info("test_create_endpoints_insert_shares completed successfully in ExpenditureShareTests")
+
+    def test_partial_payments_clear_once_everything_is_paid(self):
+        logger.info("Starting test_partial_payments_clear_once_everything_is_paid in ExpenditureShareTests")
+        response = self.pay(self.utilizer2, '2.00')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['message'], 'Payment recorded; part of the expense is still owed.')
+        self.assertFalse(Expenditure.objects.get(pk=self.expenditure.pk).cleared)
+
+        # 4.67 is left, so paying 5.00 is refused
+        response = self.pay(self.utilizer1, '5.00')
+        self.assertEqual(response.data['non_field_errors'], ['The payment amount must not exceed what is still owed.'])
+        response = self.pay(self.utilizer1, '0.00')
+        self.assertEqual(response.data['non_field_errors'], ['The payment amount must be greater than zero.'])
+
+        # utilizer1 pays their own share first, then the rest of utilizer2's
+        response = self.pay(self.utilizer1, '4.66')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['message'], 'Expense cleared successfully.')
+        self.assertEqual(self.shares(), {
+            self.expender.id: (334, 334),
+            self.utilizer1.id: (333, 333),
+            self.utilizer2.id: (333, 333),
+        })
+        self.assertTrue(Expenditure.objects.get(pk=self.expenditure.pk).cleared)
+        self.occasion.refresh_from_db()
+        self.assertEqual(self.occasion.cleared_amount, Decimal('10.00'))
+        self.assertEqual(self.occasion.uncleared_amount, Decimal('0.00'))
+        self.assertEqual(find_drift(), [])
+
+        # utilizer1 covered 1.33 of utilizer2's share, so utilizer2 now owes utilizer1
+        self.assertEqual(occasion_balances(self.occasion.id), {self.utilizer1.id: 133, self.utilizer2.id: -133})
+        logger.info("test_partial_payments_clear_once_everything_is_paid completed successfully in ExpenditureShareTests")
+
+    def test_expender_cannot_pay_themselves(self):
+        logger.info("Starting test_expender_cannot_pay_themselves in ExpenditureShareTests")
+        response = self.pay(self.expender, '1.00')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            response.data['non_field_errors'], ['The expender cannot pay towards their own expenditure.'],
+        )
+        logger.info("test_expender_cannot_pay_themselves completed successfully in ExpenditureShareTests")
+
+    def test_changing_utilizers_keeps_paid_amounts(self):
+        logger.info("Starting test_changing_utilizers_keeps_paid_amounts in ExpenditureShareTests")
+        self.pay(self.utilizer1, '3.33')
+        self.expenditure.utilizers.remove(self.utilizer2)
+        self.assertEqual(self.shares(), {self.expender.id: (500, 500), self.utilizer1.id: (500, 333)})
+        # From the user's side of the relation as well
+        self.utilizer2.expenditures_utilized.add(self.expenditure)
+        self.assertEqual(self.shares()[self.utilizer2.id], (333, 0))
+        logger.info("test_changing_utilizers_keeps_paid_amounts completed successfully in ExpenditureShareTests")
+
+    def test_migration_backfills_shares(self):
+        logger.info("Starting test_migration_backfills_shares in ExpenditureShareTests")
+        expected = self.shares()
+        Expenditure.objects.filter(pk=self.expenditure.pk).update(cleared=False)
+        ExpenditureShare.objects.all().delete()
+        migration = import_module('expenses.migrations.0006_expenditure_share')
+        migration.fill_shares(django_apps, None)
+        self.assertEqual(self.shares(), expected)
+        logger.info("test_migration_backfills_shares completed successfully in ExpenditureShareTests")
+
+class IdempotencyKeyTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # Create test users
+        cls.expender = User.objects.create_user(username='expender', password='password123')
+        cls.utilizer1 = User.objects.create_user(username='utilizer1', password='password123')
+
+        # Create a test occasion
+        cls.occasion = Occasion.objects.create(name='Test Occasion', date='2025-03-27', description='Test Description')
+
+        cls.create_url = reverse('expenditure-create')
+        cls.clear_expense_url = reverse('clear-expense')
+        cls.payload = {
+            'occasion': cls.occasion.id,
+            'event_name': 'Dinner Party',
+            'amount': '40.00',
+            'expender': cls.expender.id,
+            'utilizers': [cls.utilizer1.id],
+        }
+
+        logger.info("Test data setup complete for IdempotencyKeyTests.")
+
+    def setUp(self):
+        # Cached summaries are keyed by occasion version, which repeats across rolled back tests
+        summary_cache.get_cache().clear()
+        self.client.force_authenticate(self.utilizer1)
+
+    def post(self, url, data, key):
+        return self.client.post(url, data, format='json', headers={'Idempotency-Key': key})
+
+    def test_retried_create_replays_the_first_response(self):
+        logger.info("Starting test_retried_create_replays_the_first_response in IdempotencyKeyTests")
+        first = self.post(self.create_url, self.payload, 'create-1')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn('Idempotent-Replayed', first)
+
+        # The replay only looks up the key: no validation, no writes
+        with self.assertNumQueries(1):
+            retry = self.post(self.create_url, self.payload, 'create-1')
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(json.loads(retry.content), json.loads(first.content))
+        self.assertEqual(Expenditure.objects.count(), 1)
+
+        # Keys are scoped to the user that sent them
+        self.client.force_authenticate(self.expender)
+        self.assertEqual(self.post(self.create_url, self.payload, 'create-1').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Expenditure.objects.count(), 2)
+
+        # ... so anonymous requests can't send one
+        self.client.force_authenticate(None)
+        response = self.post(self.create_url, self.payload, 'create-1')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['error'], 'The Idempotency-Key header can only be sent by authenticated users.')
+        self.assertEqual(Expenditure.objects.count(), 2)
+        logger.info("test_retried_create_replays_the_first_response completed successfully in IdempotencyKeyTests")
+
+    def test_retried_clear_does_not_fail_as_already_cleared(self):
+        logger.info("Starting test_retried_clear_does_not_fail_as_already_cleared in IdempotencyKeyTests")
+        expenditure_id = self.post(self.create_url, self.payload, 'create-1').data['id']
+        clear = {'expenditure_id': expenditure_id, 'payer_id': self.utilizer1.id, 'amount': '40.00'}
+        first = self.post(self.clear_expense_url, clear, 'clear-1')
+        retry = self.post(self.clear_expense_url, clear, 'clear-1')
+        self.assertEqual((first.status_code, retry.status_code), (status.HTTP_200_OK, status.HTTP_200_OK))
+        self.assertEqual(json.loads(retry.content)['payment_log']['id'], first.data['payment_log']['id'])
+        self.assertEqual(PaymentLog.objects.count(), 1)
+
+        # Without a key the second attempt is refused
+        response = self.client.post(self.clear_expense_url, clear, format='json')
+        self.assertEqual(response.data['non_field_errors'], ['This expense has already been cleared.'])
+        logger.info("test_retried_clear_does_not_fail_as_already_cleared completed successfully in IdempotencyKeyTests")
+
+    def test_key_conflicts(self):
+        logger.info("Starting test_key_conflicts in IdempotencyKeyTests")
+        self.post(self.create_url, self.payload, 'create-1')
+        response = self.post(self.create_url, {**self.payload, 'amount': '41.00'}, 'create-1')
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.data['error'], 'This Idempotency-Key was already used for a different request.')
+        response = self.post(self.create_url, self.payload, 'x' * 256)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # The first request is still running
+        IdempotencyKey.objects.update(status_code=None, response=None)
+        response = self.post(self.create_url, self.payload, 'create-1')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+        # ... or its worker died; after the lock timeout a retry takes the key over
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(minutes=2))
+        response = self.post(self.create_url, self.payload, 'create-1')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(IdempotencyKey.objects.get().status_code, status.HTTP_201_CREATED)
+        logger.info("test_key_conflicts completed successfully in IdempotencyKeyTests")
+
+    def test_failed_requests_can_be_retried(self):
+        logger.info("Starting test_failed_requests_can_be_retried in IdempotencyKeyTests")
+        with mock.patch('expenses.views.record_expenditure', side_effect=RuntimeError("database went away")):
+            with self.assertRaises(RuntimeError):
+                self.post(self.create_url, self.payload, 'create-1')
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.post(self.create_url, self.payload, 'create-1').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Expenditure.objects.count(), 1)
+
+        # A server error returned rather than raised rolls back the writes too
+        def unavailable(view, request, *args, **kwargs):
+            view.create(request, *args, **kwargs)
+            return Response({'error': 'Unavailable.'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        with mock.patch.object(generics.ListCreateAPIView, 'post', unavailable):
+            response = self.post(self.create_url, self.payload, 'create-2')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(Expenditure.objects.count(), 1)
+        self.assertFalse(IdempotencyKey.objects.filter(status_code__isnull=True).exists())
+        self.assertEqual(self.post(self.create_url, self.payload, 'create-2').status_code, status.HTTP_201_CREATED)
+        logger.info("test_failed_requests_can_be_retried completed successfully in IdempotencyKeyTests")
+
+    def test_raised_validation_errors_are_stored(self):
+        logger.info("Starting test_raised_validation_errors_are_stored in IdempotencyKeyTests")
+        for url in (reverse('expenditure-bulk-create'), reverse('clear-expense-batch')):
+            first = self.post(url, {}, f'{url}-1')
+            self.assertEqual(first.status_code, status.HTTP_400_BAD_REQUEST)
+            retry = self.post(url, {}, f'{url}-1')
+            self.assertEqual(retry.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(retry['Idempotent-Replayed'], 'true')
+            self.assertEqual(json.loads(retry.content), json.loads(first.content))
+        self.assertEqual(
+            list(IdempotencyKey.objects.values_list('status_code', flat=True)), [status.HTTP_400_BAD_REQUEST] * 2,
+        )
+        logger.info("test_raised_validation_errors_are_stored completed successfully in IdempotencyKeyTests")
+
+    def test_replay_keeps_the_negotiated_content_type(self):
+        logger.info("Starting test_replay_keeps_the_negotiated_content_type in IdempotencyKeyTests")
+        first = self.client.post(
+            self.create_url, self.payload, format='json', headers={'Idempotency-Key': 'create-1', 'Accept': 'text/html'},
+        )
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        retry = self.post(self.create_url, self.payload, 'create-1')
+        self.assertEqual(retry['Content-Type'], first['Content-Type'])
+        self.assertTrue(retry['Content-Type'].startswith('text/html'))
+        self.assertEqual(retry.content, first.content)
+        logger.info("test_replay_keeps_the_negotiated_content_type completed successfully in IdempotencyKeyTests")
+
+    async def test_async_endpoints_replay_the_first_response(self):
+        logger.info("Starting test_async_endpoints_replay_the_first_response in IdempotencyKeyTests")
+        token = RefreshToken.for_user(self.utilizer1).access_token
+
+        async def post(url, data, key):
+            return await self.async_client.post(
+                url, data, content_type='application/json',
+                headers={'Idempotency-Key': key, 'Authorization': f'Bearer {token}'},
+            )
+
+        create_url = reverse('async-expenditure-create')
+        first, retry = [await post(create_url, self.payload, 'create-1') for _ in range(2)]
+        self.assertEqual((first.status_code, retry.status_code), (status.HTTP_201_CREATED, status.HTTP_201_CREATED))
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.content, first.content)
+        self.assertEqual(await Expenditure.objects.acount(), 1)
+
+        clear_url = reverse('async-clear-expense')
+        clear = {'expenditure_id': json.loads(first.content)['id'], 'payer_id': self.utilizer1.id, 'amount': '40.00'}
+        first, retry = [await post(clear_url, clear, 'clear-1') for _ in range(2)]
+        self.assertEqual((first.status_code, retry.status_code), (status.HTTP_200_OK, status.HTTP_200_OK))
+        self.assertEqual(retry.content, first.content)
+        self.assertEqual(await PaymentLog.objects.acount(), 1)
+
+        # Errors are stored too, including those raised before the view runs its checks
+        first, retry = [await post(create_url, {}, 'create-2') for _ in range(2)]
+        self.assertEqual((first.status_code, retry.status_code), (status.HTTP_400_BAD_REQUEST, status.HTTP_400_BAD_REQUEST))
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        response = await self.async_client.post(
+            create_url, 'not json', content_type='text/plain',
+            headers={'Idempotency-Key': 'create-3', 'Authorization': f'Bearer {token}'},
+        )
+        self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+        record = await IdempotencyKey.objects.alatest('id')
+        self.assertEqual(record.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+        logger.info("test_async_endpoints_replay_the_first_response completed successfully in IdempotencyKeyTests")
+
+    def test_purge_deletes_expired_keys(self):
+        logger.info("Starting test_purge_deletes_expired_keys in IdempotencyKeyTests")
+        self.post(self.create_url, self.payload, 'old')
+        self.post(self.create_url, self.payload, 'new')
+        IdempotencyKey.objects.filter(pk=IdempotencyKey.objects.earliest('id').pk).update(
+            created_at=timezone.now() - timedelta(days=2),
+        )
+        out = StringIO()
+        call_command('purge_idempotency_keys', stdout=out)
+        self.assertIn('Deleted 1 expired idempotency keys.', out.getvalue())
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+        logger.info("test_purge_deletes_expired_keys completed successfully in IdempotencyKeyTests")
+
+class OccasionChangesTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # Create test users
+        cls.expender = User.objects.create_user(username='expender', password='password123')
+        cls.utilizer1 = User.objects.create_user(username='utilizer1', password='password123')
+        cls.utilizer2 = User.objects.create_user(username='utilizer2', password='password123')
+
+        # Create test occasions
+        cls.occasion = Occasion.objects.create(name='Test Occasion', date='2025-03-27', description='Test Description')
+        cls.other_occasion = Occasion.objects.create(name='Other Occasion', date='2025-03-28')
+
+        cls.changes_url = reverse('occasion-changes', kwargs={'pk': cls.occasion.id})
+        logger.info("Test data setup complete for OccasionChangesTests.")
+
+    def item(self, name, occasion=None, amount='30.00'):
+        return {
+            'occasion': (occasion or self.occasion).id,
+            'event_name': name,
+            'amount': amount,
+            'expender': self.expender.id,
+            'utilizers': [self.utilizer1.id, self.utilizer2.id],
+        }
+
+    def create(self, name, occasion=None):
+        response = self.client.post(reverse('expenditure-create'), self.item(name, occasion), format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data['id']
+
+    def changes(self, since, **params):
+        response = self.client.get(self.changes_url, {'since': since, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_changes_since_cursor(self):
+        logger.info("Starting test_changes_since_cursor in OccasionChangesTests")
+        response = self.client.get(self.changes_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['cursor'], 0)
+        before = self.create('Before')
+        cursor = self.client.get(self.changes_url).data['cursor']
+
+        dinner = self.create('Dinner')
+        self.create('Elsewhere', self.other_occasion)
+        bulk = self.client.post(reverse('expenditure-bulk-create'), {
+            'expenditures': [self.item('Taxi'), self.item('Lunch')],
+        }, format='json')
+        paid = self.client.post(reverse('clear-expense'), {
+            'expenditure_id': before, 'payer_id': self.utilizer1.id, 'amount': '30.00',
+        }, format='json')
+        self.assertEqual(paid.status_code, status.HTTP_200_OK)
+
+        # Only what changed after the cursor, in this occasion: a full page is five queries
+        with self.assertNumQueries(5):
+            data = self.changes(cursor)
+        self.assertEqual(
+            [row['id'] for row in data['expenditures']],
+            [before, dinner] + [row['id'] for row in bulk.data['created']],
+        )
+        self.assertTrue(data['expenditures'][0]['cleared'])
+        self.assertEqual(data['expenditures'][1]['utilizers'], ['utilizer1', 'utilizer2'])
+        self.assertEqual([row['id'] for row in data['payment_logs']], [paid.data['payment_log']['id']])
+        self.assertEqual(data['deleted'], {'expenditures': [], 'payment_logs': []})
+        self.assertFalse(data['has_more'])
+        self.assertEqual(data['occasion']['expenditure_count'], 4)
+        self.assertEqual(data['occasion']['cleared_amount'], '30.00')
+
+        # Nothing new: the same cursor comes back with no rows
+        latest = self.changes(data['cursor'])
+        self.assertEqual(latest['cursor'], data['cursor'])
+        self.assertEqual((latest['expenditures'], latest['payment_logs']), ([], []))
+        logger.info("test_changes_since_cursor completed successfully in OccasionChangesTests")
+
+    def test_edits_and_deletes_are_logged(self):
+        logger.info("Starting test_edits_and_deletes_are_logged in OccasionChangesTests")
+        kept, dropped = self.create('Dinner'), self.create('Taxi')
+        payment_log = PaymentLog.objects.create(
+            expenditure_id=dropped, payer=self.utilizer1, payee=self.expender, amount=Decimal('10.00'),
+        )
+        cursor = self.changes(0)['cursor']
+
+        # Writes outside the API, as from the admin, are logged by signals
+        expenditure = Expenditure.objects.get(id=kept)
+        expenditure.event_name = 'Late Dinner'
+        expenditure.save()
+        expenditure.utilizers.remove(self.utilizer2)
+        Expenditure.objects.get(id=dropped).delete()
+
+        data = self.changes(cursor)
+        self.assertEqual([(row['id'], row['event_name']) for row in data['expenditures']], [(kept, 'Late Dinner')])
+        self.assertEqual(data['expenditures'][0]['utilizers'], ['utilizer1'])
+        self.assertEqual(data['payment_logs'], [])
+        self.assertEqual(data['deleted'], {'expenditures': [dropped], 'payment_logs': [payment_log.id]})
+
+        # A row changed and then deleted within the page is only a tombstone
+        self.assertEqual(self.changes(0)['deleted']['expenditures'], [dropped])
+        logger.info("test_edits_and_deletes_are_logged completed successfully in OccasionChangesTests")
+
+    def test_pages_of_changes(self):
+        logger.info("Starting test_pages_of_changes in OccasionChangesTests")
+        ids = [self.create(f'Expense {index}') for index in range(5)]
+        first = self.changes(0, page_size=3)
+        self.assertTrue(first['has_more'])
+        second = self.changes(first['cursor'], page_size=3)
+        self.assertFalse(second['has_more'])
+        self.assertEqual([row['id'] for row in first['expenditures'] + second['expenditures']], ids)
+        self.assertEqual(ChangeLogEntry.objects.filter(occasion_id=self.occasion.id).count(), 5)
+        logger.info("test_pages_of_changes completed successfully in OccasionChangesTests")
+
+    def test_changes_rejects_bad_requests(self):
+        logger.info("Starting test_changes_rejects_bad_requests in OccasionChangesTests")
+        self.assertEqual(self.client.get(self.changes_url, {'since': -1}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.changes_url, {'since': 'abc'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            self.client.get(self.changes_url, {'since': 0, 'page_size': 5000}).status_code, status.HTTP_400_BAD_REQUEST,
+        )
+        response = self.client.get(reverse('occasion-changes', kwargs={'pk': 9999}), {'since': 0})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        logger.info("test_changes_rejects_bad_requests completed successfully in OccasionChangesTests")
+
+    @override_settings(EXPENSES_CHANGES_SETTLE_SECONDS=60)
+    def test_recent_changes_are_held_back(self):
+        logger.info("Starting test_recent_changes_are_held_back in OccasionChangesTests")
+        self.create('Dinner')
+        data = self.changes(0)
+        self.assertEqual((data['expenditures'], data['cursor']), ([], 0))
+        ChangeLogEntry.objects.update(created_at=timezone.now() - timedelta(minutes=2))
+        self.assertEqual(len(self.changes(0)['expenditures']), 1)
+        logger.info("test_recent_changes_are_held_back completed successfully in OccasionChangesTests")
+
+
 class ViewOccasionSummaryTests(APITestCase):
 
     @classmethod
@@ -229,11 +849,18 @@ class ViewOccasionSummaryTests(APITestCase):
         )
         cls.expenditure2.utilizers.set([cls.utilizer1, cls.utilizer2])
 
+        # The expenditures above bypass the API, so bring the stored totals up to date
+        rebuild_totals(Occasion.objects.filter(pk=cls.occasion.pk))
+
         # Define the URL for viewing the occasion summary
         cls.occasion_summary_url = reverse('occasion-summary', kwargs={'pk': cls.occasion.id})
 
         logger.info("Test data setup complete for ViewOccasionSummaryTests.")
 
+    def setUp(self):
+        # Cached summaries are keyed by occasion version, which repeats across rolled back tests
+        summary_cache.get_cache().clear()
+
     def test_view_occasion_summary_success(self):
         logger.info("Starting test_view_occasion_summary_success in ViewOccasionSummaryTests")
         response = self.client.get(self.occasion_summary_url)
@@ -253,4 +880,1794 @@ class ViewOccasionSummaryTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
         self.assertIn('error', response.data)  # Check for 'error' field
         self.assertEqual(response.data['error'], 'Occasion not found.')  # Custom error message
-        logger.info("test_view_occasion_summary_not_found completed successfully in ViewOccasionSummaryTests")
\ No newline at end of file
+        logger.info("test_view_occasion_summary_not_found completed successfully in ViewOccasionSummaryTests")
+
+class OccasionSettlementTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # Create test users
+        cls.alice = User.objects.create_user(username='alice', password='password123')
+        cls.bob = User.objects.create_user(username='bob', password='password123')
+        cls.carol = User.objects.create_user(username='carol', password='password123')
+
+        # Create a test occasion
+        cls.occasion = Occasion.objects.create(name='Trip', date='2025-03-27', description='Weekend trip.')
+
+        # Alice pays 100.00 shared by all three, Bob pays 30.00 shared by Bob and Carol
+        cls.hotel = Expenditure.objects.create(occasion=cls.occasion, event_name='Hotel', amount=100, expender=cls.alice)
+        cls.hotel.utilizers.set([cls.alice, cls.bob, cls.carol])
+        cls.taxi = Expenditure.objects.create(occasion=cls.occasion, event_name='Taxi', amount=30, expender=cls.bob)
+        cls.taxi.utilizers.set([cls.bob, cls.carol])
+
+        cls.settlement_url = reverse('occasion-settlement', kwargs={'pk': cls.occasion.id})
+
+        logger.info("Test data setup complete for OccasionSettlementTests.")
+
+    def test_balances_split_remainder_cents(self):
+        logger.info("Starting test_balances_split_remainder_cents in OccasionSettlementTests")
+        balances = occasion_balances(self.occasion.id)
+        # 100.00 / 3 -> 33.34 for the lowest user id, 33.33 for the others
+        self.assertEqual(balances, {
+            self.alice.id: 10000 - 3334,
+            self.bob.id: 3000 - 3333 - 1500,
+            self.carol.id: -3333 - 1500,
+        })
+        self.assertEqual(sum(balances.values()), 0)
+        logger.info("test_balances_split_remainder_cents completed successfully in OccasionSettlementTests")
+
+    def test_settlement_endpoint(self):
+        logger.info("Starting test_settlement_endpoint in OccasionSettlementTests")
+        response = self.client.get(self.settlement_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['balances']), 3)
+        transfers = {(t['from_username'], t['to_username']): t['amount'] for t in response.data['transfers']}
+        self.assertEqual(transfers, {
+            ('carol', 'alice'): Decimal('48.33'),
+            ('bob', 'alice'): Decimal('18.33'),
+        })
+        logger.info("test_settlement_endpoint completed successfully in OccasionSettlementTests")
+
+    def test_settlement_includes_payments(self):
+        logger.info("Starting test_settlement_includes_payments in OccasionSettlementTests")
+        PaymentLog.objects.create(expenditure=self.hotel, payer=self.carol, payee=self.alice, amount=Decimal('48.33'))
+        response = self.client.get(self.settlement_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(t['from_username'], t['to_username'], t['amount']) for t in response.data['transfers']],
+            [('bob', 'alice', Decimal('18.33'))],
+        )
+        logger.info("test_settlement_includes_payments completed successfully in OccasionSettlementTests")
+
+    def test_simplify_debts_pairs_exact_matches(self):
+        logger.info("Starting test_simplify_debts_pairs_exact_matches in OccasionSettlementTests")
+        transfers = simplify_debts({1: 500, 2: 300, 3: -300, 4: -200, 5: -300})
+        self.assertEqual(len(transfers), 3)
+        self.assertIn((3, 2, 300), transfers)
+        self.assertEqual(sum(cents for _, _, cents in transfers), 800)
+        logger.info("test_simplify_debts_pairs_exact_matches completed successfully in OccasionSettlementTests")
+
+    def test_settlement_not_found(self):
+        logger.info("Starting test_settlement_not_found in OccasionSettlementTests")
+        response = self.client.get(reverse('occasion-settlement', kwargs={'pk': 999}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response.data['error'], 'Occasion not found.')
+        logger.info("test_settlement_not_found completed successfully in OccasionSettlementTests")
+
+
+class JobQueueTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # Create test users
+        cls.admin = User.objects.create_user(username='admin', password='password123', is_staff=True)
+        cls.alice = User.objects.create_user(username='alice', password='password123')
+        cls.bob = User.objects.create_user(username='bob', password='password123')
+
+        # Create a test occasion
+        cls.occasion = Occasion.objects.create(name='Trip', date='2025-03-27', description='Weekend trip.')
+        cls.hotel = Expenditure.objects.create(occasion=cls.occasion, event_name='Hotel', amount=90, expender=cls.alice)
+        cls.hotel.utilizers.set([cls.alice, cls.bob])
+
+        cls.settlement_job_url = reverse('occasion-settlement-job', kwargs={'pk': cls.occasion.id})
+        logger.info("Test data setup complete for JobQueueTests.")
+
+    def test_settlement_job_is_shared_while_pending(self):
+        logger.info("Starting test_settlement_job_is_shared_while_pending in JobQueueTests")
+        first = self.client.post(self.settlement_job_url)
+        second = self.client.post(self.settlement_job_url)
+        self.assertEqual((first.status_code, second.status_code), (status.HTTP_202_ACCEPTED, status.HTTP_202_ACCEPTED))
+        self.assertEqual(first.data['id'], second.data['id'])
+        self.assertEqual(first['Location'], reverse('job-detail', kwargs={'pk': first.data['id']}))
+        self.assertEqual(first.data['status'], Job.PENDING)
+
+        self.assertEqual(jobs.work(burst=True), 1)
+        job = self.client.get(first['Location'])
+        self.assertEqual(job.data['status'], Job.SUCCEEDED)
+        # The result is what the synchronous endpoint returns
+        settlement = self.client.get(reverse('occasion-settlement', kwargs={'pk': self.occasion.id}))
+        self.assertEqual(json.loads(job.content)['result'], json.loads(settlement.content))
+
+        # Once the job has been claimed, asking again queues a new one
+        self.assertNotEqual(self.client.post(self.settlement_job_url).data['id'], first.data['id'])
+        response = self.client.post(reverse('occasion-settlement-job', kwargs={'pk': 9999}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        logger.info("test_settlement_job_is_shared_while_pending completed successfully in JobQueueTests")
+
+    @override_settings(JOBS_MAX_ATTEMPTS=2, JOBS_RETRY_BASE_SECONDS=30)
+    def test_failed_jobs_retry_with_backoff(self):
+        logger.info("Starting test_failed_jobs_retry_with_backoff in JobQueueTests")
+        def flaky():
+            raise RuntimeError("Recomputation failed")
+
+        with mock.patch.dict(jobs.TASKS, {'flaky': flaky}), self.assertLogs('expenses.jobs', 'ERROR'):
+            job, _ = jobs.enqueue('flaky')
+            self.assertEqual(jobs.work(burst=True), 1)
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), (Job.PENDING, 1))
+            self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=25))
+            # Not due yet, until the same job is asked for again
+            self.assertEqual(jobs.work(burst=True), 0)
+            self.assertEqual(jobs.enqueue('flaky'), (job, False))
+
+            self.assertEqual(jobs.work(burst=True), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        response = self.client.get(reverse('job-detail', kwargs={'pk': job.id}))
+        self.assertEqual(response.data['error'], 'RuntimeError: Recomputation failed')
+        self.assertEqual(jobs.retry_delay(3), timedelta(seconds=120))
+        with self.assertRaises(ValueError):
+            jobs.enqueue('no_such_task')
+        logger.info("test_failed_jobs_retry_with_backoff completed successfully in JobQueueTests")
+
+    def test_claiming(self):
+        logger.info("Starting test_claiming in JobQueueTests")
+        first, _ = jobs.enqueue('occasion_settlement', {'occasion_id': self.occasion.id})
+        second, _ = jobs.enqueue('rebuild_occasion_totals', {'occasion_ids': [self.occasion.id]})
+        jobs.enqueue('rebuild_occasion_totals', delay=60)
+        # Oldest due job first, each to one worker
+        self.assertEqual(jobs.claim('worker-1').id, first.id)
+        with mock.patch.object(connection.features, 'has_select_for_update_skip_locked', True):
+            claimed = jobs.claim('worker-2')
+        self.assertEqual((claimed.id, claimed.status, claimed.locked_by), (second.id, Job.RUNNING, 'worker-2'))
+        self.assertIsNone(jobs.claim('worker-3'))
+
+        # A job whose worker died is put back once its lock times out
+        Job.objects.filter(pk=first.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        with override_settings(JOBS_RETRY_BASE_SECONDS=0):
+            self.assertEqual(jobs.requeue_stale(), 1)
+        self.assertEqual(jobs.claim('worker-3').id, first.id)
+        logger.info("test_claiming completed successfully in JobQueueTests")
+
+    def test_rebuild_totals_in_the_background(self):
+        logger.info("Starting test_rebuild_totals_in_the_background in JobQueueTests")
+        Occasion.objects.filter(pk=self.occasion.pk).update(total_amount=0, expenditure_count=0)
+        url = reverse('occasion-totals-rebuild', kwargs={'pk': self.occasion.id})
+        self.client.force_authenticate(self.alice)
+        self.assertEqual(self.client.post(url).status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.client.post(url).status_code, status.HTTP_202_ACCEPTED)
+
+        out = StringIO()
+        call_command('rebuild_occasion_totals', '--enqueue', stdout=out)
+        self.assertIn('Queued: job', out.getvalue())
+        call_command('run_jobs', '--burst', stdout=out)
+        self.assertIn('Ran 2 jobs.', out.getvalue())
+        self.assertEqual(find_drift(), [])
+        self.assertEqual(Job.objects.filter(status=Job.SUCCEEDED).count(), 2)
+        logger.info("test_rebuild_totals_in_the_background completed successfully in JobQueueTests")
+
+
+class SpendRollupTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # Create test users
+        cls.alice = User.objects.create_user(username='alice', password='password123')
+        cls.bob = User.objects.create_user(username='bob', password='password123')
+
+        # Create a test occasion
+        cls.occasion = Occasion.objects.create(name='Trip', date='2025-03-01', description='Spring trip.')
+        cls.analytics_url = reverse('spend-analytics')
+        logger.info("Test data setup complete for SpendRollupTests.")
+
+    def item(self, amount, expender):
+        return {
+            'occasion': self.occasion.id,
+            'event_name': f'Expense {amount}',
+            'amount': amount,
+            'expender': expender.id,
+            'utilizers': [self.alice.id, self.bob.id],
+        }
+
+    def rollups(self):
+        return {
+            (row.user_id, row.amount, row.count, row.cleared_amount)
+            for row in SpendRollup.objects.filter(occasion=self.occasion)
+        }
+
+    def test_rollups_follow_creates_and_clears(self):
+        logger.info("Starting test_rollups_follow_creates_and_clears in SpendRollupTests")
+        dinner = self.client.post(reverse('expenditure-create'), self.item('40.00', self.alice), format='json').data['id']
+        self.client.post(reverse('expenditure-bulk-create'), {
+            'expenditures': [self.item('10.00', self.alice), self.item('5.50', self.bob)],
+        }, format='json')
+        self.assertEqual(self.rollups(), {
+            (self.alice.id, Decimal('50.00'), 2, Decimal('0.00')),
+            (self.bob.id, Decimal('5.50'), 1, Decimal('0.00')),
+        })
+
+        response = self.client.post(reverse('clear-expense'), {
+            'expenditure_id': dinner, 'payer_id': self.bob.id, 'amount': '20.00',
+        }, format='json')
+        self.assertTrue(response.data['payment_log'])
+        self.assertEqual(self.rollups(), {
+            (self.alice.id, Decimal('50.00'), 2, Decimal('40.00')),
+            (self.bob.id, Decimal('5.50'), 1, Decimal('0.00')),
+        })
+        self.assertEqual(rollups.find_drift(Occasion.objects.all()), [])
+        logger.info("test_rollups_follow_creates_and_clears completed successfully in SpendRollupTests")
+
+    def test_analytics_rebuckets_by_week_and_month(self):
+        logger.info("Starting test_analytics_rebuckets_by_week_and_month in SpendRollupTests")
+        days = {'2025-03-03': '10.00', '2025-03-05': '20.00', '2025-03-12': '30.00', '2025-04-01': '40.00'}
+        for day, amount in days.items():
+            expenditure = Expenditure.objects.create(
+                occasion=self.occasion, event_name=day, amount=Decimal(amount), expender=self.alice,
+            )
+            Expenditure.objects.filter(pk=expenditure.pk).update(created_at=f'{day}T12:00:00Z')
+        Expenditure.objects.create(occasion=self.occasion, event_name='Bob', amount=Decimal('7.00'), expender=self.bob)
+        rollups.rebuild_rollups(Occasion.objects.all())
+
+        def series(**params):
+            response = self.client.get(self.analytics_url, {'occasion': self.occasion.id, 'user': self.alice.id, **params})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return [(row['period'], row['amount'], row['count']) for row in response.data['series']]
+
+        self.assertEqual(series(bucket='week'), [
+            ('2025-03-03', '30.00', 2), ('2025-03-10', '30.00', 1), ('2025-03-31', '40.00', 1),
+        ])
+        self.assertEqual(series(bucket='month'), [('2025-03-01', '60.00', 3), ('2025-04-01', '40.00', 1)])
+        self.assertEqual(series(start='2025-03-04', end='2025-03-31'), [('2025-03-05', '20.00', 1), ('2025-03-12', '30.00', 1)])
+
+        # Every user of the occasion, one query however many expenditures lie behind it
+        with self.assertNumQueries(1):
+            response = self.client.get(self.analytics_url, {'occasion': self.occasion.id, 'bucket': 'month'})
+        self.assertEqual([row['username'] for row in response.data['series']], ['alice', 'alice', 'bob'])
+        logger.info("test_analytics_rebuckets_by_week_and_month completed successfully in SpendRollupTests")
+
+    def test_analytics_rejects_bad_filters(self):
+        logger.info("Starting test_analytics_rejects_bad_filters in SpendRollupTests")
+        for params in ({}, {'occasion': self.occasion.id, 'bucket': 'year'},
+                       {'user': self.alice.id, 'start': '2025-03-02', 'end': '2025-03-01'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(self.analytics_url, params).status_code, status.HTTP_400_BAD_REQUEST)
+        logger.info("test_analytics_rejects_bad_filters completed successfully in SpendRollupTests")
+
+    def test_rebuild_command(self):
+        logger.info("Starting test_rebuild_command in SpendRollupTests")
+        self.client.post(reverse('expenditure-create'), self.item('40.00', self.alice), format='json')
+        SpendRollup.objects.update(amount=Decimal('1.00'))
+        with self.assertRaises(CommandError):
+            call_command('rebuild_spend_rollups', '--verify', stdout=StringIO())
+
+        out = StringIO()
+        call_command('rebuild_spend_rollups', stdout=out)
+        self.assertIn('Wrote 1 spend rollups.', out.getvalue())
+        call_command('rebuild_spend_rollups', '--verify', stdout=out)
+        call_command('rebuild_spend_rollups', str(self.occasion.id), '--enqueue', stdout=out)
+        self.assertEqual(Job.objects.get().task, 'rebuild_spend_rollups')
+        logger.info("test_rebuild_command completed successfully in SpendRollupTests")
+
+
+class ArchiveTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # Create test users
+        cls.alice = User.objects.create_user(username='alice', password='password123')
+        cls.bob = User.objects.create_user(username='bob', password='password123')
+        cls.carol = User.objects.create_user(username='carol', password='password123')
+
+        # Create a test occasion
+        cls.occasion = Occasion.objects.create(name='Trip', date='2025-03-01', description='Spring trip.')
+        cls.archive_url = reverse('occasion-archive', kwargs={'pk': cls.occasion.id})
+        logger.info("Test data setup complete for ArchiveTests.")
+
+    def spend(self, amount, expender, payments=(), days_ago=0):
+        """
+        Create an expenditure split between everyone, make ``(payer, amount)`` payments and backdate it all.
+        """
+        expenditure_id = self.client.post(reverse('expenditure-create'), {
+            'occasion': self.occasion.id,
+            'event_name': f'Expense {amount}',
+            'amount': amount,
+            'expender': expender.id,
+            'utilizers': [self.alice.id, self.bob.id, self.carol.id],
+        }, format='json').data['id']
+        for payer, paid in payments:
+            response = self.client.post(reverse('clear-expense'), {
+                'expenditure_id': expenditure_id, 'payer_id': payer.id, 'amount': paid,
+            }, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        when = timezone.now() - timedelta(days=days_ago)
+        Expenditure.objects.filter(pk=expenditure_id).update(created_at=when)
+        PaymentLog.objects.filter(expenditure_id=expenditure_id).update(timestamp=when)
+        return expenditure_id
+
+    def history(self):
+        self.client.force_authenticate(self.bob)
+        ledger = self.client.get(reverse('my-ledger')).data
+        self.client.force_authenticate(None)
+        settlement = self.client.get(reverse('occasion-settlement', kwargs={'pk': self.occasion.id})).data
+        summary = self.client.get(reverse('occasion-summary', kwargs={'pk': self.occasion.id})).data
+        totals = {field: summary[field] for field in ('total_amount', 'expenditure_count', 'cleared_amount', 'uncleared_amount')}
+        return ledger, settlement, totals
+
+    def test_archiving_keeps_balances_and_totals(self):
+        logger.info("Starting test_archiving_keeps_balances_and_totals in ArchiveTests")
+        # Bob pays his and Carol's shares, so Carol owes Bob after Alice is paid off
+        old = self.spend('30.00', self.alice, [(self.bob, '20.00')], days_ago=400)
+        self.spend('12.00', self.carol, [(self.alice, '4.00'), (self.bob, '4.00')], days_ago=400)
+        recent = self.spend('9.00', self.bob, [(self.alice, '6.00')], days_ago=1)
+        open_ = self.spend('6.00', self.alice, [(self.carol, '2.00')], days_ago=400)
+        # The stored totals and rollups as if the rows had been written on the backdated days
+        rebuild_totals()
+        rollups.rebuild_rollups(Occasion.objects.all())
+        before = self.history()
+
+        self.assertEqual(list(archive.archive(timezone.now() - timedelta(days=365))), [(2, 3)])
+        self.assertEqual(set(ArchivedExpenditure.objects.values_list('id', flat=True)), {old, old + 1})
+        self.assertEqual(set(Expenditure.objects.values_list('id', flat=True)), {recent, open_})
+        self.assertFalse(Expenditure.utilizers.through.objects.filter(expenditure_id=old).exists())
+        self.assertFalse(ExpenditureShare.objects.filter(expenditure_id=old).exists())
+        self.assertFalse(ChangeLogEntry.objects.filter(object_id=old, deleted=True).exists())
+
+        self.assertEqual(self.history(), before)
+        self.assertEqual(find_drift(), [])
+        self.assertEqual(rollups.find_drift(Occasion.objects.all()), [])
+        # Nothing left to archive before the cutoff
+        self.assertEqual(list(archive.archive(timezone.now() - timedelta(days=365))), [])
+        logger.info("test_archiving_keeps_balances_and_totals completed successfully in ArchiveTests")
+
+    def test_archived_expenditures_stay_readable(self):
+        logger.info("Starting test_archived_expenditures_stay_readable in ArchiveTests")
+        old = self.spend('30.00', self.alice, [(self.bob, '10.00'), (self.carol, '10.00')], days_ago=400)
+        list(archive.archive(timezone.now() - timedelta(days=365)))
+
+        response = self.client.get(self.archive_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        [row] = response.data['results']
+        self.assertEqual((row['id'], row['amount'], row['expender']), (old, '30.00', self.alice.id))
+        self.assertEqual(row['utilizers'], [
+            {'user': self.alice.id, 'share': Decimal('10.00')},
+            {'user': self.bob.id, 'share': Decimal('10.00')},
+            {'user': self.carol.id, 'share': Decimal('10.00')},
+        ])
+        self.assertEqual(sorted(payment['payer'] for payment in row['payments']), [self.bob.id, self.carol.id])
+        self.assertEqual(self.client.get(reverse('occasion-archive', kwargs={'pk': 999})).status_code, status.HTTP_404_NOT_FOUND)
+
+        # Paying towards an archived expenditure is refused as already cleared, not as unknown
+        response = self.client.post(reverse('clear-expense'), {
+            'expenditure_id': old, 'payer_id': self.bob.id, 'amount': '1.00',
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('This expense has already been cleared.', str(response.data))
+        logger.info("test_archived_expenditures_stay_readable completed successfully in ArchiveTests")
+
+    def test_change_feed_reports_archived_rows_as_archived(self):
+        logger.info("Starting test_change_feed_reports_archived_rows_as_archived in ArchiveTests")
+        changes_url = reverse('occasion-changes', kwargs={'pk': self.occasion.id})
+        cursor = self.client.get(changes_url).data['cursor']
+        old = self.spend('30.00', self.alice, [(self.bob, '10.00'), (self.carol, '10.00')], days_ago=400)
+        recent = self.spend('9.00', self.bob, days_ago=1)
+        payment_logs = sorted(PaymentLog.objects.filter(expenditure_id=old).values_list('id', flat=True))
+        list(archive.archive(timezone.now() - timedelta(days=365)))
+
+        response = self.client.get(changes_url, {'since': cursor})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['id'] for row in response.data['expenditures']], [recent])
+        self.assertEqual(response.data['deleted'], {'expenditures': [], 'payment_logs': []})
+        self.assertEqual(response.data['archived'], {'expenditures': [old], 'payment_logs': payment_logs})
+        logger.info("test_change_feed_reports_archived_rows_as_archived completed successfully in ArchiveTests")
+
+    def test_archive_command_runs_in_resumable_batches(self):
+        logger.info("Starting test_archive_command_runs_in_resumable_batches in ArchiveTests")
+        for amount, owed in (('3.00', '2.00'), ('6.00', '4.00'), ('9.00', '6.00'), ('12.00', '8.00'), ('15.00', '10.00')):
+            self.spend(amount, self.alice, [(self.bob, owed)], days_ago=60)
+
+        out = StringIO()
+        call_command('archive_history', '--older-than-days', '30', '--dry-run', stdout=out)
+        self.assertIn('5 expenditures created before', out.getvalue())
+        call_command('archive_history', '--older-than-days', '30', '--batch-size', '2', '--max-batches', '1', stdout=out)
+        self.assertEqual(ArchivedExpenditure.objects.count(), 2)
+        self.assertIn('run the command again to continue', out.getvalue())
+
+        out = StringIO()
+        call_command('archive_history', '--older-than-days', '30', '--batch-size', '2', stdout=out)
+        self.assertEqual((ArchivedExpenditure.objects.count(), Expenditure.objects.count()), (5, 0))
+        self.assertEqual(ArchivedPaymentLog.objects.count(), 5)
+        self.assertIn('Batch 2: 1 expenditures, 1 payment logs.', out.getvalue())
+        self.assertIn('Reclaimed', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('archive_history', '--before', 'yesterday', stdout=out)
+        logger.info("test_archive_command_runs_in_resumable_batches completed successfully in ArchiveTests")
+
+
+class LedgerTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # Create test users
+        cls.alice = User.objects.create_user(username='alice', password='password123')
+        cls.bob = User.objects.create_user(username='bob', password='password123')
+        cls.carol = User.objects.create_user(username='carol', password='password123')
+
+        # Two occasions so the ledger has to break each counterparty down
+        cls.trip = Occasion.objects.create(name='Trip', date='2025-03-27', description='Weekend trip.')
+        cls.dinner = Occasion.objects.create(name='Dinner', date='2025-04-02', description='Team dinner.')
+
+        # Trip: Alice pays 100.00 shared by all three; Bob pays 30.00 shared by Alice and Bob
+        hotel = Expenditure.objects.create(occasion=cls.trip, event_name='Hotel', amount=100, expender=cls.alice)
+        hotel.utilizers.set([cls.alice, cls.bob, cls.carol])
+        taxi = Expenditure.objects.create(occasion=cls.trip, event_name='Taxi', amount=30, expender=cls.bob)
+        taxi.utilizers.set([cls.alice, cls.bob])
+        # Dinner: Alice pays 40.00 for Bob alone, and Bob has paid 25.00 of it back
+        meal = Expenditure.objects.create(occasion=cls.dinner, event_name='Meal', amount=40, expender=cls.alice)
+        meal.utilizers.set([cls.bob])
+        PaymentLog.objects.create(expenditure=meal, payer=cls.bob, payee=cls.alice, amount=25)
+
+        cls.ledger_url = reverse('my-ledger')
+
+        logger.info("Test data setup complete for LedgerTests.")
+
+    def test_ledger_requires_authentication(self):
+        logger.info("Starting test_ledger_requires_authentication in LedgerTests")
+        response = self.client.get(self.ledger_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        logger.info("test_ledger_requires_authentication completed successfully in LedgerTests")
+
+    def test_ledger_per_counterparty_and_occasion(self):
+        logger.info("Starting test_ledger_per_counterparty_and_occasion in LedgerTests")
+        token = self.client.post(reverse('token_obtain_pair'), {
+            'username': 'alice', 'password': 'password123',
+        }).data['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        response = self.client.get(self.ledger_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        counterparties = {row['username']: row for row in response.data['counterparties']}
+        bob = counterparties['bob']
+        # 33.33 of the hotel + 40.00 dinner, less 15.00 of the taxi and the 25.00 repaid
+        self.assertEqual(bob['owed_to_user'], Decimal('73.33'))
+        self.assertEqual(bob['owed_by_user'], Decimal('15.00'))
+        self.assertEqual(bob['paid_to_user'], Decimal('25.00'))
+        self.assertEqual(bob['net'], Decimal('33.33'))
+        self.assertEqual(
+            {row['occasion']: row['net'] for row in bob['occasions']},
+            {self.trip.id: Decimal('18.33'), self.dinner.id: Decimal('15.00')},
+        )
+        self.assertEqual(counterparties['carol']['net'], Decimal('33.33'))
+        self.assertEqual(response.data['totals']['net'], Decimal('66.66'))
+        logger.info("test_ledger_per_counterparty_and_occasion completed successfully in LedgerTests")
+
+    def test_ledger_from_the_debtor_side(self):
+        logger.info("Starting test_ledger_from_the_debtor_side in LedgerTests")
+        self.client.force_authenticate(self.carol)
+        response = self.client.get(self.ledger_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['counterparties']), 1)
+        alice = response.data['counterparties'][0]
+        self.assertEqual(alice['user'], self.alice.id)
+        self.assertEqual(alice['net'], Decimal('-33.33'))
+        logger.info("test_ledger_from_the_debtor_side completed successfully in LedgerTests")
+
+    def test_ledger_query_count(self):
+        logger.info("Starting test_ledger_query_count in LedgerTests")
+        self.client.force_authenticate(self.alice)
+        # One grouped query per ledger column, the archived balances and the counterparty usernames
+        with self.assertNumQueries(6):
+            response = self.client.get(self.ledger_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        logger.info("test_ledger_query_count completed successfully in LedgerTests")
+
+
+class OccasionTotalsTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # Create test users
+        cls.expender = User.objects.create_user(username='expender', password='password123')
+        cls.utilizer1 = User.objects.create_user(username='utilizer1', password='password123')
+
+        # Create a test occasion
+        cls.occasion = Occasion.objects.create(name='Test Occasion', date='2025-03-27', description='Test Description')
+
+        cls.create_url = reverse('expenditure-create')
+        cls.clear_expense_url = reverse('clear-expense')
+
+        logger.info("Test data setup complete for OccasionTotalsTests.")
+
+    def setUp(self):
+        # Cached summaries are keyed by occasion version, which repeats across rolled back tests
+        summary_cache.get_cache().clear()
+
+    def create_expenditure(self, amount):
+        response = self.client.post(self.create_url, {
+            'occasion': self.occasion.id,
+            'event_name': 'Dinner Party',
+            'amount': amount,
+            'expender': self.expender.id,
+            'utilizers': [self.utilizer1.id]
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data['id']
+
+    def test_totals_follow_create_and_clear(self):
+        logger.info("Starting test_totals_follow_create_and_clear in OccasionTotalsTests")
+        first = self.create_expenditure('100.25')
+        self.create_expenditure('50.00')
+        response = self.client.post(self.clear_expense_url, {
+            'expenditure_id': first,
+            'payer_id': self.utilizer1.id,
+            'amount': '100.25'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.occasion.refresh_from_db()
+        self.assertEqual(self.occasion.total_amount, Decimal('150.25'))
+        self.assertEqual(self.occasion.expenditure_count, 2)
+        self.assertEqual(self.occasion.cleared_amount, Decimal('100.25'))
+        self.assertEqual(self.occasion.uncleared_amount, Decimal('50.00'))
+        self.assertEqual(self.occasion.last_activity_at, PaymentLog.objects.get().timestamp)
+        self.assertEqual(find_drift(), [])
+        logger.info("test_totals_follow_create_and_clear completed successfully in OccasionTotalsTests")
+
+    def test_summary_reads_stored_totals(self):
+        logger.info("Starting test_summary_reads_stored_totals in OccasionTotalsTests")
+        self.create_expenditure('20.00')
+        with self.assertNumQueries(1):
+            total = Occasion.objects.get(pk=self.occasion.pk).total_amount
+        self.assertEqual(total, Decimal('20.00'))
+        response = self.client.get(reverse('occasion-summary', kwargs={'pk': self.occasion.id}))
+        self.assertEqual(response.data['total_amount'], Decimal('20.00'))
+        self.assertEqual(response.data['expenditure_count'], 1)
+        logger.info("test_summary_reads_stored_totals completed successfully in OccasionTotalsTests")
+
+    def test_rebuild_command_verifies_and_repairs(self):
+        logger.info("Starting test_rebuild_command_verifies_and_repairs in OccasionTotalsTests")
+        self.create_expenditure('20.00')
+        Occasion.objects.filter(pk=self.occasion.pk).update(total_amount=0)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_occasion_totals', '--verify', stdout=StringIO())
+        call_command('rebuild_occasion_totals', stdout=StringIO())
+        call_command('rebuild_occasion_totals', '--verify', stdout=StringIO())
+        self.occasion.refresh_from_db()
+        self.assertEqual(self.occasion.total_amount, Decimal('20.00'))
+        logger.info("test_rebuild_command_verifies_and_repairs completed successfully in OccasionTotalsTests")
+
+    def test_migration_backfills_totals(self):
+        logger.info("Starting test_migration_backfills_totals in OccasionTotalsTests")
+        first = self.create_expenditure('100.25')
+        self.create_expenditure('50.00')
+        self.client.post(self.clear_expense_url, {
+            'expenditure_id': first, 'payer_id': self.utilizer1.id, 'amount': '100.25',
+        }, format='json')
+        Occasion.objects.update(
+            total_amount=0, expenditure_count=0, cleared_amount=0, uncleared_amount=0, last_activity_at=None,
+        )
+        migration = import_module('expenses.migrations.0003_occasion_totals')
+        migration.fill_totals(django_apps, None)
+        self.assertEqual(find_drift(), [])
+        logger.info("test_migration_backfills_totals completed successfully in OccasionTotalsTests")
+
+
+class LedgerBudgetTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # The dataset `manage.py benchmark_ledger` times by default
+        cls.user_ids = seed_users(4)
+        for index in range(5):
+            seed_occasion(10000, cls.user_ids, seed=index)
+        logger.info("Test data setup complete for LedgerBudgetTests.")
+
+    def test_ledger_within_budget(self):
+        logger.info("Starting test_ledger_within_budget in LedgerBudgetTests")
+        from django.conf import settings
+        user_ledger_cents(self.user_ids[0])
+        seconds = []
+        for _ in range(3):
+            started = time.perf_counter()
+            user_ledger_cents(self.user_ids[0])
+            seconds.append(time.perf_counter() - started)
+        self.assertLessEqual(
+            min(seconds), settings.LEDGER_BUDGET_SECONDS,
+            f"The ledger took {min(seconds) * 1000:.1f}ms over 50,000 expenditures; see `manage.py benchmark_ledger`.",
+        )
+        logger.info("test_ledger_within_budget completed successfully in LedgerBudgetTests")
+
+
+class QueryBudgetTests(APITestCase):
+    """
+    Every endpoint declares the most queries it may run; the count must not grow with occasion size.
+    """
+    SIZES = (10, 1000, 10000)
+    BUDGETS = {
+        'occasion-summary': 3,
+        'occasion-settlement': 7,
+        'expenditure-list': 2,
+        'payment-log-list': 1,
+        'occasion-changes': 5,
+        'spend-analytics': 1,
+        'expenditure-create': 12,
+        'clear-expense': 11,
+        'my-ledger': 6,
+        'occasion-archive': 3,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user_ids = seed_users(20, prefix='budget-user')
+        cls.occasions = {size: seed_occasion(size, cls.user_ids, seed=size) for size in cls.SIZES}
+        logger.info("Test data setup complete for QueryBudgetTests.")
+
+    def setUp(self):
+        # Cached summaries are keyed by occasion version, which repeats across rolled back tests
+        summary_cache.get_cache().clear()
+
+    def prepare_request(self, name, occasion):
+        if name == 'expenditure-create':
+            return self.client.post, reverse(name), {
+                'occasion': occasion.id,
+                'event_name': 'Budget Check',
+                'amount': '10.00',
+                'expender': self.user_ids[0],
+                'utilizers': self.user_ids[1:3],
+            }
+        if name == 'clear-expense':
+            expenditure_id, payer_id, amount = payoffs(occasion.expenditures.all())[0]
+            return self.client.post, reverse(name), {
+                'expenditure_id': expenditure_id,
+                'payer_id': payer_id,
+                'amount': amount,
+            }
+        if name == 'expenditure-list':
+            return self.client.get, reverse('expenditure-create'), {'occasion': occasion.id}
+        if name == 'payment-log-list':
+            return self.client.get, reverse(name), {'occasion': occasion.id}
+        if name == 'spend-analytics':
+            return self.client.get, reverse(name), {'occasion': occasion.id, 'bucket': 'month'}
+        if name == 'occasion-changes':
+            return self.client.get, reverse(name, kwargs={'pk': occasion.id}), {'since': 0}
+        if name == 'my-ledger':
+            self.client.force_authenticate(User.objects.get(id=self.user_ids[0]))
+            return self.client.get, reverse(name), None
+        return self.client.get, reverse(name, kwargs={'pk': occasion.id}), None
+
+    def assertWithinQueryBudget(self, name, size):
+        method, url, data = self.prepare_request(name, self.occasions[size])
+        with CaptureQueriesContext(connection) as queries:
+            response = method(url, data, format='json')
+        self.assertLess(response.status_code, 400, response.data)
+        self.assertLessEqual(
+            len(queries), self.BUDGETS[name],
+            f"{name} ran {len(queries)} queries with {size} expenditures:\n"
+            + "\n".join(query['sql'] for query in queries.captured_queries),
+        )
+
+    def test_query_budgets(self):
+        logger.info("Starting test_query_budgets in QueryBudgetTests")
+        for name in self.BUDGETS:
+            for size in self.SIZES:
+                with self.subTest(endpoint=name, expenditures=size):
+                    self.assertWithinQueryBudget(name, size)
+        logger.info("test_query_budgets completed successfully in QueryBudgetTests")
+
+
+class KeysetPaginationTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user_ids = seed_users(10, prefix='page-user')
+        cls.occasion = seed_occasion(250, cls.user_ids)
+        cls.other_occasion = seed_occasion(20, cls.user_ids, seed=1)
+        # Give a block of rows the same timestamp so pages have to break ties on id
+        Expenditure.objects.filter(pk__in=cls.occasion.expenditures.values('pk')[:120]).update(
+            created_at='2025-03-27T12:00:00Z'
+        )
+        cls.list_url = reverse('expenditure-create')
+        logger.info("Test data setup complete for KeysetPaginationTests.")
+
+    def setUp(self):
+        # Cached summaries are keyed by occasion version, which repeats across rolled back tests
+        summary_cache.get_cache().clear()
+
+    def walk(self, url, params):
+        seen = []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend(row['id'] for row in response.data['results'])
+            if not response.data['next']:
+                return seen
+            response = self.client.get(response.data['next'])
+
+    def test_pages_cover_every_row_once_in_order(self):
+        logger.info("Starting test_pages_cover_every_row_once_in_order in KeysetPaginationTests")
+        seen = self.walk(self.list_url, {'occasion': self.occasion.id, 'page_size': 40})
+        expected = list(
+            self.occasion.expenditures.order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(seen, expected)
+        logger.info("test_pages_cover_every_row_once_in_order completed successfully in KeysetPaginationTests")
+
+    def test_deep_pages_use_constant_queries(self):
+        logger.info("Starting test_deep_pages_use_constant_queries in KeysetPaginationTests")
+        response = self.client.get(self.list_url, {'occasion': self.occasion.id, 'page_size': 20})
+        for _ in range(10):
+            with self.assertNumQueries(2):
+                response = self.client.get(response.data['next'])
+        logger.info("test_deep_pages_use_constant_queries completed successfully in KeysetPaginationTests")
+
+    def test_expenditure_filters(self):
+        logger.info("Starting test_expenditure_filters in KeysetPaginationTests")
+        utilizer = self.user_ids[3]
+        Expenditure.objects.filter(occasion=self.occasion, expender_id=self.user_ids[0]).update(cleared=True)
+        cases = [
+            ({'utilizer': utilizer}, Expenditure.objects.filter(utilizers=utilizer)),
+            ({'expender': self.user_ids[0]}, Expenditure.objects.filter(expender_id=self.user_ids[0])),
+            (
+                {'occasion': self.occasion.id, 'cleared': 'false'},
+                Expenditure.objects.filter(occasion=self.occasion, cleared=False),
+            ),
+        ]
+        for params, queryset in cases:
+            with self.subTest(params=params):
+                seen = self.walk(self.list_url, {**params, 'page_size': 100})
+                self.assertEqual(sorted(seen), sorted(queryset.values_list('id', flat=True)))
+        logger.info("test_expenditure_filters completed successfully in KeysetPaginationTests")
+
+    def test_payment_log_listing(self):
+        logger.info("Starting test_payment_log_listing in KeysetPaginationTests")
+        for expenditure in self.other_occasion.expenditures.all()[:5]:
+            PaymentLog.objects.create(
+                expenditure=expenditure, payer_id=self.user_ids[1], payee=expenditure.expender, amount=expenditure.amount,
+            )
+        seen = self.walk(reverse('payment-log-list'), {'occasion': self.other_occasion.id, 'page_size': 2})
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(self.walk(reverse('payment-log-list'), {'occasion': self.occasion.id}), [])
+        logger.info("test_payment_log_listing completed successfully in KeysetPaginationTests")
+
+    def test_summary_returns_first_page(self):
+        logger.info("Starting test_summary_returns_first_page in KeysetPaginationTests")
+        response = self.client.get(reverse('occasion-summary', kwargs={'pk': self.occasion.id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['expenditures']), KeysetPagination.page_size)
+        self.assertEqual(response.data['expenditure_count'], 250)
+        self.assertIsNotNone(response.data['expenditures_next'])
+        next_page = self.client.get(response.data['expenditures_next'])
+        self.assertEqual(next_page.data['id'], self.occasion.id)
+        self.assertNotEqual(next_page.data['expenditures'][0]['id'], response.data['expenditures'][0]['id'])
+        logger.info("test_summary_returns_first_page completed successfully in KeysetPaginationTests")
+
+    def test_invalid_filters_and_cursor(self):
+        logger.info("Starting test_invalid_filters_and_cursor in KeysetPaginationTests")
+        response = self.client.get(self.list_url, {'occasion': 'abc'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('occasion', response.data)
+        response = self.client.get(self.list_url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        logger.info("test_invalid_filters_and_cursor completed successfully in KeysetPaginationTests")
+
+
+class BulkExpenditureTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # Create test users
+        cls.expender = User.objects.create_user(username='expender', password='password123')
+        cls.utilizer1 = User.objects.create_user(username='utilizer1', password='password123')
+        cls.utilizer2 = User.objects.create_user(username='utilizer2', password='password123')
+
+        # Create a test occasion
+        cls.occasion = Occasion.objects.create(name='Test Occasion', date='2025-03-27', description='Test Description')
+
+        cls.bulk_url = reverse('expenditure-bulk-create')
+
+        logger.info("Test data setup complete for BulkExpenditureTests.")
+
+    def item(self, **overrides):
+        return {
+            'occasion': self.occasion.id,
+            'event_name': 'Dinner Party',
+            'amount': '10.50',
+            'expender': self.expender.id,
+            'utilizers': [self.utilizer1.id, self.utilizer2.id],
+            **overrides,
+        }
+
+    def test_bulk_create_reports_item_errors(self):
+        logger.info("Starting test_bulk_create_reports_item_errors in BulkExpenditureTests")
+        items = [
+            self.item(),
+            self.item(amount='-1'),
+            self.item(utilizers=[self.utilizer1.id, 999]),
+            self.item(occasion=999),
+            self.item(event_name='Taxi', amount='4.50', utilizers=[self.utilizer1.id, self.utilizer1.id]),
+        ]
+        response = self.client.post(self.bulk_url, {'expenditures': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([row['index'] for row in response.data['created']], [0, 4])
+        errors = {error['index']: error['errors'] for error in response.data['errors']}
+        self.assertEqual(sorted(errors), [1, 2, 3])
+        self.assertIn('amount', errors[1])
+        self.assertIn('utilizers', errors[2])
+        self.assertIn('occasion', errors[3])
+
+        taxi = Expenditure.objects.get(event_name='Taxi')
+        self.assertEqual(list(taxi.utilizers.all()), [self.utilizer1])
+        self.assertEqual(Expenditure.utilizers.through.objects.count(), 3)
+        self.occasion.refresh_from_db()
+        self.assertEqual(self.occasion.total_amount, Decimal('15.00'))
+        self.assertEqual(self.occasion.expenditure_count, 2)
+        self.assertEqual(find_drift(), [])
+        logger.info("test_bulk_create_reports_item_errors completed successfully in BulkExpenditureTests")
+
+    def test_bulk_create_batches_queries(self):
+        logger.info("Starting test_bulk_create_batches_queries in BulkExpenditureTests")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.bulk_url, {'expenditures': [self.item()] * 500}, format='json')
+        self.assertEqual(len(response.data['created']), 500)
+        # Lookups, inserts split only by the backend's parameter limit, and one totals update
+        self.assertLess(len(queries), 25)
+        logger.info("test_bulk_create_batches_queries completed successfully in BulkExpenditureTests")
+
+    def test_bulk_create_all_invalid(self):
+        logger.info("Starting test_bulk_create_all_invalid in BulkExpenditureTests")
+        response = self.client.post(self.bulk_url, {'expenditures': [self.item(utilizers=[])]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['errors'][0]['index'], 0)
+        self.assertEqual(Expenditure.objects.count(), 0)
+        response = self.client.post(self.bulk_url, {'expenditures': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        logger.info("test_bulk_create_all_invalid completed successfully in BulkExpenditureTests")
+
+
+class SummaryCacheTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # Create test users
+        cls.admin = User.objects.create_user(username='admin', password='password123', is_staff=True)
+        cls.expender = User.objects.create_user(username='expender', password='password123')
+        cls.utilizer1 = User.objects.create_user(username='utilizer1', password='password123')
+
+        # Create a test occasion
+        cls.occasion = Occasion.objects.create(name='Test Occasion', date='2025-03-27', description='Test Description')
+
+        cls.summary_url = reverse('occasion-summary', kwargs={'pk': cls.occasion.id})
+        cls.stats_url = reverse('summary-cache-stats')
+
+        logger.info("Test data setup complete for SummaryCacheTests.")
+
+    def setUp(self):
+        summary_cache.get_cache().clear()
+
+    def create_expenditure(self, amount='10.00'):
+        response = self.client.post(reverse('expenditure-create'), {
+            'occasion': self.occasion.id,
+            'event_name': 'Dinner Party',
+            'amount': amount,
+            'expender': self.expender.id,
+            'utilizers': [self.utilizer1.id]
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_repeat_polls_hit_cache_and_not_modified(self):
+        logger.info("Starting test_repeat_polls_hit_cache_and_not_modified in SummaryCacheTests")
+        self.create_expenditure()
+        first = self.client.get(self.summary_url)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertFalse(first['ETag'].startswith('W/'))
+        self.assertIn('Last-Modified', first)
+
+        # A cache hit only reads the occasion row
+        with self.assertNumQueries(1):
+            second = self.client.get(self.summary_url)
+        self.assertEqual(second.data, first.data)
+
+        with self.assertNumQueries(1):
+            not_modified = self.client.get(self.summary_url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(not_modified.content, b'')
+
+        not_modified = self.client.get(self.summary_url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        logger.info("test_repeat_polls_hit_cache_and_not_modified completed successfully in SummaryCacheTests")
+
+    def test_writes_invalidate_summary(self):
+        logger.info("Starting test_writes_invalidate_summary in SummaryCacheTests")
+        self.create_expenditure()
+        first = self.client.get(self.summary_url)
+        self.create_expenditure('5.00')
+
+        response = self.client.get(self.summary_url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+        self.assertEqual(response.data['total_amount'], Decimal('15.00'))
+        self.assertEqual(len(response.data['expenditures']), 2)
+        logger.info("test_writes_invalidate_summary completed successfully in SummaryCacheTests")
+
+    def test_each_format_is_its_own_representation(self):
+        logger.info("Starting test_each_format_is_its_own_representation in SummaryCacheTests")
+        self.create_expenditure()
+        as_json = self.client.get(self.summary_url)
+        as_html = self.client.get(self.summary_url, HTTP_ACCEPT='text/html')
+        self.assertEqual(as_html['Content-Type'], 'text/html; charset=utf-8')
+        self.assertNotEqual(as_html['ETag'], as_json['ETag'])
+        self.assertIn('Accept', as_json['Vary'])
+
+        # The JSON ETag doesn't validate the HTML copy
+        response = self.client.get(self.summary_url, HTTP_ACCEPT='text/html', HTTP_IF_NONE_MATCH=as_json['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get(self.summary_url, HTTP_IF_NONE_MATCH=as_json['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertIn('Accept', response['Vary'])
+        logger.info("test_each_format_is_its_own_representation completed successfully in SummaryCacheTests")
+
+    def test_stats_are_admin_only(self):
+        logger.info("Starting test_stats_are_admin_only in SummaryCacheTests")
+        self.create_expenditure()
+        self.client.get(self.summary_url)
+        self.client.get(self.summary_url)
+        self.assertIn(self.client.get(self.stats_url).status_code, (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN))
+
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(self.stats_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['hits'], 1)
+        self.assertEqual(response.data['misses'], 1)
+        self.assertEqual(response.data['invalidations'], 1)
+        self.assertEqual(response.data['hit_rate'], 0.5)
+        logger.info("test_stats_are_admin_only completed successfully in SummaryCacheTests")
+
+
+class SummaryCoalescingTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.occasion = Occasion.objects.create(name='Test Occasion', date='2025-03-27', description='Test Description')
+        cls.summary_url = reverse('occasion-summary', kwargs={'pk': cls.occasion.id})
+        logger.info("Test data setup complete for SummaryCoalescingTests.")
+
+    def setUp(self):
+        summary_cache.get_cache().clear()
+        self.request = RequestFactory().get(self.summary_url)
+
+    def test_concurrent_calls_share_one_run(self):
+        logger.info("Starting test_concurrent_calls_share_one_run in SummaryCoalescingTests")
+        flights, calls, release = SingleFlight(), [], threading.Event()
+        results = []
+
+        def compute():
+            calls.append(1)
+            release.wait(5)
+            return b'{"total": 1}'
+
+        threads = [threading.Thread(target=lambda: results.append(flights.do('summary', compute))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.2)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual({result for result, _ in results}, {b'{"total": 1}'})
+        self.assertEqual(sorted(shared for _, shared in results), [False, True, True, True, True])
+        self.assertEqual(len(flights), 0)
+        logger.info("test_concurrent_calls_share_one_run completed successfully in SummaryCoalescingTests")
+
+    async def test_concurrent_coroutines_share_one_run(self):
+        logger.info("Starting test_concurrent_coroutines_share_one_run in SummaryCoalescingTests")
+        flights, calls = SingleFlight(), []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return 'summary'
+
+        results = await asyncio.gather(*[flights.ado('summary', compute) for _ in range(5)])
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(results), [('summary', False)] + [('summary', True)] * 4)
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        results = await asyncio.gather(*[flights.ado('summary', fail) for _ in range(3)], return_exceptions=True)
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+        logger.info("test_concurrent_coroutines_share_one_run completed successfully in SummaryCoalescingTests")
+
+    async def test_cancelled_caller_leaves_the_run_to_the_others(self):
+        logger.info("Starting test_cancelled_caller_leaves_the_run_to_the_others in SummaryCoalescingTests")
+        flights, release = SingleFlight(), asyncio.Event()
+
+        async def compute():
+            await release.wait()
+            return 'summary'
+
+        leader = asyncio.create_task(flights.ado('summary', compute))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flights.ado('summary', compute))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await leader
+        release.set()
+        self.assertEqual(await waiter, ('summary', True))
+        self.assertEqual(len(flights), 0)
+        logger.info("test_cancelled_caller_leaves_the_run_to_the_others completed successfully in SummaryCoalescingTests")
+
+    def test_computed_summary_is_shared_as_rendered_json(self):
+        logger.info("Starting test_computed_summary_is_shared_as_rendered_json in SummaryCoalescingTests")
+        summary_cache.reset_stats()
+        data, content = summary_cache.get_or_build(self.occasion, self.request, lambda: {'total_amount': '1.50'})
+        self.assertEqual(json.loads(content), {'total_amount': '1.50'})
+        self.assertEqual(summary_cache.get_or_build(self.occasion, self.request, None), (data, None))
+
+        first = self.client.get(self.summary_url)
+        self.assertEqual(first.data, data)
+        self.assertEqual(first['Content-Type'], 'application/json')
+        counts = summary_cache.stats()
+        self.assertEqual((counts['computed'], counts['coalesced'], counts['hits']), (1, 0, 2))
+        logger.info("test_computed_summary_is_shared_as_rendered_json completed successfully in SummaryCoalescingTests")
+
+    @override_settings(EXPENSES_SUMMARY_LOCK=True, EXPENSES_SUMMARY_LOCK_TIMEOUT=5)
+    def test_waits_for_lock_held_by_another_process(self):
+        logger.info("Starting test_waits_for_lock_held_by_another_process in SummaryCoalescingTests")
+        cache = summary_cache.get_cache()
+        key = summary_cache.summary_key(self.occasion, self.request)
+        cache.add(f'{key}:lock', 1)
+
+        def other_process_finishes():
+            cache.set(key, {'total_amount': '2.00'})
+            cache.delete(f'{key}:lock')
+
+        timer = threading.Timer(0.05, other_process_finishes)
+        timer.start()
+        self.addCleanup(timer.cancel)
+        summary_cache.reset_stats()
+        data, content = summary_cache.get_or_build(self.occasion, self.request, mock.Mock(side_effect=AssertionError))
+        self.assertEqual((data, content), ({'total_amount': '2.00'}, b'{"total_amount":"2.00"}'))
+        self.assertEqual(summary_cache.stats()['coalesced'], 1)
+        logger.info("test_waits_for_lock_held_by_another_process completed successfully in SummaryCoalescingTests")
+
+    @override_settings(EXPENSES_SUMMARY_LOCK=True, EXPENSES_SUMMARY_LOCK_TIMEOUT=0.05)
+    def test_stale_lock_does_not_block_forever(self):
+        logger.info("Starting test_stale_lock_does_not_block_forever in SummaryCoalescingTests")
+        key = summary_cache.summary_key(self.occasion, self.request)
+        summary_cache.get_cache().add(f'{key}:lock', 1, timeout=60)
+        data, _ = summary_cache.get_or_build(self.occasion, self.request, lambda: {'total_amount': '3.00'})
+        self.assertEqual(data, {'total_amount': '3.00'})
+        logger.info("test_stale_lock_does_not_block_forever completed successfully in SummaryCoalescingTests")
+
+
+class ExportTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user_ids = seed_users(10, prefix='export-user')
+        cls.occasion = seed_occasion(300, cls.user_ids)
+        cls.other_occasion = seed_occasion(30, cls.user_ids, seed=1)
+        for expenditure in cls.occasion.expenditures.all()[:3]:
+            PaymentLog.objects.create(
+                expenditure=expenditure, payer_id=cls.user_ids[1], payee=expenditure.expender, amount=expenditure.amount,
+            )
+        logger.info("Test data setup complete for ExportTests.")
+
+    def export(self, name, export_format, **params):
+        response = self.client.get(reverse(name, kwargs={'export_format': export_format}), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_expenditure_csv(self):
+        logger.info("Starting test_expenditure_csv in ExportTests")
+        content = self.export('expenditure-export', 'csv', occasion=self.occasion.id)
+        rows = list(csv.DictReader(StringIO(content)))
+        self.assertEqual(len(rows), 300)
+        expenditure = Expenditure.objects.get(pk=rows[0]['id'])
+        self.assertEqual(rows[0]['amount'], str(expenditure.amount))
+        self.assertEqual(
+            rows[0]['utilizer_ids'],
+            ';'.join(str(pk) for pk in expenditure.utilizers.order_by('id').values_list('id', flat=True)),
+        )
+        logger.info("test_expenditure_csv completed successfully in ExportTests")
+
+    def test_ndjson_and_date_range(self):
+        logger.info("Starting test_ndjson_and_date_range in ExportTests")
+        Expenditure.objects.filter(occasion=self.other_occasion).update(created_at='2024-06-01T10:00:00Z')
+        lines = self.export('expenditure-export', 'ndjson', start='2024-06-01', end='2024-06-01').splitlines()
+        records = [json.loads(line) for line in lines]
+        self.assertEqual(len(records), 30)
+        self.assertEqual({record['occasion_id'] for record in records}, {self.other_occasion.id})
+        self.assertEqual(len(records[0]['utilizers']), 4)
+        self.assertEqual(self.export('expenditure-export', 'ndjson', end='2024-05-31'), '')
+
+        lines = self.export('payment-log-export', 'ndjson', occasion=self.occasion.id).splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(json.loads(lines[0])['payer'].startswith('export-user-'))
+        logger.info("test_ndjson_and_date_range completed successfully in ExportTests")
+
+    def test_invalid_range(self):
+        logger.info("Starting test_invalid_range in ExportTests")
+        url = reverse('payment-log-export', kwargs={'export_format': 'csv'})
+        response = self.client.get(url, {'start': '2025-02-01', 'end': '2025-01-01'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        logger.info("test_invalid_range completed successfully in ExportTests")
+
+    def test_peak_memory_stays_flat(self):
+        logger.info("Starting test_peak_memory_stays_flat in ExportTests")
+        large = seed_occasion(6000, self.user_ids, seed=2)
+
+        def peak_while_exporting(occasion):
+            records = exports.expenditure_records(exports.expenditure_queryset(occasion=occasion.id), chunk_size=100)
+            tracemalloc.start()
+            try:
+                size = sum(len(line) for line in exports.stream_csv(records, exports.EXPENDITURE_COLUMNS))
+                return size, tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        small_size, small_peak = peak_while_exporting(self.occasion)
+        large_size, large_peak = peak_while_exporting(large)
+        # 20x the rows, but the same 100-row chunk in memory at a time
+        self.assertGreater(large_size, 15 * small_size)
+        self.assertLess(large_peak, 1.5 * small_peak)
+        logger.info("test_peak_memory_stays_flat completed successfully in ExportTests")
+
+
+class BenchmarkToolingTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user_ids, cls.occasions = seed_dataset(12, 2, 60, cleared=0.5, seed=7, prefix='tooling-user')
+        logger.info("Test data setup complete for BenchmarkToolingTests.")
+
+    def setUp(self):
+        summary_cache.get_cache().clear()
+
+    def test_seed_data_command(self):
+        logger.info("Starting test_seed_data_command in BenchmarkToolingTests")
+        out = StringIO()
+        call_command(
+            'seed_data', users=8, occasions=2, expenditures=40, cleared=0.25, seed=7, prefix='seeded', stdout=out,
+        )
+        self.assertIn("Seeded 8 users, 2 occasions, 80 expenditures and 20 payment logs", out.getvalue())
+        self.assertEqual(find_drift(), [])
+        with self.assertRaises(CommandError):
+            call_command('seed_data', users=1, occasions=1, expenditures=1, prefix='seeded', stdout=StringIO())
+        logger.info("test_seed_data_command completed successfully in BenchmarkToolingTests")
+
+    def test_seed_is_reproducible(self):
+        logger.info("Starting test_seed_is_reproducible in BenchmarkToolingTests")
+        _, occasions = seed_dataset(12, 2, 60, cleared=0.5, seed=7, prefix='tooling-again')
+        for original, repeat in zip(self.occasions, occasions):
+            original.refresh_from_db()
+            repeat.refresh_from_db()
+            self.assertEqual(original.total_amount, repeat.total_amount)
+            self.assertEqual(original.cleared_amount, repeat.cleared_amount)
+            self.assertEqual(original.expenditure_count, 60)
+        logger.info("test_seed_is_reproducible completed successfully in BenchmarkToolingTests")
+
+    def test_every_route_has_a_scenario(self):
+        logger.info("Starting test_every_route_has_a_scenario in BenchmarkToolingTests")
+        user = User.objects.get(id=self.user_ids[0])
+        scenarios = endpoint_benchmark.build_scenarios(user, self.user_ids, self.occasions[0], self.occasions[-1])
+        self.assertEqual(endpoint_benchmark.missing_routes(scenarios), [])
+        logger.info("test_every_route_has_a_scenario completed successfully in BenchmarkToolingTests")
+
+    def test_run_suite_reports_latency_queries_and_allocations(self):
+        logger.info("Starting test_run_suite_reports_latency_queries_and_allocations in BenchmarkToolingTests")
+        results = endpoint_benchmark.run_suite(
+            self.user_ids, self.occasions, iterations=3, warmup=1, alloc_iterations=1,
+            only=['occasion-summary', 'clear-expense', 'expenditure-export', 'my-ledger'],
+        )
+        self.assertEqual(set(results), {'occasion-summary', 'clear-expense', 'expenditure-export', 'my-ledger'})
+        for result in results.values():
+            self.assertLessEqual(result['p50_ms'], result['p95_ms'])
+            self.assertLessEqual(result['p95_ms'], result['p99_ms'])
+            self.assertGreater(result['queries_per_request'], 0)
+            self.assertGreater(result['alloc_peak_kib'], 0)
+        json.dumps(results)
+        logger.info("test_run_suite_reports_latency_queries_and_allocations completed successfully in BenchmarkToolingTests")
+
+
+class InstrumentationTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser', password='password123')
+        cls.occasion = Occasion.objects.create(name='Trip', date='2025-03-27', description='Weekend trip.')
+        expenditure = Expenditure.objects.create(occasion=cls.occasion, event_name='Hotel', amount=90, expender=cls.user)
+        expenditure.utilizers.set([cls.user])
+        cls.ledger_url = reverse('my-ledger')
+        logger.info("Test data setup complete for InstrumentationTests.")
+
+    def setUp(self):
+        # Start every test with the token's user uncached, so query counts include its lookup
+        user_cache.clear()
+
+    def authenticate(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+    def server_timing(self, response):
+        timings = {}
+        for entry in response['Server-Timing'].split(', '):
+            name, duration = entry.split(';')[:2]
+            timings[name] = float(duration.removeprefix('dur='))
+        return timings
+
+    @override_settings(REQUEST_INSTRUMENTATION=True, SLOW_QUERY_THRESHOLD_MS=None, SERVER_TIMING_HEADER=True)
+    def test_server_timing_and_request_log(self):
+        logger.info("Starting test_server_timing_and_request_log in InstrumentationTests")
+        self.authenticate()
+        with self.assertLogs('expense_tracker.instrumentation', level='INFO') as logs:
+            response = self.client.get(reverse('expenditure-create'), {'occasion': self.occasion.id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        timings = self.server_timing(response)
+        self.assertEqual(set(timings), {'db', 'auth', 'serializer', 'total'})
+        self.assertIn('desc="3 queries"', response['Server-Timing'])
+        self.assertGreater(timings['auth'], 0)
+        self.assertGreater(timings['serializer'], 0)
+        self.assertLessEqual(timings['db'], timings['total'])
+
+        record = logs.records[0]
+        self.assertEqual((record.method, record.path, record.status), ('GET', reverse('expenditure-create'), 200))
+        self.assertEqual(record.queries, 3)
+        self.assertEqual(record.serializer_ms, timings['serializer'])
+        logger.info("test_server_timing_and_request_log completed successfully in InstrumentationTests")
+
+    @override_settings(REQUEST_INSTRUMENTATION=True, SLOW_QUERY_THRESHOLD_MS=0)
+    def test_slow_query_log_has_origin(self):
+        logger.info("Starting test_slow_query_log_has_origin in InstrumentationTests")
+        self.authenticate()
+        with self.assertLogs('expense_tracker.instrumentation'), \
+                self.assertLogs('expense_tracker.slow_queries', level='WARNING') as logs:
+            response = self.client.get(self.ledger_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # The user lookup for the token, one grouped query per ledger column and the archived balances
+        origins = [record.origin for record in logs.records]
+        self.assertEqual(len(origins), 6)
+        self.assertTrue(any(origin and origin.startswith('expenses/ledger.py:') for origin in origins), origins)
+        logger.info("test_slow_query_log_has_origin completed successfully in InstrumentationTests")
+
+    @override_settings(REQUEST_INSTRUMENTATION=True, SLOW_QUERY_THRESHOLD_MS=None, SERVER_TIMING_HEADER=True)
+    async def test_async_requests_count_their_queries(self):
+        logger.info("Starting test_async_requests_count_their_queries in InstrumentationTests")
+        # The ORM runs on sync_to_async's thread, not on the event loop's
+        with self.assertLogs('expense_tracker.instrumentation', level='INFO') as logs:
+            response = await self.async_client.get(reverse('async-occasion-summary', kwargs={'pk': self.occasion.id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertGreater(logs.records[0].queries, 0)
+        self.assertGreater(logs.records[0].sql_ms, 0)
+        self.assertNotIn('desc="0 queries"', response['Server-Timing'])
+        logger.info("test_async_requests_count_their_queries completed successfully in InstrumentationTests")
+
+    @override_settings(REQUEST_INSTRUMENTATION=True, SLOW_QUERY_THRESHOLD_MS=None)
+    def test_server_timing_is_for_staff_only(self):
+        logger.info("Starting test_server_timing_is_for_staff_only in InstrumentationTests")
+        self.authenticate()
+        with self.assertLogs('expense_tracker.instrumentation', level='INFO'):
+            response = self.client.get(self.ledger_url)
+        self.assertNotIn('Server-Timing', response)
+
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        user_cache.clear()
+        with self.assertLogs('expense_tracker.instrumentation', level='INFO'):
+            response = self.client.get(self.ledger_url)
+        self.assertIn('Server-Timing', response)
+        logger.info("test_server_timing_is_for_staff_only completed successfully in InstrumentationTests")
+
+    @override_settings(REQUEST_INSTRUMENTATION=True, SLOW_QUERY_THRESHOLD_MS=None, SERVER_TIMING_HEADER=True)
+    def test_streamed_exports_are_left_out(self):
+        logger.info("Starting test_streamed_exports_are_left_out in InstrumentationTests")
+        self.authenticate()
+        url = reverse('expenditure-export', kwargs={'export_format': 'csv'})
+        with self.assertNoLogs('expense_tracker.instrumentation', level='INFO'):
+            response = self.client.get(url, {'occasion': self.occasion.id})
+            b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('Server-Timing', response)
+        logger.info("test_streamed_exports_are_left_out completed successfully in InstrumentationTests")
+
+    @override_settings(REQUEST_INSTRUMENTATION=False)
+    def test_disabled_instrumentation_is_not_installed(self):
+        logger.info("Starting test_disabled_instrumentation_is_not_installed in InstrumentationTests")
+        with self.assertRaises(MiddlewareNotUsed):
+            InstrumentationMiddleware(lambda request: None)
+        response = self.client.get(reverse('occasion-create'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('Server-Timing', response)
+        logger.info("test_disabled_instrumentation_is_not_installed completed successfully in InstrumentationTests")
+
+
+class DatabaseProfileTests(APITestCase):
+
+    def test_production_profile_options(self):
+        logger.info("Starting test_production_profile_options in DatabaseProfileTests")
+        profile = sqlite_profile('production')
+        self.assertEqual(profile['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+        self.assertIn('PRAGMA journal_mode=WAL', profile['OPTIONS']['init_command'])
+        self.assertGreater(profile['CONN_MAX_AGE'], 0)
+        self.assertEqual(sqlite_profile('development'), {})
+        with self.assertRaises(ValueError):
+            sqlite_profile('staging')
+        logger.info("test_production_profile_options completed successfully in DatabaseProfileTests")
+
+    def test_concurrent_mixed_load_has_no_lock_errors(self):
+        logger.info("Starting test_concurrent_mixed_load_has_no_lock_errors in DatabaseProfileTests")
+        result = run_stress('production', workers=3, seconds=2, write_ratio=0.5, users=10, expenditures=300)
+        self.assertEqual(result['lock_errors'], 0)
+        self.assertEqual(result['errors'], 0)
+        self.assertGreater(result['reads'], 0)
+        self.assertGreater(result['writes'], 0)
+        logger.info("test_concurrent_mixed_load_has_no_lock_errors completed successfully in DatabaseProfileTests")
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Uses a TransactionTestCase so rows are committed and visible to the replica connection,
+    which the test runner points at the primary's database.
+    """
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        summary_cache.get_cache().clear()
+        self.user = User.objects.create_user(username='testuser', password='password123')
+        self.occasion = Occasion.objects.create(name='Trip', date='2025-03-27', description='Weekend trip.')
+        patcher = mock.patch('expense_tracker.routers.replica_configured', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        logger.info("Test data setup complete for ReplicaRoutingTests.")
+
+    def queries_by_alias(self, method, *args, **kwargs):
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            response = method(*args, **kwargs)
+        self.assertLess(response.status_code, 400)
+        return len(primary), len(replica)
+
+    def test_router_decisions(self):
+        logger.info("Starting test_router_decisions in ReplicaRoutingTests")
+        router = routers.PrimaryReplicaRouter()
+        self.assertEqual(router.db_for_read(Occasion), 'default')
+        with routers.replica_reads():
+            self.assertEqual(router.db_for_read(Occasion), 'replica')
+            self.assertEqual(router.db_for_write(Occasion), 'default')
+        self.assertFalse(router.allow_migrate('replica', 'expenses'))
+        self.assertTrue(router.allow_migrate('default', 'expenses'))
+        logger.info("test_router_decisions completed successfully in ReplicaRoutingTests")
+
+    def test_reads_go_to_replica(self):
+        logger.info("Starting test_reads_go_to_replica in ReplicaRoutingTests")
+        summary_url = reverse('occasion-summary', kwargs={'pk': self.occasion.id})
+        primary, replica = self.queries_by_alias(self.client.get, summary_url)
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+        export_url = reverse('expenditure-export', kwargs={'export_format': 'csv'})
+        with CaptureQueriesContext(connections['default']) as primary:
+            response = self.client.get(export_url)
+            b''.join(response.streaming_content)
+        self.assertEqual(len(primary), 0)
+        logger.info("test_reads_go_to_replica completed successfully in ReplicaRoutingTests")
+
+    def test_reads_stick_to_primary_after_a_write(self):
+        logger.info("Starting test_reads_stick_to_primary_after_a_write in ReplicaRoutingTests")
+        self.client.force_authenticate(self.user)
+        primary, replica = self.queries_by_alias(
+            self.client.post, reverse('occasion-create'), {'name': 'Dinner', 'date': '2025-04-01'}, format='json',
+        )
+        self.assertEqual(replica, 0)
+
+        primary, replica = self.queries_by_alias(self.client.get, reverse('occasion-create'))
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+        # Once the sticky window has passed, reads go back to the replica
+        routers.get_cache().clear()
+        primary, replica = self.queries_by_alias(self.client.get, reverse('occasion-create'))
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+        logger.info("test_reads_stick_to_primary_after_a_write completed successfully in ReplicaRoutingTests")
+
+    @override_settings(
+        CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'sticky'},
+        },
+        REPLICA_STICKY_CACHE='shared',
+    )
+    def test_sticky_marker_goes_to_the_configured_cache(self):
+        logger.info("Starting test_sticky_marker_goes_to_the_configured_cache in ReplicaRoutingTests")
+        self.client.force_authenticate(self.user)
+        self.client.post(reverse('occasion-create'), {'name': 'Dinner', 'date': '2025-04-01'}, format='json')
+        request = RequestFactory().post('/')
+        self.assertTrue(caches['shared'].get(routers.sticky_key(request)))
+        self.assertIsNone(caches['default'].get(routers.sticky_key(request)))
+        logger.info("test_sticky_marker_goes_to_the_configured_cache completed successfully in ReplicaRoutingTests")
+
+    def test_anonymous_clients_behind_trusted_proxies(self):
+        logger.info("Starting test_anonymous_clients_behind_trusted_proxies in ReplicaRoutingTests")
+        factory = RequestFactory(REMOTE_ADDR='10.0.0.1')
+        first = factory.get('/', HTTP_X_FORWARDED_FOR='203.0.113.7')
+        second = factory.get('/', HTTP_X_FORWARDED_FOR='198.51.100.2')
+        # Without a trusted proxy the forwarded address could be made up, so it is ignored
+        self.assertEqual(routers.sticky_key(first), routers.sticky_key(second))
+        with override_settings(TRUSTED_PROXY_COUNT=1):
+            self.assertNotEqual(routers.sticky_key(first), routers.sticky_key(second))
+            self.assertEqual(routers.client_address(factory.get('/', HTTP_X_FORWARDED_FOR='1.2.3.4, 203.0.113.7')), '203.0.113.7')
+            self.assertEqual(routers.client_address(factory.get('/')), '10.0.0.1')
+        logger.info("test_anonymous_clients_behind_trusted_proxies completed successfully in ReplicaRoutingTests")
+
+
+class AsyncViewTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # Create test users
+        cls.user = User.objects.create_user(username='testuser', password='password123')
+        cls.user2 = User.objects.create_user(username='testuser2', password='password123')
+
+        # Create a test occasion with one expenditure
+        cls.occasion = Occasion.objects.create(name='Trip', date='2025-03-27', description='Weekend trip.')
+        cls.expenditure = Expenditure.objects.create(
+            occasion=cls.occasion, event_name='Hotel', amount=Decimal('90.00'), expender=cls.user,
+        )
+        cls.expenditure.utilizers.set([cls.user, cls.user2])
+        rebuild_totals()
+
+        cls.summary_url = reverse('async-occasion-summary', kwargs={'pk': cls.occasion.id})
+        cls.create_url = reverse('async-expenditure-create')
+        cls.clear_url = reverse('async-clear-expense')
+
+        logger.info("Test data setup complete for AsyncViewTests.")
+
+    def setUp(self):
+        summary_cache.get_cache().clear()
+
+    async def test_async_summary_matches_sync_summary(self):
+        logger.info("Starting test_async_summary_matches_sync_summary in AsyncViewTests")
+        response = await self.async_client.get(self.summary_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        sync_response = await self.async_client.get(reverse('occasion-summary', kwargs={'pk': self.occasion.id}))
+        self.assertEqual(json.loads(response.content), json.loads(sync_response.content))
+
+        not_modified = await self.async_client.get(self.summary_url, headers={'If-None-Match': response['ETag']})
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertIn('Accept', response['Vary'])
+        self.assertIn('Accept', not_modified['Vary'])
+
+        missing = await self.async_client.get(reverse('async-occasion-summary', kwargs={'pk': 999}))
+        self.assertEqual(missing.status_code, status.HTTP_404_NOT_FOUND)
+        logger.info("test_async_summary_matches_sync_summary completed successfully in AsyncViewTests")
+
+    async def test_async_create_expenditure(self):
+        logger.info("Starting test_async_create_expenditure in AsyncViewTests")
+        token = RefreshToken.for_user(self.user).access_token
+        response = await self.async_client.post(self.create_url, {
+            'occasion': self.occasion.id,
+            'event_name': 'Dinner',
+            'amount': '30.00',
+            'expender': self.user2.id,
+            'utilizers': [self.user.id, self.user2.id],
+        }, content_type='application/json', headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        data = json.loads(response.content)
+        self.assertEqual(data['amount'], '30.00')
+        self.assertEqual(sorted(data['utilizers']), [self.user.id, self.user2.id])
+
+        occasion = await Occasion.objects.aget(pk=self.occasion.id)
+        self.assertEqual(occasion.total_amount, Decimal('120.00'))
+        self.assertEqual(occasion.expenditure_count, 2)
+        logger.info("test_async_create_expenditure completed successfully in AsyncViewTests")
+
+    async def test_async_create_rejects_unknown_users(self):
+        logger.info("Starting test_async_create_rejects_unknown_users in AsyncViewTests")
+        response = await self.async_client.post(self.create_url, {
+            'occasion': self.occasion.id,
+            'event_name': 'Dinner',
+            'amount': '30.00',
+            'expender': 999,
+            'utilizers': [self.user.id, 998],
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(json.loads(response.content), {
+            'expender': ['Invalid pk "999" - object does not exist.'],
+            'utilizers': ['Invalid pk "998" - object does not exist.'],
+        })
+        logger.info("test_async_create_rejects_unknown_users completed successfully in AsyncViewTests")
+
+    async def test_async_clear_expense(self):
+        logger.info("Starting test_async_clear_expense in AsyncViewTests")
+        # user2's half of the 90.00; the expender's own half is already paid
+        payload = {'expenditure_id': self.expenditure.id, 'payer_id': self.user2.id, 'amount': '45.00'}
+        response = await self.async_client.post(self.clear_url, payload, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = json.loads(response.content)
+        self.assertEqual(data['message'], 'Expense cleared successfully.')
+        self.assertEqual(data['payment_log']['payer'], 'testuser2')
+
+        response = await self.async_client.post(self.clear_url, payload, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(json.loads(response.content), {'non_field_errors': ['This expense has already been cleared.']})
+        logger.info("test_async_clear_expense completed successfully in AsyncViewTests")
+
+    async def test_async_views_reject_invalid_tokens(self):
+        logger.info("Starting test_async_views_reject_invalid_tokens in AsyncViewTests")
+        response = await self.async_client.get(self.summary_url, headers={'Authorization': 'Bearer not-a-token'})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIn('WWW-Authenticate', response)
+        self.assertEqual(json.loads(response.content)['code'], 'token_not_valid')
+        logger.info("test_async_views_reject_invalid_tokens completed successfully in AsyncViewTests")
+
+
+class AsgiBenchmarkTests(TransactionTestCase):
+    """
+    The benchmark serves requests from other threads, so its rows must be committed.
+    """
+
+    def setUp(self):
+        summary_cache.get_cache().clear()
+        self.user_ids, self.occasions = seed_dataset(5, 2, 20, utilizers_per_expenditure=2, seed=3)
+        logger.info("Test data setup complete for AsgiBenchmarkTests.")
+
+    def test_comparison_covers_every_mode(self):
+        logger.info("Starting test_comparison_covers_every_mode in AsgiBenchmarkTests")
+        user = User.objects.get(pk=self.user_ids[0])
+        results = run_comparison(
+            user, self.user_ids, self.occasions[0], self.occasions[1], concurrency=(1,), requests=3, workloads=('summary',),
+        )
+        self.assertEqual([result['mode'] for result in results], list(MODES))
+        for result in results:
+            self.assertEqual((result['requests'], result['errors']), (3, 0), result)
+            self.assertGreaterEqual(result['peak_threads'], 1)
+        logger.info("test_comparison_covers_every_mode completed successfully in AsgiBenchmarkTests")
+
+
+class CoalescingBenchmarkTests(TransactionTestCase):
+    """
+    The burst runs its requests on other threads, so its rows must be committed.
+    """
+
+    def setUp(self):
+        summary_cache.get_cache().clear()
+        _, self.occasions = seed_dataset(5, 1, 20, utilizers_per_expenditure=2, seed=4)
+        logger.info("Test data setup complete for CoalescingBenchmarkTests.")
+
+    def test_burst_counts_every_request(self):
+        logger.info("Starting test_burst_counts_every_request in CoalescingBenchmarkTests")
+        results = coalescing_benchmark.run_comparison(self.occasions[0], clients=4, rounds=2)
+        self.assertEqual([result['mode'] for result in results], list(coalescing_benchmark.MODES))
+        for result in results:
+            self.assertEqual((result['requests'], result['errors']), (8, 0), result)
+            self.assertEqual(result['computed'] + result['coalesced'] + result['hits'], 8, result)
+            self.assertGreaterEqual(result['computed'], 2)
+        self.assertEqual(results[0]['coalesced'], 0)
+        logger.info("test_burst_counts_every_request completed successfully in CoalescingBenchmarkTests")
+
+
+class RendererTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # Create test users
+        cls.alice = User.objects.create_user(username='alice', password='password123')
+        cls.bob = User.objects.create_user(username='bob', password='password123')
+
+        # Create a test occasion
+        cls.occasion = Occasion.objects.create(name='Trip', date='2025-03-01', description='Spring trip.')
+        cls.summary_url = reverse('occasion-summary', kwargs={'pk': cls.occasion.id})
+        logger.info("Test data setup complete for RendererTests.")
+
+    def setUp(self):
+        summary_cache.get_cache().clear()
+        self.client.post(reverse('expenditure-create'), {
+            'occasion': self.occasion.id, 'event_name': 'Dinner', 'amount': '40.10',
+            'expender': self.alice.id, 'utilizers': [self.alice.id, self.bob.id],
+        }, format='json')
+
+    def test_fast_json_matches_the_stdlib_encoding(self):
+        logger.info("Starting test_fast_json_matches_the_stdlib_encoding in RendererTests")
+        data = {
+            'amount': Decimal('12345678901234567.10'),
+            'tiny': Decimal('0.01'),
+            'at': timezone.now(),
+            'on_the_second': timezone.now().replace(microsecond=0),
+            'day': timezone.localdate(),
+            'name': 'Café',
+            'nested': [{1: None, 'ok': True}],
+        }
+        content = renderers.FastJSONRenderer().render(data)
+        with mock.patch.object(renderers, 'orjson', None):
+            self.assertEqual(renderers.FastJSONRenderer().render(data), content)
+        decoded = json.loads(content)
+        # Decimals are exact strings, not floats
+        self.assertEqual((decoded['amount'], decoded['tiny']), ('12345678901234567.10', '0.01'))
+        self.assertTrue(decoded['at'].endswith('Z'))
+        logger.info("test_fast_json_matches_the_stdlib_encoding completed successfully in RendererTests")
+
+    def test_api_speaks_fast_json(self):
+        logger.info("Starting test_api_speaks_fast_json in RendererTests")
+        response = self.client.get(self.summary_url)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(json.loads(response.content)['expenditures'][0]['amount'], '40.10')
+        # Settlement amounts are Decimals in the response data, encoded exactly
+        response = self.client.get(reverse('occasion-settlement', kwargs={'pk': self.occasion.id}))
+        self.assertEqual(json.loads(response.content)['transfers'][0]['amount'], '20.05')
+        # ... and so is the cleared payment, which DRF's encoder used to send as a float
+        response = self.client.post(reverse('clear-expense'), {
+            'expenditure_id': Expenditure.objects.get().id, 'payer_id': self.bob.id, 'amount': '20.05',
+        }, format='json')
+        self.assertEqual(json.loads(response.content)['payment_log']['amount'], '20.05')
+
+        response = self.client.post(reverse('expenditure-create'), b'{"occasion": ', content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('JSON parse error', response.data['detail'])
+        logger.info("test_api_speaks_fast_json completed successfully in RendererTests")
+
+    @skipUnless(renderers.msgpack, "msgpack is not installed")
+    def test_msgpack_is_negotiated_through_accept(self):
+        logger.info("Starting test_msgpack_is_negotiated_through_accept in RendererTests")
+        response = self.client.get(self.summary_url, HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(
+            renderers.msgpack.unpackb(response.content, raw=False),
+            json.loads(self.client.get(self.summary_url).content),
+        )
+        # Cached and validated apart from the JSON copy of the same URL
+        self.assertNotEqual(response['ETag'], self.client.get(self.summary_url)['ETag'])
+        self.assertIn('Accept', response['Vary'])
+
+        body = renderers.msgpack.packb({
+            'occasion': self.occasion.id, 'event_name': 'Taxi', 'amount': '9.99',
+            'expender': self.bob.id, 'utilizers': [self.alice.id, self.bob.id],
+        })
+        response = self.client.post(reverse('expenditure-create'), body, content_type='application/msgpack')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        logger.info("test_msgpack_is_negotiated_through_accept completed successfully in RendererTests")
+
+    @skipIf(renderers.msgpack, "msgpack is installed")
+    def test_msgpack_is_not_offered_without_the_package(self):
+        logger.info("Starting test_msgpack_is_not_offered_without_the_package in RendererTests")
+        response = self.client.get(self.summary_url, HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response.status_code, status.HTTP_406_NOT_ACCEPTABLE)
+        logger.info("test_msgpack_is_not_offered_without_the_package completed successfully in RendererTests")
+
+    def test_benchmark_compares_codecs(self):
+        logger.info("Starting test_benchmark_compares_codecs in RendererTests")
+        results = renderer_benchmark.run_comparison(renderer_benchmark.summary_payload(self.occasion), repeat=2)
+        sizes = {result['codec']: result['bytes'] for result in results}
+        self.assertEqual(sizes['drf-json'], sizes['fast-json'])
+        self.assertEqual('msgpack' in sizes, renderers.msgpack is not None)
+        logger.info("test_benchmark_compares_codecs completed successfully in RendererTests")
+
+
+class OpenAPISchemaTests(APITestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.schema_dir = directory.name
+        # drf_yasg warns about views it cannot introspect; keep that out of the test output
+        with override_settings(OPENAPI_SCHEMA_DIR=self.schema_dir), self.assertLogs('drf_yasg', level='WARNING'):
+            call_command('generate_openapi_schema', stdout=StringIO())
+        swagger.load_schema.cache_clear()
+        self.schema_url = reverse('openapi-schema', kwargs={'format': 'json'})
+        logger.info("Test data setup complete for OpenAPISchemaTests.")
+
+    def test_command_writes_every_format(self):
+        logger.info("Starting test_command_writes_every_format in OpenAPISchemaTests")
+        with open(f'{self.schema_dir}/openapi.json') as handle:
+            schema = json.load(handle)
+        self.assertIn('/expenses/occasions/{id}/summary/', schema['paths'])
+        with open(f'{self.schema_dir}/openapi.yaml') as handle:
+            self.assertTrue(handle.read().startswith("swagger: '2.0'"))
+        logger.info("test_command_writes_every_format completed successfully in OpenAPISchemaTests")
+
+    def test_built_schema_is_served_with_cache_headers(self):
+        logger.info("Starting test_built_schema_is_served_with_cache_headers in OpenAPISchemaTests")
+        with override_settings(OPENAPI_SCHEMA_DIR=self.schema_dir, OPENAPI_SCHEMA_LIVE=False), \
+                mock.patch('drf_yasg.generators.OpenAPISchemaGenerator.get_schema') as get_schema:
+            response = self.client.get(self.schema_url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            with open(f'{self.schema_dir}/openapi.json', 'rb') as handle:
+                self.assertEqual(response.content, handle.read())
+            self.assertEqual(response['Content-Type'], 'application/json')
+            self.assertIn('max-age=86400', response['Cache-Control'])
+            self.assertIn('public', response['Cache-Control'])
+
+            not_modified = self.client.get(self.schema_url, headers={'If-None-Match': response['ETag']})
+            self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertIn('max-age=86400', not_modified['Cache-Control'])
+            get_schema.assert_not_called()
+        logger.info("test_built_schema_is_served_with_cache_headers completed successfully in OpenAPISchemaTests")
+
+    def test_docs_pages_load_the_built_schema(self):
+        logger.info("Starting test_docs_pages_load_the_built_schema in OpenAPISchemaTests")
+        get_schema = mock.patch.object(swagger.OpenAPISchemaGenerator, 'get_schema')
+        with override_settings(OPENAPI_SCHEMA_DIR=self.schema_dir, OPENAPI_SCHEMA_LIVE=False), get_schema as built:
+            for name in ('schema-swagger-ui', 'schema-redoc'):
+                response = self.client.get(reverse(name))
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertIn(self.schema_url, response.content.decode())
+                self.assertIn('Expense Tracker API', response.content.decode())
+        built.assert_not_called()
+        logger.info("test_docs_pages_load_the_built_schema completed successfully in OpenAPISchemaTests")
+
+    def test_missing_schema_and_live_generation(self):
+        logger.info("Starting test_missing_schema_and_live_generation in OpenAPISchemaTests")
+        with tempfile.TemporaryDirectory() as empty:
+            with override_settings(OPENAPI_SCHEMA_DIR=empty, OPENAPI_SCHEMA_LIVE=False):
+                self.assertEqual(self.client.get(self.schema_url).status_code, status.HTTP_404_NOT_FOUND)
+            with override_settings(OPENAPI_SCHEMA_DIR=empty, OPENAPI_SCHEMA_LIVE=True), \
+                    self.assertLogs('drf_yasg', level='WARNING'):
+                response = self.client.get(self.schema_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('/expenses/occasions/{id}/summary/', json.loads(response.content)['paths'])
+        logger.info("test_missing_schema_and_live_generation completed successfully in OpenAPISchemaTests")
+
+
+class ColdStartTests(APITestCase):
+    """
+    Each test starts fresh interpreters, since the process running the tests has imported everything already.
+    """
+    API_WORKER_CHECK = """
+import json, sys
+import expense_tracker.wsgi
+from django.apps import apps
+from django.urls import get_resolver
+print(json.dumps({
+    'routes': [str(pattern.pattern) for pattern in get_resolver().url_patterns],
+    'admin_installed': apps.is_installed('django.contrib.admin'),
+    'drf_yasg_imported': 'drf_yasg' in sys.modules,
+}))
+"""
+
+    def test_api_profile_leaves_out_docs_and_admin(self):
+        logger.info("Starting test_api_profile_leaves_out_docs_and_admin in ColdStartTests")
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'expense_tracker.settings', 'DEPLOYMENT_PROFILE': 'api'}
+        result = subprocess.run(
+            [sys.executable, '-c', self.API_WORKER_CHECK], cwd=coldstart.BASE_DIR, env=env,
+            capture_output=True, text=True, check=True,
+        )
+        worker = json.loads(result.stdout)
+        self.assertEqual(worker['routes'], ['api/users/', 'api/expenses/'])
+        self.assertFalse(worker['admin_installed'])
+        self.assertFalse(worker['drf_yasg_imported'])
+        logger.info("test_api_profile_leaves_out_docs_and_admin completed successfully in ColdStartTests")
+
+    def test_cold_start_within_budget(self):
+        logger.info("Starting test_cold_start_within_budget in ColdStartTests")
+        from django.conf import settings
+        for entry in coldstart.ENTRY_POINTS:
+            with self.subTest(entry=entry):
+                seconds = coldstart.cold_start_seconds(entry, 'api')
+                self.assertLessEqual(
+                    seconds, settings.COLD_START_BUDGET_SECONDS,
+                    f"An API-only {entry} worker took {seconds:.2f}s to start; see `manage.py import_report`.",
+                )
+        logger.info("test_cold_start_within_budget completed successfully in ColdStartTests")
+
+    def test_import_report(self):
+        logger.info("Starting test_import_report in ColdStartTests")
+        report = coldstart.import_report('wsgi', 'api', top=5)
+        self.assertEqual(len(report['slowest_modules']), 5)
+        self.assertEqual(report['slowest_modules'][0][0], 'expense_tracker.wsgi')
+        self.assertIn('django', dict(report['packages']))
+        self.assertNotIn('drf_yasg', {name.split('.')[0] for name, _, _ in report['slowest_modules']})
+        logger.info("test_import_report completed successfully in ColdStartTests")
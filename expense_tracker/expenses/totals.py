@@ -0,0 +1,172 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Count, DecimalField, F, Max, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import rollups, summary_cache
+from .models import ArchivedExpenditure, ArchivedPaymentLog, Expenditure, Occasion, PaymentLog
+
+TOTAL_FIELDS = ('total_amount', 'expenditure_count', 'cleared_amount', 'uncleared_amount', 'last_activity_at')
+
+ZERO = Value(Decimal('0.00'), output_field=DecimalField(max_digits=14, decimal_places=2))
+
+
+def record_expenditure(expenditure):
+    """
+    Add a newly created expenditure to its occasion's running totals.
+
+    Must be called inside the transaction that created the expenditure.
+    """
+    record_expenditures([expenditure])
+
+
+def record_expenditures(expenditures):
+    """
+    Bulk version of ``record_expenditure``: one UPDATE per occasion touched, and the
+    spend rollups of ``expenses.rollups``.
+    """
+    per_occasion = defaultdict(lambda: {'total': 0, 'count': 0, 'cleared': 0, 'uncleared': 0, 'last': None})
+    for expenditure in expenditures:
+        if expenditure.occasion_id is None:
+            continue
+        totals = per_occasion[expenditure.occasion_id]
+        totals['total'] += expenditure.amount
+        totals['count'] += 1
+        totals['cleared' if expenditure.cleared else 'uncleared'] += expenditure.amount
+        totals['last'] = max(filter(None, (totals['last'], expenditure.created_at)))
+
+    for occasion_id, totals in per_occasion.items():
+        Occasion.objects.filter(pk=occasion_id).update(
+            total_amount=F('total_amount') + totals['total'],
+            expenditure_count=F('expenditure_count') + totals['count'],
+            cleared_amount=F('cleared_amount') + totals['cleared'],
+            uncleared_amount=F('uncleared_amount') + totals['uncleared'],
+            last_activity_at=totals['last'] or timezone.now(),
+            version=F('version') + 1,
+        )
+    summary_cache.record_invalidations(len(per_occasion))
+    rollups.add_expenditures(expenditures)
+
+
+def record_payments(occasion_ids, cleared, when=None):
+    """
+    Note payments towards expenditures of ``occasion_ids`` and move the amounts of the
+    ``cleared`` expenditures they paid off from the uncleared to the cleared total.
+
+    Must be called inside the transaction that recorded the payments; one UPDATE per
+    occasion touched, plus one for the spend rollups when any were cleared.
+    """
+    per_occasion = {occasion_id: 0 for occasion_id in occasion_ids if occasion_id is not None}
+    for expenditure in cleared:
+        if expenditure.occasion_id is not None:
+            per_occasion[expenditure.occasion_id] += expenditure.amount
+
+    for occasion_id, amount in per_occasion.items():
+        Occasion.objects.filter(pk=occasion_id).update(
+            cleared_amount=F('cleared_amount') + amount,
+            uncleared_amount=F('uncleared_amount') - amount,
+            last_activity_at=when or timezone.now(),
+            version=F('version') + 1,
+        )
+    summary_cache.record_invalidations(len(per_occasion))
+    rollups.add_cleared(cleared)
+
+
+def computed_totals(occasions):
+    """
+    Recompute the totals for ``occasions`` with one grouped query per table, archived
+    expenditures and payment logs included.
+    """
+    last_payments = {}
+    for model in (PaymentLog, ArchivedPaymentLog):
+        rows = (
+            model.objects.filter(expenditure__occasion__in=occasions)
+            .values('expenditure__occasion_id')
+            .annotate(last=Max('timestamp'))
+            .values_list('expenditure__occasion_id', 'last')
+        )
+        for occasion_id, last in rows:
+            last_payments[occasion_id] = max(last, last_payments.get(occasion_id, last))
+    live = (
+        Expenditure.objects.filter(occasion__in=occasions)
+        .values('occasion_id')
+        .annotate(
+            total_amount=Coalesce(Sum('amount'), ZERO),
+            expenditure_count=Count('id'),
+            cleared_amount=Coalesce(Sum('amount', filter=Q(cleared=True)), ZERO),
+            uncleared_amount=Coalesce(Sum('amount', filter=Q(cleared=False)), ZERO),
+            last_activity_at=Max('created_at'),
+        )
+    )
+    # Only cleared expenditures are archived
+    archived = (
+        ArchivedExpenditure.objects.filter(occasion__in=occasions)
+        .values('occasion_id')
+        .annotate(
+            total_amount=Coalesce(Sum('amount'), ZERO),
+            expenditure_count=Count('id'),
+            cleared_amount=Coalesce(Sum('amount'), ZERO),
+            uncleared_amount=ZERO,
+            last_activity_at=Max('created_at'),
+        )
+    )
+    totals = {}
+    for row in [*live, *archived]:
+        occasion_id = row.pop('occasion_id')
+        if occasion_id not in totals:
+            totals[occasion_id] = row
+            continue
+        merged = totals[occasion_id]
+        for field in ('total_amount', 'expenditure_count', 'cleared_amount', 'uncleared_amount'):
+            merged[field] += row[field]
+        merged['last_activity_at'] = max(merged['last_activity_at'], row['last_activity_at'])
+    for occasion_id, row in totals.items():
+        last_payment = last_payments.get(occasion_id)
+        if last_payment and last_payment > row['last_activity_at']:
+            row['last_activity_at'] = last_payment
+    return totals
+
+
+def _empty_totals():
+    return {
+        'total_amount': Decimal('0.00'),
+        'expenditure_count': 0,
+        'cleared_amount': Decimal('0.00'),
+        'uncleared_amount': Decimal('0.00'),
+        'last_activity_at': None,
+    }
+
+
+def find_drift(occasions=None):
+    """
+    Return ``(occasion, field, stored, actual)`` for every stored total that disagrees with the data.
+    """
+    occasions = Occasion.objects.all() if occasions is None else occasions
+    actual = computed_totals(occasions)
+    drift = []
+    for occasion in occasions.only('id', *TOTAL_FIELDS):
+        expected = actual.get(occasion.id) or _empty_totals()
+        for field in TOTAL_FIELDS:
+            stored = getattr(occasion, field)
+            if stored != expected[field]:
+                drift.append((occasion, field, stored, expected[field]))
+    return drift
+
+
+def rebuild_totals(occasions=None, batch_size=500):
+    """
+    Overwrite the stored totals of ``occasions`` (default: all) with freshly computed values.
+    """
+    occasions = Occasion.objects.all() if occasions is None else occasions
+    actual = computed_totals(occasions)
+    updated = []
+    for occasion in occasions.only('id', *TOTAL_FIELDS):
+        for field, value in (actual.get(occasion.id) or _empty_totals()).items():
+            setattr(occasion, field, value)
+        updated.append(occasion)
+    Occasion.objects.bulk_update(updated, TOTAL_FIELDS, batch_size=batch_size)
+    occasions.update(version=F('version') + 1)
+    summary_cache.record_invalidations(len(updated))
+    return len(updated)
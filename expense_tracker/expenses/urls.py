@@ -1,14 +1,47 @@
-from django.urls import path
+from django.urls import path, re_path
+from .async_views import AsyncClearExpenseView, AsyncExpenditureCreateView, AsyncOccasionSummaryView
 from .views import (
-    OccasionCreateView,
-    ExpenditureCreateView,
+    OccasionListCreateView,
+    ExpenditureListCreateView,
+    ExpenditureBulkCreateView,
+    PaymentLogListView,
+    ExpenditureExportView,
+    PaymentLogExportView,
     ClearExpenseView,
+    BatchClearExpenseView,
     OccasionExpenditureSummaryView,
+    OccasionSettlementView,
+    OccasionChangesView,
+    ArchivedExpenditureListView,
+    OccasionSettlementJobView,
+    RebuildOccasionTotalsView,
+    JobDetailView,
+    SpendAnalyticsView,
+    SummaryCacheStatsView,
+    MyLedgerView,
 )
 
 urlpatterns = [
-    path('occasions/', OccasionCreateView.as_view(), name='occasion-create'),
-    path('expenditures/', ExpenditureCreateView.as_view(), name='expenditure-create'),
+    path('occasions/', OccasionListCreateView.as_view(), name='occasion-create'),
+    path('expenditures/', ExpenditureListCreateView.as_view(), name='expenditure-create'),
+    path('expenditures/bulk/', ExpenditureBulkCreateView.as_view(), name='expenditure-bulk-create'),
+    path('payment-logs/', PaymentLogListView.as_view(), name='payment-log-list'),
+    re_path(r'^exports/expenditures\.(?P<export_format>csv|ndjson)$', ExpenditureExportView.as_view(), name='expenditure-export'),
+    re_path(r'^exports/payment-logs\.(?P<export_format>csv|ndjson)$', PaymentLogExportView.as_view(), name='payment-log-export'),
     path('clear-expense/', ClearExpenseView.as_view(), name='clear-expense'),
+    path('clear-expense/batch/', BatchClearExpenseView.as_view(), name='clear-expense-batch'),
     path('occasions/<int:pk>/summary/', OccasionExpenditureSummaryView.as_view(), name='occasion-summary'),
+    path('occasions/<int:pk>/changes/', OccasionChangesView.as_view(), name='occasion-changes'),
+    path('occasions/<int:pk>/archive/', ArchivedExpenditureListView.as_view(), name='occasion-archive'),
+    path('occasions/<int:pk>/settlement/', OccasionSettlementView.as_view(), name='occasion-settlement'),
+    path('occasions/<int:pk>/settlement/jobs/', OccasionSettlementJobView.as_view(), name='occasion-settlement-job'),
+    path('occasions/<int:pk>/totals/rebuild/', RebuildOccasionTotalsView.as_view(), name='occasion-totals-rebuild'),
+    path('analytics/spend/', SpendAnalyticsView.as_view(), name='spend-analytics'),
+    path('jobs/<int:pk>/', JobDetailView.as_view(), name='job-detail'),
+    path('me/ledger/', MyLedgerView.as_view(), name='my-ledger'),
+    path('summary-cache/stats/', SummaryCacheStatsView.as_view(), name='summary-cache-stats'),
+    # Native async views of the hottest endpoints, for ASGI deployments
+    path('async/occasions/<int:pk>/summary/', AsyncOccasionSummaryView.as_view(), name='async-occasion-summary'),
+    path('async/expenditures/', AsyncExpenditureCreateView.as_view(), name='async-expenditure-create'),
+    path('async/clear-expense/', AsyncClearExpenseView.as_view(), name='async-clear-expense'),
 ]
\ No newline at end of file
@@ -1,50 +1,475 @@
 from django.shortcuts import render
+from django.db import transaction
 from rest_framework import generics
 from rest_framework.response import Response
 from rest_framework import status
-from .models import Occasion, Expenditure
-from .serializers import OccasionSerializer, ExpenditureSerializer, ClearExpenseSerializer, OccasionSummarySerializer
+from django.contrib.auth import get_user_model
+from django.db.models import Exists, OuterRef, Prefetch
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.urls import reverse
+from django.utils.http import http_date
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from expense_tracker.routers import read_alias
+from . import changes, exports, jobs, ledger, rollups, summary_cache
+from .idempotency import idempotent
+from .models import ArchivedExpenditure, ArchivedPaymentLog, ChangeLogEntry, Job, Occasion, Expenditure, PaymentLog
+from .pagination import KeysetPagination
+from .serializers import (
+    OccasionSerializer,
+    ExpenditureSerializer,
+    ExpenditureFilterSerializer,
+    BulkExpenditureSerializer,
+    ClearExpenseSerializer,
+    BatchClearExpenseSerializer,
+    OccasionSummarySerializer,
+    OccasionTotalsSerializer,
+    ExpenditureSummarySerializer,
+    ChangesFilterSerializer,
+    JobSerializer,
+    SpendAnalyticsFilterSerializer,
+    SpendBucketSerializer,
+    PaymentLogSerializer,
+    PaymentLogFilterSerializer,
+    ExportFilterSerializer,
+    ArchivedExpenditureSerializer,
+)
+from .settlement import settlement_report
+from .totals import record_expenditure
 
+User = get_user_model()
 
-class OccasionCreateView(generics.CreateAPIView):
+
+class FilteredListMixin:
+    """
+    Validates the list filters in the query string with ``filter_serializer_class``.
+    """
+    filter_serializer_class = None
+
+    def get_filters(self):
+        serializer = self.filter_serializer_class(data=self.request.query_params.dict())
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+
+
+class OccasionListCreateView(generics.ListCreateAPIView):
     queryset = Occasion.objects.all()
     serializer_class = OccasionSerializer
+    pagination_class = KeysetPagination
+    ordering = ('-date', '-id')
 
 
-class ExpenditureCreateView(generics.CreateAPIView):
+class ExpenditureListCreateView(FilteredListMixin, generics.ListCreateAPIView):
     queryset = Expenditure.objects.all()
     serializer_class = ExpenditureSerializer
+    filter_serializer_class = ExpenditureFilterSerializer
+    pagination_class = KeysetPagination
+    ordering = ('-created_at', '-id')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method != 'GET':
+            return queryset
+
+        filters = self.get_filters()
+        for field in ('occasion', 'expender', 'cleared'):
+            if field in filters:
+                queryset = queryset.filter(**{field: filters[field]})
+        if 'utilizer' in filters:
+            queryset = queryset.filter(Exists(
+                Expenditure.utilizers.through.objects.filter(
+                    expenditure_id=OuterRef('pk'), customuser_id=filters['utilizer'],
+                )
+            ))
+        return queryset.prefetch_related(Prefetch('utilizers', queryset=User.objects.only('id')))
+
+    @idempotent
+    def post(self, request, *args, **kwargs):
+        return super().post(request, *args, **kwargs)
+
+    @transaction.atomic
+    def perform_create(self, serializer):
+        expenditure = serializer.save()
+        record_expenditure(expenditure)
+        changes.record_expenditure_changes([expenditure])
+
+
+class ExpenditureBulkCreateView(generics.GenericAPIView):
+    serializer_class = BulkExpenditureSerializer
+
+    @idempotent
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        created = serializer.save() if serializer.validated_data['valid'] else []
+        return Response({
+            "created": [{"index": index, "id": row.id} for index, row in created],
+            "errors": serializer.validated_data['item_errors'],
+        }, status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST)
+
+
+class PaymentLogListView(FilteredListMixin, generics.ListAPIView):
+    queryset = PaymentLog.objects.all()
+    serializer_class = PaymentLogSerializer
+    filter_serializer_class = PaymentLogFilterSerializer
+    pagination_class = KeysetPagination
+    ordering = ('-timestamp', '-id')
+
+    def get_queryset(self):
+        filters = self.get_filters()
+        lookups = {'occasion': 'expenditure__occasion', 'expenditure': 'expenditure', 'payer': 'payer', 'payee': 'payee'}
+        return super().get_queryset().filter(**{
+            lookups[field]: value for field, value in filters.items()
+        })
+
+
+def payment_log_summary(payment_log):
+    return {
+        "id": payment_log.id,
+        "payer": payment_log.payer.username,
+        "payee": payment_log.payee.username,
+        "amount": payment_log.amount,
+        "timestamp": payment_log.timestamp
+    }
+
+
+class PrerenderedResponse(Response):
+    """
+    A ``Response`` whose JSON may already be rendered, e.g. shared by coalesced requests.
+    Other formats, or JSON with media type parameters, are rendered as usual.
+    """
+    def __init__(self, data=None, content=None, **kwargs):
+        super().__init__(data, **kwargs)
+        self.prerendered = content
+
+    @property
+    def rendered_content(self):
+        renderer = getattr(self, 'accepted_renderer', None)
+        if self.prerendered is None or not isinstance(renderer, JSONRenderer) or self.accepted_media_type != renderer.media_type:
+            return super().rendered_content
+        self['Content-Type'] = renderer.media_type
+        return self.prerendered
+
+
+def clear_message(payment_log):
+    if payment_log.expenditure.cleared:
+        return "Expense cleared successfully."
+    return "Payment recorded; part of the expense is still owed."
+
+
+class ExportView(FilteredListMixin, generics.GenericAPIView):
+    """
+    Streams every matching row as CSV or NDJSON; the format comes from the URL suffix.
+    ``filename`` names the export in ``exports.EXPORTS``.
+    """
+    filter_serializer_class = ExportFilterSerializer
+    filename = None
+
+    def get_records(self, filters):
+        build_queryset, build_records, _ = exports.EXPORTS[self.filename]
+        return build_records(build_queryset(**filters).using(read_alias()))
+
+    def get(self, request, *args, **kwargs):
+        # The body is produced after the request returns, outside replica routing, so
+        # get_records() pins its queryset to the database chosen for this request.
+        export_format = kwargs['export_format']
+        encode, content_type = exports.FORMATS[export_format]
+        columns = exports.EXPORTS[self.filename][2]
+        records = self.get_records(self.get_filters())
+        response = StreamingHttpResponse(encode(records, columns), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{self.filename}.{export_format}"'
+        return response
+
+
+class ExpenditureExportView(ExportView):
+    filename = 'expenditures'
+
+
+class PaymentLogExportView(ExportView):
+    filename = 'payment-logs'
 
 
 class ClearExpenseView(generics.GenericAPIView):
     serializer_class = ClearExpenseSerializer
 
+    @idempotent
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
             payment_log = serializer.save()
             return Response({
-                "message": "Expense cleared successfully.",
-                "payment_log": {
-                    "id": payment_log.id,
-                    "payer": payment_log.payer.username,
-                    "payee": payment_log.payee.username,
-                    "amount": payment_log.amount,
-                    "timestamp": payment_log.timestamp
-                }
+                "message": clear_message(payment_log),
+                "payment_log": payment_log_summary(payment_log)
             }, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class BatchClearExpenseView(generics.GenericAPIView):
+    serializer_class = BatchClearExpenseSerializer
+
+    @idempotent
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        cleared = serializer.save() if serializer.validated_data['accepted'] else []
+        results = [
+            {"index": index, "expenditure_id": payment_log.expenditure_id, "payment_log": payment_log_summary(payment_log)}
+            for index, payment_log in cleared
+        ] + serializer.validated_data['item_errors']
+        results.sort(key=lambda result: result['index'])
+        return Response({
+            "cleared": len(cleared),
+            "results": results,
+        }, status=status.HTTP_200_OK if cleared else status.HTTP_400_BAD_REQUEST)
+
+
 class OccasionExpenditureSummaryView(generics.RetrieveAPIView):
+    # Three queries whatever the occasion size: the occasion with its stored totals, one
+    # keyset page of expenditures joined with their expender, and the utilizers of that
+    # page. Users load only what __str__ needs.
     queryset = Occasion.objects.all()
+    expenditure_queryset = Expenditure.objects.select_related('expender').only(
+        'id', 'occasion_id', 'event_name', 'amount', 'cleared', 'created_at',
+        'expender__id', 'expender__username',
+    ).prefetch_related(
+        Prefetch('utilizers', queryset=User.objects.only('id', 'username')),
+    )
     serializer_class = OccasionSummarySerializer
+    pagination_class = KeysetPagination
+    ordering = ('-created_at', '-id')
 
     def get(self, request, *args, **kwargs):
         occasion_id = kwargs.get('pk')
         try:
             occasion = self.queryset.get(pk=occasion_id)
-            serializer = self.get_serializer(occasion)
-            return Response(serializer.data, status=status.HTTP_200_OK)
         except Occasion.DoesNotExist:
             return Response({"error": "Occasion not found."}, status=status.HTTP_404_NOT_FOUND)  # Custom error response
+
+        # Conditional and cached responses are answered from the occasion row alone
+        etag = summary_cache.summary_etag(occasion, request)
+        last_modified = int(occasion.last_activity_at.timestamp()) if occasion.last_activity_at else None
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            patch_vary_headers(not_modified, ['Accept'])
+            return not_modified
+
+        data, content = summary_cache.get_or_build(occasion, request, lambda: self.build_summary(occasion))
+        response = PrerenderedResponse(data, content, status=status.HTTP_200_OK)
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ['Accept'])
+        return response
+
+    def build_summary(self, occasion):
+        occasion.expenditure_page = self.paginate_queryset(self.expenditure_queryset.filter(occasion=occasion))
+        data = self.get_serializer(occasion).data
+        data['expenditures_next'] = self.paginator.get_next_link()
+        return data
+
+
+class OccasionChangesView(FilteredListMixin, generics.GenericAPIView):
+    """
+    What changed in an occasion after the ``since`` cursor, for clients that keep a copy.
+
+    Without ``since`` only the current cursor is returned: fetch it before the summary,
+    then poll with it. Changed expenditures and payment logs come back in full, deleted
+    ones as ids, alongside the occasion's current totals. Rows archived since they changed
+    are listed as ids under ``archived``: they were not deleted, and the archive endpoint
+    serves them from then on. ``has_more`` means the page stopped at ``page_size`` log
+    entries; call again with the returned cursor.
+    """
+    queryset = Occasion.objects.all()
+    filter_serializer_class = ChangesFilterSerializer
+    page_size = 500
+    expenditure_queryset = OccasionExpenditureSummaryView.expenditure_queryset
+    payment_log_queryset = PaymentLog.objects.all()
+
+    def get(self, request, *args, **kwargs):
+        occasion_id = kwargs.get('pk')
+        filters = self.get_filters()
+        try:
+            occasion = self.queryset.get(pk=occasion_id)
+        except Occasion.DoesNotExist:
+            return Response({"error": "Occasion not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        if 'since' not in filters:
+            return Response({
+                "occasion": OccasionTotalsSerializer(occasion).data,
+                "cursor": changes.latest_cursor(occasion_id),
+            }, status=status.HTTP_200_OK)
+
+        upserts, deletes, cursor, has_more = changes.changes_since(
+            occasion_id, filters['since'], filters.get('page_size', self.page_size),
+        )
+        deleted = {kind: set(ids) for kind, ids in deletes.items()}
+        expenditures, payment_logs = [], []
+        if upserts[ChangeLogEntry.EXPENDITURE]:
+            expenditures = list(self.expenditure_queryset.filter(
+                occasion_id=occasion_id, id__in=upserts[ChangeLogEntry.EXPENDITURE],
+            ).order_by('id'))
+        if upserts[ChangeLogEntry.PAYMENT_LOG]:
+            payment_logs = list(self.payment_log_queryset.filter(
+                expenditure__occasion_id=occasion_id, id__in=upserts[ChangeLogEntry.PAYMENT_LOG],
+            ).order_by('id'))
+        # Rows deleted, moved to another occasion or archived since the entry was written
+        archived = {ChangeLogEntry.EXPENDITURE: set(), ChangeLogEntry.PAYMENT_LOG: set()}
+        for kind, rows in ((ChangeLogEntry.EXPENDITURE, expenditures), (ChangeLogEntry.PAYMENT_LOG, payment_logs)):
+            missing = set(upserts[kind]) - {row.id for row in rows}
+            if missing:
+                archived[kind].update(self.archived_ids(kind, occasion_id, missing))
+            deleted[kind].update(missing - archived[kind])
+
+        return Response({
+            "occasion": OccasionTotalsSerializer(occasion).data,
+            "cursor": cursor,
+            "has_more": has_more,
+            "expenditures": ExpenditureSummarySerializer(expenditures, many=True).data,
+            "payment_logs": PaymentLogSerializer(payment_logs, many=True).data,
+            "deleted": {
+                "expenditures": sorted(deleted[ChangeLogEntry.EXPENDITURE]),
+                "payment_logs": sorted(deleted[ChangeLogEntry.PAYMENT_LOG]),
+            },
+            "archived": {
+                "expenditures": sorted(archived[ChangeLogEntry.EXPENDITURE]),
+                "payment_logs": sorted(archived[ChangeLogEntry.PAYMENT_LOG]),
+            },
+        }, status=status.HTTP_200_OK)
+
+    def archived_ids(self, kind, occasion_id, ids):
+        if kind == ChangeLogEntry.EXPENDITURE:
+            queryset = ArchivedExpenditure.objects.filter(occasion_id=occasion_id, id__in=ids)
+        else:
+            queryset = ArchivedPaymentLog.objects.filter(expenditure__occasion_id=occasion_id, id__in=ids)
+        return queryset.values_list('id', flat=True)
+
+
+class ArchivedExpenditureListView(generics.ListAPIView):
+    """
+    An occasion's archived expenditures, newest first, each with its payment logs: the
+    history ``manage.py archive_history`` moved out of the summary and expenditure lists.
+    """
+    queryset = ArchivedExpenditure.objects.prefetch_related('payments')
+    serializer_class = ArchivedExpenditureSerializer
+    pagination_class = KeysetPagination
+    ordering = ('-created_at', '-id')
+
+    def list(self, request, *args, **kwargs):
+        if not Occasion.objects.filter(pk=kwargs.get('pk')).exists():
+            return Response({"error": "Occasion not found."}, status=status.HTTP_404_NOT_FOUND)
+        return super().list(request, *args, **kwargs)
+
+    def get_queryset(self):
+        return super().get_queryset().filter(occasion_id=self.kwargs.get('pk'))
+
+
+class SummaryCacheStatsView(generics.GenericAPIView):
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request, *args, **kwargs):
+        return Response(summary_cache.stats(), status=status.HTTP_200_OK)
+
+
+class OccasionSettlementView(generics.GenericAPIView):
+    queryset = Occasion.objects.all()
+
+    def get(self, request, *args, **kwargs):
+        occasion_id = kwargs.get('pk')
+        if not self.queryset.filter(pk=occasion_id).exists():
+            return Response({"error": "Occasion not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        return Response(settlement_report(occasion_id), status=status.HTTP_200_OK)
+
+
+class SpendAnalyticsView(FilteredListMixin, generics.GenericAPIView):
+    """
+    Spend per day, week or month for an occasion and/or a user, answered from the
+    rollups: one grouped query over at most a row per user and day in range.
+    """
+    filter_serializer_class = SpendAnalyticsFilterSerializer
+
+    def get(self, request, *args, **kwargs):
+        filters = self.get_filters()
+        series = rollups.spend_series(**filters)
+        return Response({
+            "bucket": filters['bucket'],
+            "series": SpendBucketSerializer(series, many=True).data,
+        }, status=status.HTTP_200_OK)
+
+
+class EnqueueJobView(generics.GenericAPIView):
+    """
+    Queues ``task`` for the occasion and answers ``202 Accepted`` with the job; poll its
+    ``Location`` for the result. An identical job that is still pending is shared.
+    Tasks get ``occasion_id`` unless ``get_job_args()`` says otherwise.
+    """
+    queryset = Occasion.objects.all()
+    task = None
+
+    def get_job_args(self, occasion_id):
+        return {'occasion_id': occasion_id}
+
+    def post(self, request, *args, **kwargs):
+        occasion_id = kwargs.get('pk')
+        if not self.queryset.filter(pk=occasion_id).exists():
+            return Response({"error": "Occasion not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        job, created = jobs.enqueue(self.task, self.get_job_args(occasion_id))
+        response = Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+        response['Location'] = reverse('job-detail', kwargs={'pk': job.id})
+        return response
+
+
+class OccasionSettlementJobView(EnqueueJobView):
+    task = 'occasion_settlement'
+
+
+class RebuildOccasionTotalsView(EnqueueJobView):
+    permission_classes = (IsAdminUser,)
+    task = 'rebuild_occasion_totals'
+
+    def get_job_args(self, occasion_id):
+        return {'occasion_ids': [occasion_id]}
+
+
+class JobDetailView(generics.RetrieveAPIView):
+    queryset = Job.objects.all()
+    serializer_class = JobSerializer
+
+
+class MyLedgerView(generics.GenericAPIView):
+    """
+    What the requesting user owes and is owed, per counterparty and per occasion.
+    """
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request, *args, **kwargs):
+        entries = ledger.user_ledger_cents(request.user.id)
+        counterparty_ids = {counterparty_id for _, counterparty_id in entries}
+        usernames = dict(User.objects.filter(id__in=counterparty_ids).values_list('id', 'username'))
+
+        by_counterparty = {}
+        totals = dict.fromkeys(ledger.LEDGER_FIELDS, 0)
+        for (occasion_id, counterparty_id), entry in sorted(entries.items(), key=lambda item: (item[0][1], item[0][0] or 0)):
+            counterparty = by_counterparty.setdefault(counterparty_id, {
+                "user": counterparty_id,
+                "username": usernames.get(counterparty_id),
+                "cents": dict.fromkeys(ledger.LEDGER_FIELDS, 0),
+                "occasions": [],
+            })
+            for field in ledger.LEDGER_FIELDS:
+                counterparty["cents"][field] += entry[field]
+                totals[field] += entry[field]
+            counterparty["occasions"].append({"occasion": occasion_id, **ledger.as_amounts(entry)})
+
+        counterparties = []
+        for counterparty in by_counterparty.values():
+            cents = counterparty.pop("cents")
+            counterparties.append({**counterparty, **ledger.as_amounts(cents)})
+
+        return Response({
+            "user": request.user.id,
+            "totals": ledger.as_amounts(totals),
+            "counterparties": counterparties,
+        }, status=status.HTTP_200_OK)
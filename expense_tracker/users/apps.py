@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
 
 
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        from . import user_cache
+
+        user_model = self.get_model('CustomUser')
+        post_save.connect(user_cache.user_saved, sender=user_model, dispatch_uid='users.user_cache.saved')
+        post_delete.connect(user_cache.user_deleted, sender=user_model, dispatch_uid='users.user_cache.deleted')
@@ -0,0 +1,99 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from expense_tracker.instrumentation import span
+
+from . import user_cache
+
+
+class TimedJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication whose time is reported under the ``auth`` span of instrumented requests.
+
+    ``aauthenticate()`` is the same check for async views; only the user lookup touches
+    the database, and it goes through the async ORM.
+    """
+    def authenticate(self, request):
+        with span('auth'):
+            return super().authenticate(request)
+
+    async def aauthenticate(self, request):
+        with span('auth'):
+            header = self.get_header(request)
+            if header is None:
+                return None
+            raw_token = self.get_raw_token(header)
+            if raw_token is None:
+                return None
+            validated_token = self.get_validated_token(raw_token)
+            return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        try:
+            user = await self.user_model.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist as e:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+
+        self.check_user(user, validated_token)
+        return user
+
+    def check_user(self, user, validated_token):
+        """
+        The checks ``get_user()`` makes on a loaded user before accepting the token.
+        """
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+
+class CachedJWTAuthentication(TimedJWTAuthentication):
+    """
+    JWT authentication that resolves users through ``users.user_cache`` instead of
+    loading the row on every request.
+
+    A cached user is checked exactly like a freshly loaded one (active, password not
+    changed since the token was issued). Saving or deactivating a user bumps its cache
+    version, so the next request loads the new row. With a warm cache an authenticated
+    request makes no user query at all, and the token's own claims (``request.auth``,
+    e.g. the ``username`` added at login) never need one.
+    """
+    def get_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+        # Read the version before the row, so a concurrent save leaves a stale row under
+        # the old version rather than under the new one
+        version = user_cache.current_version(user_id)
+        user = user_cache.get_user(user_id, version)
+        if user is None:
+            user = super().get_user(validated_token)
+            user_cache.set_user(user, version)
+            return user
+        self.check_user(user, validated_token)
+        return user
+
+    async def aget_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+        version = await user_cache.acurrent_version(user_id)
+        user = await user_cache.aget_user(user_id, version)
+        if user is None:
+            user = await super().aget_user(validated_token)
+            await user_cache.aset_user(user, version)
+            return user
+        self.check_user(user, validated_token)
+        return user
+
+    def get_user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
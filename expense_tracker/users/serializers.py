@@ -1,10 +1,11 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from expense_tracker.instrumentation import InstrumentedSerializerMixin
 
 User = get_user_model()
 
-class CustomUserSerializer(serializers.ModelSerializer):
+class CustomUserSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ('id', 'username', 'email', 'password')
@@ -14,7 +15,7 @@ class CustomUserSerializer(serializers.ModelSerializer):
         user = User.objects.create_user(**validated_data)
         return user
 
-class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
+class CustomTokenObtainPairSerializer(InstrumentedSerializerMixin, TokenObtainPairSerializer):
     @classmethod
     def get_token(cls, user):
         token = super().get_token(user)
@@ -1,8 +1,13 @@
 import logging
+from django.test import override_settings
 from django.urls import reverse
-from rest_framework.test import APITestCase
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIRequestFactory, APITestCase
 from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken
 from django.contrib.auth import get_user_model
+from .authentication import CachedJWTAuthentication
+from . import user_cache
 
 User = get_user_model()
 
@@ -52,4 +57,100 @@ class UserTests(APITestCase):
             'password': 'wrongpassword'
         }, format='json')
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
-        logger.info("test_invalid_user_login completed successfully in UserTests.")
\ No newline at end of file
+        logger.info("test_invalid_user_login completed successfully in UserTests.")
+
+
+class CachedAuthenticationTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.login_url = reverse('token_obtain_pair')
+        cls.user = User.objects.create_user(username='testuser', password='testpassword')
+        logger.info("Test data setup complete for CachedAuthenticationTests.")
+
+    def setUp(self):
+        user_cache.clear()
+        self.authentication = CachedJWTAuthentication()
+        self.factory = APIRequestFactory()
+
+    def authenticate(self, token):
+        request = self.factory.get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        return self.authentication.authenticate(request)
+
+    def test_cached_user_needs_no_query(self):
+        logger.info("Starting test_cached_user_needs_no_query in CachedAuthenticationTests")
+        response = self.client.post(self.login_url, {'username': 'testuser', 'password': 'testpassword'}, format='json')
+        access = response.data['access']
+
+        with self.assertNumQueries(1):
+            user, token = self.authenticate(access)
+        with self.assertNumQueries(0):
+            user, token = self.authenticate(access)
+            self.assertEqual(user.pk, self.user.pk)
+            self.assertEqual(user.username, token['username'])
+        logger.info("test_cached_user_needs_no_query completed successfully in CachedAuthenticationTests.")
+
+    def test_saving_a_user_invalidates_its_entry(self):
+        logger.info("Starting test_saving_a_user_invalidates_its_entry in CachedAuthenticationTests")
+        access = AccessToken.for_user(self.user)
+        self.authenticate(access)
+
+        self.user.email = 'changed@example.com'
+        self.user.save()
+        with self.assertNumQueries(1):
+            user, _ = self.authenticate(access)
+        self.assertEqual(user.email, 'changed@example.com')
+
+        # Cached users are copies, so one request's changes stay out of the others
+        user.email = 'mutated@example.com'
+        self.assertEqual(self.authenticate(access)[0].email, 'changed@example.com')
+        logger.info("test_saving_a_user_invalidates_its_entry completed successfully in CachedAuthenticationTests.")
+
+    def test_deactivated_users_are_rejected(self):
+        logger.info("Starting test_deactivated_users_are_rejected in CachedAuthenticationTests")
+        access = AccessToken.for_user(self.user)
+        self.authenticate(access)
+
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(access)
+
+        self.user.is_active = True
+        self.user.save()
+        self.authenticate(access)
+        # Updates that bypass save() send no signal, so they bump the version by hand
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        user_cache.bump_version(self.user.pk)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(access)
+        logger.info("test_deactivated_users_are_rejected completed successfully in CachedAuthenticationTests.")
+
+    def test_local_cache_is_bounded_and_expires(self):
+        logger.info("Starting test_local_cache_is_bounded_and_expires in CachedAuthenticationTests")
+        now = [0.0]
+        cache = user_cache.LocalUserCache(max_entries=2, timeout=10, clock=lambda: now[0])
+        cache.set(('1', 'a'), 'first')
+        cache.set(('2', 'a'), 'second')
+        cache.get(('1', 'a'))
+        cache.set(('3', 'a'), 'third')
+        # The least recently used entry is evicted
+        self.assertIsNone(cache.get(('2', 'a')))
+        self.assertEqual(len(cache), 2)
+
+        now[0] = 10
+        self.assertIsNone(cache.get(('1', 'a')))
+        self.assertIsNone(cache.get(('3', 'a')))
+        logger.info("test_local_cache_is_bounded_and_expires completed successfully in CachedAuthenticationTests.")
+
+    @override_settings(USER_AUTH_CACHE_SHARED=True)
+    def test_shared_cache_serves_other_processes(self):
+        logger.info("Starting test_shared_cache_serves_other_processes in CachedAuthenticationTests")
+        access = AccessToken.for_user(self.user)
+        self.authenticate(access)
+        # A process with an empty local cache reads the user from the shared cache
+        user_cache.clear()
+        with self.assertNumQueries(0):
+            user, _ = self.authenticate(access)
+        self.assertEqual(user.pk, self.user.pk)
+        logger.info("test_shared_cache_serves_other_processes completed successfully in CachedAuthenticationTests.")
@@ -0,0 +1,172 @@
+"""
+Users resolved by JWT authentication, cached so authenticated requests skip the user query.
+
+Entries are keyed by user id plus a version token kept in the ``USER_AUTH_CACHE`` cache
+alias. Saving or deleting a user replaces the token, so entries cached for the old row
+are never read again. The users themselves live in a bounded in-process LRU whose entries
+expire after ``USER_AUTH_CACHE_TIMEOUT`` seconds; with ``USER_AUTH_CACHE_SHARED`` they are
+also stored in the shared cache, so a process that has not seen a user yet can skip the
+query too. When several processes serve the API, point the alias at a cache they share,
+otherwise a save in one process only invalidates its own entries and the others keep
+theirs until they expire.
+
+``QuerySet.update()`` sends no signals; call ``bump_version()`` after updating users
+that way.
+"""
+import copy
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+def get_cache():
+    return caches[getattr(settings, 'USER_AUTH_CACHE', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'USER_AUTH_CACHE_TIMEOUT', 60)
+
+
+def _shared():
+    return getattr(settings, 'USER_AUTH_CACHE_SHARED', False)
+
+
+def version_key(user_id):
+    return f'users:auth-version:{user_id}'
+
+
+def user_key(user_id, version):
+    return f'users:auth:{user_id}:{version}'
+
+
+class LocalUserCache:
+    """
+    Thread-safe LRU of ``(user_id, version) -> user`` with a per-entry time to live.
+    """
+    def __init__(self, max_entries=1024, timeout=60, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, user = entry
+            if expires <= self.clock():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return user
+
+    def set(self, key, user):
+        with self.lock:
+            self.entries[key] = (self.clock() + self.timeout, user)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+_local = None
+
+
+def local_cache():
+    global _local
+    if _local is None:
+        _local = LocalUserCache(getattr(settings, 'USER_AUTH_CACHE_MAX_ENTRIES', 1024), _timeout())
+    return _local
+
+
+def clear():
+    local_cache().clear()
+
+
+def current_version(user_id):
+    """
+    The user's version token, creating one if it was never set or has been evicted.
+    """
+    cache = get_cache()
+    key = version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, secrets.token_hex(8), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+async def acurrent_version(user_id):
+    cache = get_cache()
+    key = version_key(user_id)
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, secrets.token_hex(8), timeout=None)
+        version = await cache.aget(key)
+    return version
+
+
+def bump_version(user_id):
+    get_cache().set(version_key(user_id), secrets.token_hex(8), timeout=None)
+
+
+def get_user(user_id, version):
+    """
+    A copy of the cached user for this version, or ``None``. Copies keep one request's
+    changes to ``request.user`` out of the others.
+    """
+    key = (str(user_id), version)
+    user = local_cache().get(key)
+    if user is None and _shared():
+        user = get_cache().get(user_key(user_id, version))
+        if user is not None:
+            local_cache().set(key, user)
+    return copy.copy(user) if user is not None else None
+
+
+async def aget_user(user_id, version):
+    key = (str(user_id), version)
+    user = local_cache().get(key)
+    if user is None and _shared():
+        user = await get_cache().aget(user_key(user_id, version))
+        if user is not None:
+            local_cache().set(key, user)
+    return copy.copy(user) if user is not None else None
+
+
+def set_user(user, version):
+    """
+    Cache ``user`` under ``version``, which must have been read before the user was loaded.
+    """
+    local_cache().set((str(user.pk), version), copy.copy(user))
+    if _shared():
+        get_cache().set(user_key(user.pk, version), user, timeout=_timeout())
+
+
+async def aset_user(user, version):
+    local_cache().set((str(user.pk), version), copy.copy(user))
+    if _shared():
+        await get_cache().aset(user_key(user.pk, version), user, timeout=_timeout())
+
+
+def user_saved(sender, instance, update_fields=None, **kwargs):
+    # Recording a login changes nothing authentication reads
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    bump_version(instance.pk)
+
+
+def user_deleted(sender, instance, **kwargs):
+    bump_version(instance.pk)